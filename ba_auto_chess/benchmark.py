@@ -0,0 +1,275 @@
+"""
+Micro-benchmarks for the game's hot paths
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from core.battle import simulate_battle
+from core.constants import UNIT_POOL
+from core.game import play_game
+from core.rng import RNG
+from models.player import Player
+from models.shop import Shop
+from models.team import Team
+from models.unit import Unit
+
+def measure(op, n, samples=200, repeat=3):
+    '''
+    Times an operation and measures the memory it allocates.
+
+    The n calls are timed repeat times and the fastest run is kept, which
+    filters out most scheduling noise.
+
+    Parameters:
+        op (callable): The operation to run, without arguments.
+        n (int): Number of timed calls.
+        samples (int): Number of calls traced for allocations.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        dict: ops_per_sec, us_per_op and peak_bytes_per_op.
+    '''
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            op()
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    total = 0
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        op()
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": n / elapsed,
+        "us_per_op": elapsed / n * 1e6,
+        "peak_bytes_per_op": total / samples,
+    }
+
+def bench_shop_rolls(n=10000):
+    '''
+    Benchmarks Shop.get_choices and the memory retained per rolled unit.
+
+    Parameters:
+        n (int): Number of rolls.
+
+    Returns:
+        dict: The measure() results plus retained_bytes_per_unit.
+    '''
+    random.seed(0)
+    shop = Shop()
+    result = measure(shop.get_choices, n)
+
+    tracemalloc.start()
+    current = tracemalloc.get_traced_memory()[0]
+    units = [unit for _ in range(n // 5) for unit in shop.get_choices()]
+    result["retained_bytes_per_unit"] = (tracemalloc.get_traced_memory()[0] - current) / len(units)
+    tracemalloc.stop()
+    return result
+
+def bench_shared_pool_rolls(n=20000, players=8):
+    '''
+    Benchmarks rolls on a shared, finite-copy Shop.
+
+    Simulates players taking turns: each roll buys the first offered unit
+    and, once a player holds 9 units, gives one of them back, so the pool
+    stays in a steady state.
+
+    Parameters:
+        n (int): Number of rolls.
+        players (int): Number of players sharing the pool.
+
+    Returns:
+        dict: The measure() results.
+    '''
+    random.seed(0)
+    shop = Shop(shared=True)
+    held = [[] for _ in range(players)]
+    turn = [0]
+
+    def roll():
+        hand = held[turn[0] % players]
+        turn[0] += 1
+        choices = shop.get_choices()
+        if choices and shop.purchase(choices[0]):
+            hand.append(choices[0])
+        if len(hand) > 8:
+            shop.release(hand.pop(random.randrange(len(hand))))
+
+    return measure(roll, n)
+
+def _lineup(size, offset):
+    '''
+    Builds a fixed lineup of size UNIT_POOL units starting at offset, with
+    every third unit at two stars.
+    '''
+    return [Unit.from_pool(UNIT_POOL[(offset + i) % len(UNIT_POOL)]["name"], 2 if i % 3 == 2 else 1)
+            for i in range(size)]
+
+def bench_battle(size, n):
+    '''
+    Benchmarks simulate_battle between two fixed lineups of the given size.
+
+    Parameters:
+        size (int): Units per team.
+        n (int): Number of battles.
+
+    Returns:
+        dict: The measure() results.
+    '''
+    team1 = _lineup(size, 0)
+    team2 = _lineup(size, size)
+    rng = RNG(0)
+    return measure(lambda: simulate_battle(team1, team2, rng=rng), n)
+
+def bench_unit_attacks(n=50000):
+    '''
+    Benchmarks Unit.attack on its own, outside the battle loop.
+
+    The units of a fixed 10-unit lineup take turns attacking a fixed
+    10-unit enemy team, so every skill in the lineup is exercised; both
+    teams are restored to full HP whenever the enemy team is wiped out.
+
+    Parameters:
+        n (int): Number of attacks.
+
+    Returns:
+        dict: The measure() results.
+    '''
+    rng = RNG(0)
+    allies = Team(_lineup(10, 0), rng)
+    enemies = Team(_lineup(10, 10), rng)
+    turn = [0]
+
+    def attack():
+        attacker = allies.units[turn[0] % len(allies.units)]
+        turn[0] += 1
+        attacker.attack(enemies, allies)
+        if enemies.wiped():
+            allies.reset()
+            enemies.reset()
+
+    return measure(attack, n)
+
+def bench_merge_cascades(n=5000):
+    '''
+    Benchmarks buys that end in a merge cascade.
+
+    Every op buys four copies of one unit into a reserve of eight other
+    units: the second and fourth buys merge to two stars, and the fourth
+    cascades into a three star merge.
+
+    Parameters:
+        n (int): Number of cascades.
+
+    Returns:
+        dict: The measure() results.
+    '''
+    names = [data["name"] for data in UNIT_POOL]
+    filler = [Unit.from_pool(name) for name in names[1:9]]
+
+    def cascade():
+        player = Player("bench", verbose=False)
+        player.gold = 1000
+        player.reserve = filler
+        for _ in range(4):
+            player.buy_unit(Unit.from_pool(names[0]))
+
+    return measure(cascade, n)
+
+def bench_full_games(n=200, ai="greedy"):
+    '''
+    Benchmarks complete headless games between two AI players.
+
+    Parameters:
+        n (int): Number of games.
+        ai (str): The policy of both players.
+
+    Returns:
+        dict: The measure() results.
+    '''
+    root = RNG(0)
+    return measure(lambda: play_game(root.spawn(1)[0], ai), n, samples=20)
+
+BENCHMARKS = {
+    "battle_1v1": lambda: bench_battle(1, 20000),
+    "battle_5v5": lambda: bench_battle(5, 5000),
+    "battle_10v10": lambda: bench_battle(10, 2000),
+    "unit_attacks": bench_unit_attacks,
+    "merge_cascades": bench_merge_cascades,
+    "shop_rolls": bench_shop_rolls,
+    "shared_pool_rolls": bench_shared_pool_rolls,
+    "full_games": bench_full_games,
+}
+
+def compare(results, baseline):
+    '''
+    Compares benchmark results against a baseline.
+
+    Parameters:
+        results (dict): Benchmark name -> measure() results.
+        baseline (dict): The same, from an earlier run.
+
+    Returns:
+        dict: Benchmark name -> relative ops_per_sec change (-0.1 = 10% slower),
+            for the benchmarks found in both.
+    '''
+    return {name: result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+            for name, result in results.items() if name in baseline}
+
+def main():
+    '''
+    Runs the benchmarks, prints the results and optionally saves them or
+    compares them against a baseline.
+
+    Every benchmark uses fixed seeds and fixtures, so runs on the same
+    machine measure the same work. The exit status is 1 if a benchmark is
+    slower than the baseline by more than the threshold.
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Blue Archive Auto Chess benchmarks")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--json", metavar="FILE", help="save the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against the JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed ops/second slowdown (0.1 = 10%%)")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        result = results[name] = BENCHMARKS[name]()
+        print(f"{name:<18} " + "  ".join(f"{key}={value:,.1f}" for key, value in result.items()), flush=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            changes = compare(results, json.load(f)["results"])
+        print(f"\nChange against {args.baseline}:")
+        for name, change in changes.items():
+            if change < -args.threshold:
+                regressions.append(name)
+            print(f"{name:<18} {change:+.1%}" + ("  REGRESSION" if name in regressions else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": results}, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
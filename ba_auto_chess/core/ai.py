@@ -0,0 +1,205 @@
+"""
+AI shopping policies
+"""
+
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from core.battle import simulate_battle
+from core.rng import RNG
+from models.unit import Unit
+
+# Reserve size the AI stops buying at
+MAX_RESERVE = 20
+
+class Policy:
+    '''
+    Decides which units of a shop offer an AI player buys.
+
+    Subclasses implement choose(); game_round buys the chosen units in the
+    returned order.
+    '''
+
+    def choose(self, player, opponent, choices):
+        '''
+        Picks the units to buy from a shop offer.
+
+        Parameters:
+            player (Player): The AI player, after receiving income.
+            opponent (Player): The player it will fight next.
+            choices (list): The Unit objects offered by Shop.get_choices.
+
+        Returns:
+            list: Indices into choices, in buying order.
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        '''
+        Releases any resources (e.g. worker processes) held by the policy.
+        '''
+
+class GreedyPolicy(Policy):
+    '''
+    Buys every affordable unit in offer order until the reserve is full.
+    '''
+
+    def choose(self, player, opponent, choices):
+        trial = player.clone()
+        picked = []
+        for i, u in enumerate(choices):
+            if len(trial.reserve) < MAX_RESERVE and trial.buy_unit(Unit(u.template)):
+                picked.append(i)
+        return picked
+
+def _rollout(team1, team2, rng, count):
+    '''
+    Plays count battles; executed inside a worker process when a pool is used.
+
+    Parameters:
+        team1 (list): The candidate board.
+        team2 (list): The opponent board.
+        rng (random.Random): Random generator for the battles.
+        count (int): Number of battles.
+
+    Returns:
+        tuple: (points, margin) summed over the battles: a win is 1 point and
+            a tie half, margin is the survivor difference as a share of both boards.
+    '''
+    points = 0.0
+    margin = 0.0
+    size = len(team1) + len(team2)
+    for _ in range(count):
+        result = simulate_battle(team1, team2, rng=rng)
+        points += 1.0 if result.winner == 1 else 0.5 if result.winner == 0 else 0.0
+        margin += (result.survivors[0] - result.survivors[1]) / size
+    return points, margin
+
+class _Candidate:
+    '''
+    One purchase set of the search: the resulting board and its rollout record.
+    '''
+
+    def __init__(self, picked, trial, bonus):
+        self.picked = picked
+        self.trial = trial
+        self.bonus = bonus
+        self.points = 0.0
+        self.margin = 0.0
+        self.battles = 0
+
+    def score(self):
+        if not self.battles:
+            return self.bonus
+        return (self.points + self.margin) / self.battles + self.bonus
+
+class SearchPolicy(Policy):
+    '''
+    Chooses the purchase set whose board does best in headless battle rollouts.
+
+    Every affordable subset of the offer is played out on a quiet copy of the
+    player, so merges, synergies and the remaining gold are those the real
+    purchase would produce. Each resulting board is scored by its win rate
+    against the opponent's board (ties count half) plus its average survivor
+    margin, which keeps telling boards apart once they all win, plus
+    gold_value for every gold of interest the leftover gold earns next turn. Rollouts are
+    spent by successive halving: every pass plays battles for each remaining
+    candidate (batch on the first pass, doubling after that) and drops the
+    worse half, until one candidate is left or time_budget runs out.
+
+    Parameters:
+        time_budget (float): Seconds of search per turn.
+        batch (int): Battles per candidate on the first pass.
+        gold_value (float): Score of one gold of next-turn interest, in win-rate units.
+        workers (int): Worker processes for the rollouts (defaults to the CPU
+            count; 1 runs everything in this process).
+        rng (random.Random): Random generator for the rollouts (defaults to the random module).
+    '''
+
+    def __init__(self, time_budget=0.05, batch=4, gold_value=0.02, workers=None, rng=None):
+        self.time_budget = time_budget
+        self.batch = batch
+        self.gold_value = gold_value
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = rng if rng is not None else random
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _candidates(self, player, choices):
+        '''
+        Plays out every affordable subset of the offer on copies of the player.
+        '''
+        candidates = []
+        seen = set()
+        for mask in range(1 << len(choices)):
+            picked = [i for i in range(len(choices)) if mask >> i & 1]
+            if sum(choices[i].cost for i in picked) > player.gold:
+                continue
+            # Offers can repeat a unit; equivalent subsets are played out once
+            key = tuple(choices[i].template for i in picked)
+            if key in seen:
+                continue
+            seen.add(key)
+            trial = player.clone()
+            for i in picked:
+                if len(trial.reserve) >= MAX_RESERVE:
+                    break
+                trial.buy_unit(Unit(choices[i].template))
+            else:
+                trial.deploy_units()
+                interest = trial.income_breakdown()[1]
+                candidates.append(_Candidate(picked, trial, self.gold_value * interest))
+        return candidates
+
+    def _opponent_board(self, opponent, choices):
+        '''
+        Returns the lineup the candidates are scored against.
+        '''
+        if opponent.reserve:
+            # The board the opponent will deploy from its current reserve
+            board = opponent.clone()
+            board.deploy_units()
+            return board.units
+        # Nothing to fight yet: measure against what the offer itself could field
+        return [Unit(u.template) for u in choices]
+
+    def _rollouts(self, candidates, enemy, count):
+        '''
+        Runs count battles for every candidate.
+        '''
+        if self.workers > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [self._pool.submit(_rollout, c.trial.units, enemy, RNG(self.rng.getrandbits(64)), count)
+                       for c in candidates]
+            results = [f.result() for f in futures]
+        else:
+            results = [_rollout(c.trial.units, enemy, self.rng, count) for c in candidates]
+        for c, (points, margin) in zip(candidates, results):
+            c.points += points
+            c.margin += margin
+            c.battles += count
+
+    def choose(self, player, opponent, choices):
+        deadline = time.perf_counter() + self.time_budget
+        candidates = self._candidates(player, choices)
+        enemy = self._opponent_board(opponent, choices)
+        alive = [c for c in candidates if c.trial.units]
+        if not enemy or not alive:
+            # No battle to play out: keep the gold
+            return max(candidates, key=_Candidate.score).picked
+        
+        # At least one pass, then halve until one candidate is left or time is up
+        count = self.batch
+        while True:
+            self._rollouts(alive, enemy, count)
+            alive.sort(key=_Candidate.score, reverse=True)
+            if len(alive) == 1 or time.perf_counter() >= deadline:
+                return alive[0].picked
+            alive = alive[:(len(alive) + 1) // 2]
+            count *= 2
@@ -0,0 +1,245 @@
+"""
+Lineup arrangement optimizer
+"""
+
+import random
+import time
+from core.battle import simulate_battle
+from core.battle_cache import lineup_key
+from core.tables import DAMAGE, SKILL_SHIELD, SKILL_HEAL, SKILL_TARGETS, damage_base
+from models.synergy import SynergyTracker
+from models.unit import Unit
+
+try:
+    import numpy as np
+    from core.vector_battle import BatchTeams, simulate_batch
+except ImportError:  # NumPy is optional; candidates are then scored one battle at a time
+    np = None
+
+class LineupArranger:
+    '''
+    Picks the subset and order of reserve units to deploy against an opponent.
+
+    The search runs in two phases within time_budget:
+
+    1. Subsets: a beam search adds reserve units one at a time, scoring
+       partial lineups with a static estimate (damage per round against the
+       opponent's elements times total HP, with synergy bonuses applied) that
+       is memoized per subset. A unit is never picked while a unit that
+       dominates it (same school, element and skill, at least its HP and
+       attack) is left out.
+    2. Orders: a few acting orders of the best subsets, plus the default
+       lineup (the first board_size reserve units), are scored with
+       simulated battles by successive halving, in one batch per pass when
+       NumPy is available. Scores are memoized per lineup across calls.
+
+    Parameters:
+        time_budget (float): Seconds of search per arrangement.
+        beam_width (int): Partial subsets kept per step of the beam search.
+        finalists (int): Subsets whose orders are simulated.
+        batch (int): Battles per candidate on the first simulation pass.
+        rng (random.Random): Random generator for the battles (defaults to the random module).
+    '''
+
+    def __init__(self, time_budget=0.2, beam_width=16, finalists=6, batch=8, rng=None):
+        self.time_budget = time_budget
+        self.beam_width = beam_width
+        self.finalists = finalists
+        self.batch = batch
+        self.rng = rng if rng is not None else random
+        self.synergy = SynergyTracker()
+        self._scores = {}  # (lineup key, enemy lineup key) -> [points, battles]
+        self._enemy = None
+
+    def arrange(self, reserve, enemy, board_size):
+        '''
+        Chooses the units to deploy and their acting order.
+
+        Parameters:
+            reserve (list): The player's reserve units.
+            enemy (list): The opponent's lineup.
+            board_size (int): Maximum number of units on the field.
+
+        Returns:
+            list: The chosen reserve units, in acting order.
+        '''
+        if not reserve:
+            return []
+        if not enemy:
+            return list(reserve[:board_size])
+        deadline = time.perf_counter() + self.time_budget
+        subsets = self._best_subsets(reserve, enemy, min(board_size, len(reserve)),
+                                     time.perf_counter() + self.time_budget / 2)
+        # The default lineup competes too, so arranging never does worse than not arranging
+        candidates = {}
+        default = list(reserve[:board_size])
+        candidates[self._key(default)] = default
+        for subset in subsets:
+            for order in self._orders([reserve[i] for i in subset]):
+                candidates.setdefault(self._key(order), order)
+        return self._pick_order(list(candidates.values()), enemy, deadline)
+
+    # Phase 1: subsets
+
+    def _best_subsets(self, reserve, enemy, size, deadline):
+        '''
+        Beam search over subsets of reserve indices of the given size.
+        '''
+        total_hp = sum(u.max_hp for u in enemy)
+        weights = {}
+        for u in enemy:
+            weights[u.element_id] = weights.get(u.element_id, 0) + u.max_hp / total_hp
+        dominators = self._dominators(reserve)
+        memo = {}
+
+        beam = [()]
+        for _ in range(size):
+            width = self.beam_width if time.perf_counter() < deadline else 1
+            grown = []
+            for state in beam:
+                members = set(state)
+                for j in range(state[-1] + 1 if state else 0, len(reserve)):
+                    # A dominator with a lower index can no longer be added
+                    if any(d < j and d not in members for d in dominators[j]):
+                        continue
+                    subset = state + (j,)
+                    value = memo.get(subset)
+                    if value is None:
+                        value = memo[subset] = self._estimate([reserve[i] for i in subset], weights, len(enemy))
+                    grown.append((value, subset))
+            if not grown:
+                break
+            grown.sort(reverse=True)
+            beam = [subset for _, subset in grown[:width]]
+
+        complete = [s for s in beam if all(d in s for j in s for d in dominators[j])] or beam
+        return complete[:self.finalists]
+
+    def _dominators(self, reserve):
+        '''
+        Lists, for every reserve unit, the indices of the units that dominate it.
+        '''
+        dominators = []
+        for j, b in enumerate(reserve):
+            dominators.append([i for i, a in enumerate(reserve)
+                               if i != j and (a.school, a.element, a.skill) == (b.school, b.element, b.skill)
+                               and a.max_hp >= b.max_hp and a.base_atk >= b.base_atk
+                               and (a.max_hp > b.max_hp or a.base_atk > b.base_atk or i < j)])
+        return dominators
+
+    def _estimate(self, units, weights, enemies):
+        '''
+        Static strength of a lineup against enemies with the given element weights.
+        '''
+        schools = {}
+        for u in units:
+            schools[u.school_id] = schools.get(u.school_id, 0) + 1
+        damage = 0.0
+        hp = 0.0
+        for u in units:
+            atk = u.base_atk + self.synergy.bonus_for(schools[u.school_id])
+            skill = u.template.skill_id
+            base = damage_base(atk, skill, u.template.element_id)
+            targets = min(SKILL_TARGETS[skill] or enemies, enemies)
+            damage += targets * sum(w * DAMAGE[base + element] for element, w in weights.items())
+            hp += u.max_hp
+            # Shields and heals restore atk // 2 HP per round, to the unit or to every ally
+            if skill == SKILL_SHIELD:
+                hp += 2 * (atk // 2)
+            elif skill == SKILL_HEAL:
+                hp += 2 * (atk // 2) * len(units)
+        return damage * hp
+
+    # Phase 2: orders
+
+    def _orders(self, units):
+        '''
+        Candidate acting orders of one subset.
+        '''
+        support = lambda u: u.template.skill_id in (SKILL_SHIELD, SKILL_HEAL)
+        return [
+            units,
+            sorted(units, key=lambda u: (not support(u), -u.base_atk)),
+            sorted(units, key=lambda u: (support(u), -u.base_atk)),
+            sorted(units, key=lambda u: -u.max_hp),
+        ]
+
+    def _key(self, order):
+        return tuple((u.name, u.star) for u in order)
+
+    def _fielded(self, units):
+        '''
+        Copies a lineup at full HP with the synergy bonuses it gets on the field.
+        '''
+        schools = {}
+        for u in units:
+            schools[u.school_id] = schools.get(u.school_id, 0) + 1
+        fielded = []
+        for u in units:
+            copy = Unit(u.template)
+            copy.atk = u.base_atk + self.synergy.bonus_for(schools[u.school_id])
+            fielded.append(copy)
+        return fielded
+
+    def _simulate(self, lineups, enemy, counts):
+        '''
+        Plays counts[i] more battles of lineup i against the enemy and adds
+        their points (1 per win, 0.5 per tie, plus the survivor margin) to
+        the memoized scores.
+        '''
+        size = len(enemy)
+        if np is not None:
+            # One batch holds the battles of every candidate
+            team1 = BatchTeams.from_lineups([lineup for lineup, count in zip(lineups, counts) for _ in range(count)])
+            team2 = BatchTeams.repeat(enemy, sum(counts))
+            result = simulate_batch(team1, team2, np.random.default_rng(self.rng.getrandbits(64)))
+            points = np.where(result.winner == 1, 1.0, np.where(result.winner == 0, 0.5, 0.0))
+            margin = (result.survivors[:, 0] - result.survivors[:, 1]) / (len(lineups[0]) + size)
+            owner = np.repeat(np.arange(len(lineups)), counts)
+            totals = np.bincount(owner, weights=points + margin, minlength=len(lineups)).tolist()
+        else:
+            totals = []
+            for lineup, count in zip(lineups, counts):
+                total = 0.0
+                for _ in range(count):
+                    result = simulate_battle(lineup, enemy, rng=self.rng)
+                    total += 1.0 if result.winner == 1 else 0.5 if result.winner == 0 else 0.0
+                    total += (result.survivors[0] - result.survivors[1]) / (len(lineup) + size)
+                totals.append(total)
+        for lineup, total, count in zip(lineups, totals, counts):
+            record = self._scores.setdefault((lineup_key(lineup), self._enemy), [0.0, 0])
+            record[0] += total
+            record[1] += count
+
+    def _score(self, lineup):
+        points, battles = self._scores[(lineup_key(lineup), self._enemy)]
+        return points / battles
+
+    def _pick_order(self, candidates, enemy, deadline):
+        '''
+        Successive halving over candidate orders with simulated battles.
+        '''
+        if len(candidates) == 1:
+            return candidates[0]
+        if len(self._scores) > 100000:
+            self._scores.clear()
+        enemy = self._fielded(enemy)
+        self._enemy = lineup_key(enemy)
+        lineups = {id(order): self._fielded(order) for order in candidates}
+        count = self.batch
+        while True:
+            # Lineups already scored by earlier calls only need the missing battles
+            needed, missing = [], []
+            for order in candidates:
+                lineup = lineups[id(order)]
+                battles = self._scores.get((lineup_key(lineup), self._enemy), (0, 0))[1]
+                if battles < count:
+                    needed.append(lineup)
+                    missing.append(count - battles)
+            if needed:
+                self._simulate(needed, enemy, missing)
+            candidates.sort(key=lambda order: self._score(lineups[id(order)]), reverse=True)
+            if len(candidates) == 1 or time.perf_counter() >= deadline:
+                return candidates[0]
+            candidates = candidates[:(len(candidates) + 1) // 2]
+            count *= 2
@@ -2,124 +2,372 @@
 Battle system implementation
 """
 
-import time
+from core import render
+from core.constants import MAX_BATTLE_ROUNDS
+from core.tables import (ELEMENTS, MULTIPLIER, EVENT_ROUND, EVENT_TURN, EVENT_CAST, EVENT_AOE_HIT, EVENT_SHIELD,
+                         EVENT_HEAL, EVENT_DEATH)
+from core.render import SUMMARY, FULL
+from models.player import Player
+from models.team import Team
 
-def battle(p1, p2):
+class BattleResult:
     '''
-    Simulates a battle between two players' deployed units.
-    
-    Handles the combat sequence where units from both sides attack
-    each other and use their skills until one team is defeated.
-    
+    Structured outcome of a simulated battle.
+
     Parameters:
-        p1 (Player): The first player.
-        p2 (Player): The second player.
-        
+        winner (int): 1 if team1 won, 2 if team2 won, 0 for a tie.
+        survivors (tuple): Number of surviving units of (team1, team2).
+        rounds (int): Number of rounds fought.
+        damage (tuple): Two lists with the HP of damage dealt by each unit, in lineup order.
+        healing (tuple): Two lists with the HP restored by each unit (heal and shield), in lineup order.
+    '''
+
+    def __init__(self, winner, survivors, rounds, damage, healing):
+        self.winner = winner
+        self.survivors = survivors
+        self.rounds = rounds
+        self.damage = damage
+        self.healing = healing
+
+    def __repr__(self):
+        return f"BattleResult(winner={self.winner}, survivors={self.survivors}, rounds={self.rounds})"
+
+def _team_turn(side, acting, opposing, damage, healing, on_event, events):
+    '''
+    Lets every living unit of one team act once, in lineup order.
+
+    Parameters:
+        side (int): 1 or 2, the acting team.
+        acting (Team): The acting team.
+        opposing (Team): The opposing team.
+        damage (list): Per-unit damage totals of the acting team, updated in place.
+        healing (list): Per-unit healing totals of the acting team, updated in place.
+        on_event (callable): Optional event callback.
+        events (EventBuffer): Optional event log buffer.
+
     Returns:
         None
     '''
-    print("\n========== BATTLE START ==========")
-    p1.deploy_units()
-    p2.deploy_units()
+    if on_event is not None:
+        on_event("turn", side)
+    if events is not None:
+        events += (EVENT_TURN | side << 8, 0, 0, 0)
+    for i, u in enumerate(acting.units):
+        if u.is_alive() and not opposing.wiped():
+            if on_event is not None:
+                on_event("act", u)
+            dealt, restored = u.attack(opposing, acting, on_event, events)
+            damage[i] += dealt
+            healing[i] += restored
 
-    # Display both lineups
-    print(f"\n {p1.name}'s lineup:")
-    for i, u in enumerate(p1.units):
-        print(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()}, ATK: {u.atk}, Skill: {u.skill}, School: {u.school}")
-    
-    print(f"\n {p2.name}'s lineup:")
-    for i, u in enumerate(p2.units):
-        print(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()}, ATK: {u.atk}, Skill: {u.skill}, School: {u.school}")
+def simulate_battle(team1, team2, on_event=None, max_rounds=MAX_BATTLE_ROUNDS, rng=None, events=None):
+    '''
+    Runs a battle between two lineups without any I/O.
 
-    team1 = p1.units.copy()
-    team2 = p2.units.copy()
+    Both teams start at full HP. Teams alternate who moves first each round
+    (team1 on odd rounds) and every living unit attacks once per turn, until
+    one team is wiped out or max_rounds is reached. The winner is the team
+    with more surviving units.
+
+    Parameters:
+        team1 (list): Units of the first team, in acting order, or a Team
+            (e.g. one that records or replays its target picks).
+        team2 (list): Units of the second team, in acting order, or a Team.
+        on_event (callable): Optional callback receiving (event, *args) for every
+            step of the battle; see Unit.attack plus "round", "turn" and "act".
+        max_rounds (int): Maximum number of rounds before the battle is stopped.
+        rng (random.Random): Random generator for target picks of teams given as
+            lists (defaults to the random module); a Team keeps its own.
+        events (EventBuffer): Optional core.eventlog buffer that every round
+            start, turn, attack, AOE hit, shield, heal and death is appended
+            to (see LoggedBattle.events).
+
+    Returns:
+        BattleResult: The outcome of the battle.
+    '''
+    team1 = team1 if isinstance(team1, Team) else Team(team1, rng)
+    team2 = team2 if isinstance(team2, Team) else Team(team2, rng)
+    team1.reset()
+    team2.reset()
+
+    damage = ([0] * len(team1), [0] * len(team2))
+    healing = ([0] * len(team1), [0] * len(team2))
     round_num = 1
 
-    while any(u.is_alive() for u in team1) and any(u.is_alive() for u in team2):
-        print(f"\n === Round {round_num} === ")
-        
-        # Display survival status
-        alive1 = sum(1 for u in team1 if u.is_alive())
-        alive2 = sum(1 for u in team2 if u.is_alive())
-        print(f"Survival status: {p1.name}: {alive1}/{len(team1)} vs {p2.name}: {alive2}/{len(team2)}")
+    while round_num <= max_rounds and not team1.wiped() and not team2.wiped():
+        if on_event is not None:
+            on_event("round", round_num, team1.alive_count(), team2.alive_count())
+        if events is not None:
+            events += (EVENT_ROUND, round_num, team1.alive_count(), team2.alive_count())
 
         if round_num % 2 == 1:
             # Team1 turn first
-            # Team1 turn
-            print(f"\n {p1.name}'s turn:")
-            for u in team1:
-                if u.is_alive():
-                    enemies = [e for e in team2 if e.is_alive()]
-                    if enemies:
-                        print(f"  👉 {u.element}{u.name}★{u.star} acting...")
-                        u.attack(enemies=enemies, allies=team1, owner_name=p1.name)
-                        time.sleep(0.2)  # Brief pause to enhance battle pacing
-
-            # Team2 turn
-            print(f"\n {p2.name}'s turn:")
-            for u in team2:
-                if u.is_alive():
-                    enemies = [e for e in team1 if e.is_alive()]
-                    if enemies:
-                        print(f"  👉 {u.element}{u.name}★{u.star} acting...")
-                        u.attack(enemies=enemies, allies=team2, owner_name=p2.name)
-                        time.sleep(0.2)  # Brief pause to enhance battle pacing
-        
+            _team_turn(1, team1, team2, damage[0], healing[0], on_event, events)
+            _team_turn(2, team2, team1, damage[1], healing[1], on_event, events)
         else:
             # Team2 turn first
-            # Team2 turn
-            print(f"\n {p2.name}'s turn:")
-            for u in team2:
-                if u.is_alive():
-                    enemies = [e for e in team1 if e.is_alive()]
-                    if enemies:
-                        print(f"  👉 {u.element}{u.name}★{u.star} acting...")
-                        u.attack(enemies=enemies, allies=team2, owner_name=p2.name)
-                        time.sleep(0.2)  # Brief pause to enhance battle pacing
-        
-            # Team1 turn
-            print(f"\n {p1.name}'s turn:")
-            for u in team1:
-                if u.is_alive():
-                    enemies = [e for e in team2 if e.is_alive()]
-                    if enemies:
-                        print(f"  👉 {u.element}{u.name}★{u.star} acting...")
-                        u.attack(enemies=enemies, allies=team1, owner_name=p1.name)
-                        time.sleep(0.2)  # Brief pause to enhance battle pacing
-
-        
+            _team_turn(2, team2, team1, damage[1], healing[1], on_event, events)
+            _team_turn(1, team1, team2, damage[0], healing[0], on_event, events)
 
         round_num += 1
-        time.sleep(1)  # Pause between rounds
 
-    # End battle, display results
-    alive1 = sum(1 for u in team1 if u.is_alive())
-    alive2 = sum(1 for u in team2 if u.is_alive())
-    
-    print("\n🏁 === BATTLE END === 🏁")
+    alive1, alive2 = team1.alive_count(), team2.alive_count()
     if alive1 > alive2:
-        print(f"\n🏆 {p1.name} wins! (Surviving units: {alive1})")
+        winner = 1
+    elif alive2 > alive1:
+        winner = 2
+    else:
+        winner = 0
+    return BattleResult(winner, (alive1, alive2), round_num - 1, damage, healing)
+
+def apply_result(p1, p2, result):
+    '''
+    Updates both players' win and loss streak counters from a battle result.
+
+    Parameters:
+        p1 (Player): The player who fielded team1.
+        p2 (Player): The player who fielded team2.
+        result (BattleResult): The outcome of their battle.
+
+    Returns:
+        None
+    '''
+    if result.winner == 1:
         p1.win += 1
         p1.fail = 0
         p2.fail += 1
-    elif alive2 > alive1:
-        print(f"\n🏆 {p2.name} wins! (Surviving units: {alive2})")
+    elif result.winner == 2:
         p2.win += 1
         p2.fail = 0
         p1.fail += 1
-    else:
-        print("\n🤝 It's a tie!")
+
+def _advantage(multiplier):
+    '''
+    Returns the element advantage/disadvantage label for a damage multiplier.
+    '''
+    if multiplier > 1.0:
+        return "⚡EFFECTIVE⚡"
+    elif multiplier < 1.0:
+        return "❄️RESIST❄️"
+    return ""
+
+def _battle_printer(p1, p2):
+    '''
+    Builds an event callback that renders the battle as it happens.
+    
+    Every round is flushed to the screen as one block; at a non-zero
+    renderer speed each action is also paced (and flushed) on its own.
+    
+    Parameters:
+        p1 (Player): The first player.
+        p2 (Player): The second player.
     
+    Returns:
+        callable: An on_event callback for simulate_battle, or None when the
+            renderer does not show play-by-play output.
+    '''
+    out = render.current
+    if not out.shows(FULL):
+        return None
+    owners = {1: p1.name, 2: p2.name}
+    state = {"owner": p1.name}
+
+    def on_event(event, *args):
+        owner = state["owner"]
+        if event == "round":
+            round_num, alive1, alive2 = args
+            if round_num > 1:
+                out.pace(1)  # Pause between rounds
+                out.flush()
+            out.write(f"\n === Round {round_num} === ")
+            out.write(f"Survival status: {p1.name}: {alive1}/{len(p1.units)} vs {p2.name}: {alive2}/{len(p2.units)}")
+        elif event == "turn":
+            state["owner"] = owners[args[0]]
+            out.write(f"\n {state['owner']}'s turn:")
+        elif event == "act":
+            u = args[0]
+            out.pace(0.2)  # Brief pause to enhance battle pacing
+            out.write(f"  👉 {u.element}{u.name}★{u.star} acting...")
+        elif event == "cast":
+            u, count = args
+            if u.skill == "AOE-all":
+                out.write(f"{owner}'s [{u.element}{u.name}] cast AOE-all, make attack to all enemies.")
+            else:
+                out.write(f"{owner}'s [{u.element}{u.name}] cast {u.skill}, make attack to {count} enemies.")
+        elif event == "hit":
+            u, e, damage, multiplier = args
+            out.write(f"{owner}'s [{u.element}{u.name}] attack [{e.element}{e.name}] make {damage} point damage {_advantage(multiplier)} (HP {e.hp}).")
+        elif event == "shield":
+            u, amount = args
+            out.write(f"{owner}'s [{u.element}{u.name}] cast shield, get {amount} shield.")
+        elif event == "heal":
+            u, amount = args
+            out.write(f"{owner}'s [{u.element}{u.name}] cast heal, all allies recover {amount} HP.")
+        elif event == "healed":
+            ally = args[0]
+            out.write(f"{ally.element}{ally.name} HP recovered to {ally.hp}.")
+
+    return on_event
+
+def _print_lineups(p1, p2):
+    '''
+    Renders both players' deployed lineups.
+    '''
+    out = render.current
+    out.write(f"\n {p1.name}'s lineup:", SUMMARY)
+    for i, u in enumerate(p1.units):
+        out.write(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()}, ATK: {u.atk}, Skill: {u.skill}, School: {u.school}", SUMMARY)
+
+    out.write(f"\n {p2.name}'s lineup:", SUMMARY)
+    for i, u in enumerate(p2.units):
+        out.write(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()}, ATK: {u.atk}, Skill: {u.skill}, School: {u.school}", SUMMARY)
+
+def _print_outcome(p1, p2, result, team1, team2):
+    '''
+    Renders the winner of a battle and the post-battle status of every unit.
+    '''
+    out = render.current
+    alive1, alive2 = result.survivors
+
+    out.write("\n🏁 === BATTLE END === 🏁", SUMMARY)
+    if result.winner == 1:
+        out.write(f"\n🏆 {p1.name} wins! (Surviving units: {alive1})", SUMMARY)
+    elif result.winner == 2:
+        out.write(f"\n🏆 {p2.name} wins! (Surviving units: {alive2})", SUMMARY)
+    else:
+        out.write("\n🤝 It's a tie!", SUMMARY)
+
     # Display post-battle unit status
-    print(f"\nPost-battle unit status:")
-    print(f"\n {p1.name}'s units:")
+    out.write(f"\nPost-battle unit status:")
+    out.write(f"\n {p1.name}'s units:")
     for i, u in enumerate(team1):
         status = "Alive" if u.is_alive() else "Defeated"
-        print(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()} - {status}")
-    
-    print(f"\n {p2.name}'s units:")
+        out.write(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()} - {status}")
+
+    out.write(f"\n {p2.name}'s units:")
     for i, u in enumerate(team2):
         status = "Alive" if u.is_alive() else "Defeated"
-        print(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()} - {status}")
+        out.write(f"  [{i+1}] {u.element}{u.name}★{u.star} - {u.get_health_bar()} - {status}")
+
+def battle(p1, p2, log=None, rng=None):
+    '''
+    Simulates a battle between two players' deployed units.
+    
+    Handles the combat sequence where units from both sides attack
+    each other and use their skills until one team is defeated, rendering
+    every action. The combat itself is run by simulate_battle; output and
+    pacing go through the current renderer.
     
-    input("Press Enter to continue...")
\ No newline at end of file
+    Parameters:
+        p1 (Player): The first player.
+        p2 (Player): The second player.
+        log (EventLogWriter): Optional event log the battle is recorded to.
+        rng (random.Random): Random generator for the battle (defaults to the random module).
+    
+    Returns:
+        BattleResult: The outcome of the battle.
+    '''
+    out = render.current
+    out.write("\n========== BATTLE START ==========", SUMMARY)
+    # p1 arranges against the lineup p2 would field by default, p2 against p1's actual field
+    p1.deploy_units(p2.reserve[:p2.board_size])
+    p2.deploy_units(p1.units)
+
+    # Display both lineups
+    _print_lineups(p1, p2)
+
+    team1 = p1.units.copy()
+    team2 = p2.units.copy()
+    if log is None:
+        result = simulate_battle(team1, team2, on_event=_battle_printer(p1, p2), rng=rng)
+    else:
+        result = simulate_battle(*log.begin_battle(p1.name, p2.name, team1, team2, rng), on_event=_battle_printer(p1, p2))
+        log.end_battle(result)
+    if result.rounds:
+        out.pace(1)  # Pause after the last round
+
+    # End battle, display results
+    _print_outcome(p1, p2, result, team1, team2)
+    apply_result(p1, p2, result)
+
+    out.prompt("Press Enter to continue...")
+    return result
+
+def replay_battle(logged):
+    '''
+    Re-renders a logged battle with the same text and health bars as battle().
+    
+    The lineups are rebuilt from the log and its event records (rebuilt
+    from the logged target picks) are applied in order, so every action
+    and HP value matches the original fight. Playback speed is the current
+    renderer's.
+    
+    Parameters:
+        logged (LoggedBattle): A battle decoded by core.eventlog.read_log.
+    
+    Returns:
+        BattleResult: The outcome of the battle.
+    '''
+    team1, team2 = logged.lineups()
+    everyone = team1 + team2
+    p1, p2 = Player(logged.names[0]), Player(logged.names[1])
+    p1.units, p2.units = team1.copy(), team2.copy()
+
+    out = render.current
+    out.write("\n========== BATTLE START ==========", SUMMARY)
+    _print_lineups(p1, p2)
+
+    on_event = _battle_printer(p1, p2) or (lambda event, *args: None)
+    damage = ([0] * len(team1), [0] * len(team2))
+    healing = ([0] * len(team1), [0] * len(team2))
+    rounds = 0
+    skill_user = None  # The unit whose shield or heal is followed by its attack
+    for kind, a, b, value, extra in logged.events:
+        if kind == EVENT_ROUND:
+            rounds = b
+            on_event("round", b, value, extra)
+        elif kind == EVENT_TURN:
+            on_event("turn", a)
+        elif kind == EVENT_DEATH:
+            continue
+        else:
+            u = everyone[a]
+            side, i = (0, a) if a < len(team1) else (1, a - len(team1))
+            if kind != EVENT_AOE_HIT and u is not skill_user:
+                on_event("act", u)
+            skill_user = None
+            if kind == EVENT_CAST:
+                on_event("cast", u, b)
+            elif kind == EVENT_SHIELD:
+                healing[side][i] += extra - u.hp
+                u.hp = extra
+                skill_user = u
+                on_event("shield", u, value)
+            elif kind == EVENT_HEAL:
+                skill_user = u
+                on_event("heal", u, value)
+                for ally in (team1, team2)[side]:
+                    if ally.is_alive():
+                        before = ally.hp
+                        ally.hp = min(ally.max_hp, ally.hp + value)
+                        healing[side][i] += ally.hp - before
+                        on_event("healed", ally)
+            else:
+                # ATTACK and AOE_HIT
+                e = everyone[b]
+                damage[side][i] += e.hp - extra
+                e.hp = extra
+                on_event("hit", u, e, value, MULTIPLIER[u.element_id * len(ELEMENTS) + e.element_id])
+
+    alive1 = sum(u.is_alive() for u in team1)
+    alive2 = sum(u.is_alive() for u in team2)
+    winner, survivors1, survivors2, logged_rounds = logged.end
+    if (alive1, alive2, rounds) != (survivors1, survivors2, logged_rounds):
+        raise ValueError("the logged events do not lead to the logged outcome")
+    result = BattleResult(winner, (alive1, alive2), rounds, damage, healing)
+    if result.rounds:
+        out.pace(1)  # Pause after the last round
+
+    _print_outcome(p1, p2, result, team1, team2)
+    out.flush()
+    return result
@@ -0,0 +1,233 @@
+"""
+Transposition cache of battle outcomes keyed by canonical lineups
+"""
+
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from core.battle import simulate_battle
+from core.constants import RULES
+from core.montecarlo import MatchupStats
+
+def lineup_key(units):
+    '''
+    Returns the canonical description of a deployed lineup.
+
+    Two lineups with the same key fight identically: the key lists the
+    template (name and star) and post-synergy attack of every slot, in
+    deployment order.
+
+    Parameters:
+        units (list): The deployed units, in acting order.
+
+    Returns:
+        tuple: One (name, star, atk) tuple per slot.
+    '''
+    return tuple((u.name, u.star, u.atk) for u in units)
+
+def matchup_key(team1, team2):
+    '''
+    Hashes an ordered pair of lineups into a cache key.
+
+    The pair is ordered because team1 moves first on odd rounds, so (A, B)
+    and (B, A) are different matchups.
+
+    Parameters:
+        team1 (list): Units of the first team, in acting order.
+        team2 (list): Units of the second team, in acting order.
+
+    Returns:
+        str: A 32 character hex digest.
+    '''
+    return hashlib.blake2b(repr((lineup_key(team1), lineup_key(team2))).encode(), digest_size=16).hexdigest()
+
+# Approximate bytes held per cache entry: the key string, the count list and
+# the ordered dict's links and table slot
+_ENTRY_BYTES = sys.getsizeof("0" * 32) + sys.getsizeof([0, 0, 0]) + 3 * 28 + 104
+
+class BattleCache:
+    '''
+    Caches win/tie/loss counts of matchups so they are simulated only once.
+
+    Entries are kept in least recently used order and the oldest ones are
+    evicted once the estimated memory use exceeds max_bytes. With a path the
+    cache is loaded from a JSON file if it exists and written back by save().
+    Saved files record the rules digest, and a file written under another
+    rules file is ignored on load, since its lineups fought other battles.
+
+    Parameters:
+        max_bytes (int): Memory cap of the entries.
+        path (str): Optional JSON file persisting the cache between runs.
+    '''
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.path is not None:
+            self.save()
+
+    def memory(self):
+        '''
+        Returns the estimated bytes held by the entries.
+        '''
+        return len(self.entries) * _ENTRY_BYTES
+
+    def get(self, team1, team2):
+        '''
+        Looks up the cached counts of a matchup.
+
+        Parameters:
+            team1 (list): Units of the first team, in acting order.
+            team2 (list): Units of the second team, in acting order.
+
+        Returns:
+            tuple: (wins, ties, losses) of team1, or None if the matchup is not cached.
+        '''
+        key = matchup_key(team1, team2)
+        counts = self.entries.get(key)
+        if counts is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return tuple(counts)
+
+    def add(self, team1, team2, counts):
+        '''
+        Adds simulated outcomes of a matchup to its cached counts.
+
+        Parameters:
+            team1 (list): Units of the first team, in acting order.
+            team2 (list): Units of the second team, in acting order.
+            counts (tuple): (wins, ties, losses) of team1 to add.
+
+        Returns:
+            None
+        '''
+        self._add(matchup_key(team1, team2), counts)
+
+    def _add(self, key, counts):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = list(counts)
+            self._evict()
+        else:
+            for i in range(3):
+                entry[i] += counts[i]
+            self.entries.move_to_end(key)
+
+    def _evict(self):
+        while self.entries and self.memory() > self.max_bytes:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def estimate(self, team1, team2, n=100, rng=None, confidence=0.95):
+        '''
+        Estimates the outcome of a matchup from at least n battles.
+
+        Only the battles missing from the cache are simulated, and they are
+        added to it.
+
+        Parameters:
+            team1 (list): Units of the first team, in acting order.
+            team2 (list): Units of the second team, in acting order.
+            n (int): Minimum number of battles behind the estimate.
+            rng (random.Random): Random generator for new battles (defaults to the random module).
+            confidence (float): Confidence level of the intervals.
+
+        Returns:
+            MatchupStats: Statistics over every cached battle of the matchup.
+        '''
+        key = matchup_key(team1, team2)
+        counts = self.entries.get(key)
+        if counts is not None and sum(counts) >= n:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            missing = n - (sum(counts) if counts is not None else 0)
+            outcomes = [0, 0, 0]
+            for _ in range(missing):
+                winner = simulate_battle(team1, team2, rng=rng).winner
+                outcomes[0 if winner == 1 else 1 if winner == 0 else 2] += 1
+            self._add(key, outcomes)
+            counts = self.entries.get(key, outcomes)
+        stats = MatchupStats(confidence)
+        stats.add(counts)
+        return stats
+
+    def metrics(self):
+        '''
+        Reports the cache's counters.
+
+        Returns:
+            dict: hits, misses, hit_rate, evictions, entries and memory_bytes.
+        '''
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "memory_bytes": self.memory(),
+        }
+
+    def save(self, path=None):
+        '''
+        Writes the entries to a JSON file, least recently used first,
+        together with the digest of the current rules.
+
+        Parameters:
+            path (str): The file (defaults to the cache's path).
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If neither path nor the cache's path is set.
+        '''
+        path = path or self.path
+        if path is None:
+            raise ValueError("BattleCache.save needs a path, either as argument or to the constructor")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rules": RULES.digest, "entries": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def load(self, path):
+        '''
+        Merges the entries of a JSON file written by save() into the cache.
+
+        Files saved under another rules file (or before saves recorded the
+        rules) are skipped.
+
+        Parameters:
+            path (str): The file.
+
+        Returns:
+            int: The number of entries merged.
+        '''
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get("rules") != RULES.digest:
+            return 0
+        for key, counts in saved["entries"].items():
+            self._add(key, counts)
+        return len(saved["entries"])
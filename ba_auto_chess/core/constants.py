@@ -2,34 +2,42 @@
 Game constants definition
 """
 
+import os
+from core.ruleset import load
+
+# Units, skills, elements and synergies come from a data file (see core/ruleset.py);
+# BA_AUTO_CHESS_RULES names another file, e.g. one variant of a balance sweep
+RULES = load(os.environ.get("BA_AUTO_CHESS_RULES"))
+
 # Element damage multiplier table
-ELEMENT_DAMAGE_MULTIPLIER = {
-    "🔴": {"🔴": 2.0, "🟡": 1.0, "🔵": 0.5},
-    "🟡": {"🔴": 0.5, "🟡": 2.0, "🔵": 1.0},
-    "🔵": {"🔴": 1.0, "🟡": 0.5, "🔵": 2.0},
-}
+ELEMENT_DAMAGE_MULTIPLIER = RULES.multiplier_table()
 
-# Maximum number of units on the field
+# Default maximum number of units on the field (Player board_size)
 MAX_UNITS_ON_FIELD = 10
 
+# Rounds of a game, and the round wins that end it early
+GAME_ROUNDS = 5
+WINS_TO_END = 3
+
+# Lobby mode: up to LOBBY_SIZE players start with LOBBY_START_HP and are out at 0.
+# A lost battle costs LOSS_DAMAGE_BASE plus LOSS_DAMAGE_PER_UNIT per surviving enemy unit;
+# a tie costs both players LOSS_DAMAGE_BASE
+LOBBY_SIZE = 8
+LOBBY_START_HP = 100
+LOSS_DAMAGE_BASE = 2
+LOSS_DAMAGE_PER_UNIT = 2
+
+# Number of units offered per shop roll
+SHOP_SIZE = 5
+
+# Copies of each unit in a shared shop pool, by unit cost tier
+SHARED_POOL_COPIES = RULES.pool_copies
+
+# School synergy tiers: units of one school on the field -> ATK bonus for each of them
+SYNERGY_TIERS = RULES.synergy_tiers
+
 # Unit pool - templates for all available units
-UNIT_POOL = [
-    {"name": "Momoi", "cost": 4, "hp": 6, "atk": 6, "skill": "AOE-2", "school": "Millennium", "element": "🟡"},
-    {"name": "Yuuka", "cost": 4, "hp": 15, "atk": 3, "skill": "shield", "school": "Millennium", "element": "🔴"},
-    {"name": "Alice", "cost": 4, "hp": 5, "atk": 6, "skill": "AOE-3", "school": "Millennium", "element": "🔵"},
-    {"name": "Asuna", "cost": 3, "hp": 8, "atk": 5, "skill": "/", "school": "Millennium", "element": "🔵"},
-    
-    {"name": "Mika", "cost": 7, "hp": 10, "atk": 8, "skill": "/", "school": "Trinity", "element": "🟡"},
-    {"name": "Koharu", "cost": 4, "hp": 6, "atk": 3, "skill": "heal", "school": "Trinity", "element": "🔴"},
-    {"name": "Natsu", "cost": 5, "hp": 12, "atk": 5, "skill": "shield", "school": "Trinity", "element": "🔵"},
-    {"name": "Hanako", "cost": 3, "hp": 5, "atk": 4, "skill": "AOE-all", "school": "Trinity", "element": "🔵"},
-    
-    {"name": "Hina", "cost": 6, "hp": 8, "atk": 9, "skill": "/", "school": "Gehenna", "element": "🔴"},
-    {"name": "Mutsuki", "cost": 5, "hp": 6, "atk": 6, "skill": "AOE-3", "school": "Gehenna", "element": "🔴"},
-    {"name": "Iroha", "cost": 10, "hp": 6, "atk": 6, "skill": "AOE-all", "school": "Gehenna", "element": "🔵"},
-    {"name": "Iori", "cost": 4, "hp": 6, "atk": 4, "skill": "/", "school": "Gehenna", "element": "🟡"},
-    
-    {"name": "Hoshino", "cost": 5, "hp": 14, "atk": 4, "skill": "shield", "school": "Abydos", "element": "🟡"},
-    {"name": "Shiroko", "cost": 3, "hp": 8, "atk": 4, "skill": "/", "school": "Abydos", "element": "🔴"},
-    {"name": "Mizu", "cost": 4, "hp": 7, "atk": 5, "skill": "/", "school": "SRT", "element": "🟡"},
-]
\ No newline at end of file
+UNIT_POOL = RULES.unit_pool()
+
+# Safety cap on battle length; heal and shield units can otherwise stall a fight
+MAX_BATTLE_ROUNDS = 100
@@ -2,6 +2,10 @@
 Display utilities for the game
 """
 
+from core import render
+from core.ai import GreedyPolicy
+from core.render import SUMMARY
+
 def display_units_list(units):
     '''
     Displays a list of units with formatted attributes.
@@ -9,13 +13,14 @@ def display_units_list(units):
     Parameters:
         units (list): Units to be displayed.
     '''
-    print(f"{'Idx':<4} {'Name':<12} {'Gold':<5} {'HP':<5} {'ATK':<5} {'Skill':<15} {'School'}")
-    print("-" * 60)
+    out = render.current
+    out.write(f"{'Idx':<4} {'Name':<12} {'Gold':<5} {'HP':<5} {'ATK':<5} {'Skill':<15} {'School'}", SUMMARY)
+    out.write("-" * 60, SUMMARY)
     for i, u in enumerate(units):
-        print(f"{i:<4} {u.element + u.name:<12} {u.cost:<5} {u.max_hp:<5} {u.atk:<5} {u.skill:<15} {u.school}")
-    print()
+        out.write(f"{i:<4} {u.element + u.name:<12} {u.cost:<5} {u.max_hp:<5} {u.atk:<5} {u.skill:<15} {u.school}", SUMMARY)
+    out.write("", SUMMARY)
 
-def game_round(p1, p2, shop):
+def game_round(p1, p2, shop, policy=None):
     '''
     Manages a complete game round including shopping and battle phases.
     
@@ -26,19 +31,21 @@ def game_round(p1, p2, shop):
         p1 (Player): The human player.
         p2 (Player): The AI player.
         shop (Shop): The shop providing units for purchase.
+        policy (Policy): How the AI shops (defaults to GreedyPolicy).
         
     Returns:
         None
     '''
     # Human Player Phase
-    print(f"===== {p1.name}'s Shopping =====")
+    out = render.current
+    out.write(f"===== {p1.name}'s Shopping =====", SUMMARY)
     p1.income()
     choices = shop.get_choices()
     display_units_list(choices)
     
     # Player buying phase
     while p1.gold > 0:
-        buy_input = input(f"Input the numbers you want to buy (space-separated, or Enter to skip): ").strip()
+        buy_input = out.prompt(f"Input the numbers you want to buy (space-separated, or Enter to skip): ").strip()
         if not buy_input:
             break
             
@@ -46,31 +53,33 @@ def game_round(p1, p2, shop):
         try:
             buy_indices = [int(x) for x in buy_input.split()]
         except ValueError:
-            print("Invalid input. Please enter numbers separated by spaces.")
+            out.write("Invalid input. Please enter numbers separated by spaces.", SUMMARY)
             continue
             
         for idx in buy_indices:
             if 0 <= idx < len(choices):
                 if p1.gold >= choices[idx].cost:
-                    p1.buy_unit(choices[idx])
+                    p1.buy_unit(choices[idx], shop)
                 else:
-                    print(f"Not enough gold for {choices[idx].element}{choices[idx].name}.")
+                    out.write(f"Not enough gold for {choices[idx].element}{choices[idx].name}.", SUMMARY)
             else:
-                print(f"Invalid index: {idx}")
+                out.write(f"Invalid index: {idx}", SUMMARY)
     
-    print(f"\n== {p1.name}'s Final Units After Shopping ==")
+    out.write(f"\n== {p1.name}'s Final Units After Shopping ==", SUMMARY)
     p1.show_units()
-    print("Active synergies:", ", ".join(p1.get_synergy()))
-    print()
+    out.write("Active synergies: " + ", ".join(p1.get_synergy()), SUMMARY)
+    out.write("", SUMMARY)
 
     # AI Player Phase
-    print(f"===== {p2.name}'s Turn (AI) =====")
+    out.write(f"===== {p2.name}'s Turn (AI) =====", SUMMARY)
     p2.income()
-    for u in shop.get_choices():
-        if len(p2.reserve) < 20 and p2.gold >= u.cost:
-            p2.buy_unit(u)
+    policy = policy if policy is not None else GreedyPolicy()
+    choices = shop.get_choices()
+    for idx in policy.choose(p2, p1, choices):
+        p2.buy_unit(choices[idx], shop)
 
-    print(f"\n== {p2.name}'s Final Units After Shopping ==")
+    out.write(f"\n== {p2.name}'s Final Units After Shopping ==", SUMMARY)
     p2.show_units()
-    print("Active synergies:", ", ".join(p2.get_synergy()))
-    print()
\ No newline at end of file
+    out.write("Active synergies: " + ", ".join(p2.get_synergy()), SUMMARY)
+    out.write("", SUMMARY)
+    out.flush()
\ No newline at end of file
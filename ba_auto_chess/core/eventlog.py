@@ -0,0 +1,400 @@
+"""
+Compact binary battle event log
+"""
+
+import random
+import struct
+from core.battle import simulate_battle
+from core.constants import RULES
+from core.tables import (EVENT_ROUND as ROUND, EVENT_TURN as TURN, EVENT_ATTACK as ATTACK, EVENT_CAST as CAST,
+                         EVENT_AOE_HIT as AOE_HIT, EVENT_SHIELD as SHIELD, EVENT_HEAL as HEAL, EVENT_DEATH as DEATH)
+from models.team import Team
+from models.unit import TEMPLATES, Unit
+
+# File layout: a header, then fixed-size records. Every field is little endian.
+#
+#   header   magic b"BAEL", format version (uint16), rules digest (32 bytes)
+#   record   kind (uint8), a (uint8), b, value, extra (uint16 each)
+#
+# A battle is a BATTLE record, one UNIT record per unit, a PICKS record and
+# an END record. Units are interned per battle by the order of their UNIT
+# records: ids 0..n1-1 are team1's slots in lineup order and ids n1.. are
+# team2's.
+#
+# The engine is deterministic apart from its random target picks, so those
+# are all a battle stores: the PICKS record is followed by one byte per
+# pick, the picked unit's position in its team's living index (see
+# models.team.Team), padded to a whole number of records. Recording them is
+# far cheaper than packing every event as it happens. read_log rebuilds the
+# full event stream (round start, turn, attack, AOE cast and hit, shield,
+# heal, death) by running the engine on the logged picks, and checks it
+# against the END record. Names, elements and skills come from the rules
+# file the log was written with, whose digest is in the header; a log is
+# only read under the same rules.
+#
+# Player names are interned per file by a STRING record whose value is the
+# UTF-8 length, followed by the bytes, padded the same way.
+MAGIC = b"BAEL"
+VERSION = 3
+HEADER = struct.Struct("<4sH32s")
+RECORD = struct.Struct("<BBHHH")
+
+# Record kinds and their fields (a, b, value, extra)
+STRING = 0  # -, string id, byte length, -
+BATTLE = 1  # team1 size, team2 size, team1 name id, team2 name id
+UNIT = 2  # star, template index, atk, max HP
+END = 3  # winner, rounds, team1 survivors, team2 survivors
+PICKS = 4  # -, -, low and high 16 bits of the number of picks
+
+# Event kinds of LoggedBattle.events and their fields (a, b, value, extra)
+# ROUND    -, round number, team1 alive, team2 alive
+# TURN     acting team (1 or 2), -, -, -
+# ATTACK   attacker id, target id, damage, target HP
+# CAST     caster id (an AOE skill), number of targets, -, -
+# AOE_HIT  caster id, target id, damage, target HP
+# SHIELD   unit id, -, shield amount, unit HP
+# HEAL     healer id, -, heal amount, - (every living ally gains it, up to max HP)
+# DEATH    unit id, -, -, -
+EVENTS = (ROUND, TURN, ATTACK, CAST, AOE_HIT, SHIELD, HEAL, DEATH)
+
+# Template index of every UNIT_POOL unit, in pool order
+TEMPLATE_NAMES = list(TEMPLATES)
+TEMPLATE_INDEX = {name: i for i, name in enumerate(TEMPLATE_NAMES)}
+
+# Packed UNIT record of each (template, atk) seen so far
+_unit_records = {}
+
+def _unit_record(unit):
+    '''
+    Returns the packed UNIT record of a unit.
+    '''
+    key = (unit.template, unit.atk)
+    record = _unit_records.get(key)
+    if record is None:
+        record = _unit_records[key] = RECORD.pack(UNIT, unit.star, TEMPLATE_INDEX[unit.name], unit.atk, unit.max_hp)
+    return record
+
+def _padded(data):
+    '''
+    Pads a payload with zero bytes to a whole number of records.
+    '''
+    return data.ljust(-(-len(data) // RECORD.size) * RECORD.size, b"\0")
+
+class EventBuffer(list):
+    '''
+    The event records of a battle, as one flat list of (kind | a << 8, b,
+    value, extra) words that the engine extends in place.
+
+    Parameters:
+        ids (dict): Unit -> unit id in this battle.
+    '''
+
+    def __init__(self, ids):
+        super().__init__()
+        self.ids = ids
+
+class _RecordingTeam(Team):
+    '''
+    A Team that appends the living index position of every unit it picks
+    as a target to a shared bytearray. It draws the same random numbers as Team,
+    so a logged battle plays out like an unlogged one.
+
+    The living index is left for simulate_battle to build when it resets
+    the team.
+    '''
+
+    def __init__(self, units, rng, picks):
+        self.units = list(units)
+        self.rng = rng if rng is not None else random
+        self.picks = picks
+        self._record = picks.append
+
+    def pick(self):
+        alive = self.alive
+        i = self.rng.randrange(len(alive))
+        self._record(i)
+        return alive[i]
+
+    def sample(self, k):
+        alive = self.alive
+        n = len(alive)
+        if k >= n:
+            # random.sample draws the same positions for range(n) as for the list
+            positions = self.rng.sample(range(n), n)
+            self.picks.extend(positions)
+            return [alive[i] for i in positions]
+        randrange = self.rng.randrange
+        record = self._record
+        picked = []
+        while len(picked) < k:
+            i = randrange(n)
+            unit = alive[i]
+            if unit not in picked:
+                record(i)
+                picked.append(unit)
+        return picked
+
+class _ReplayTeam(Team):
+    '''
+    A Team whose target picks are read back from a log instead of drawn at random.
+    '''
+
+    def __init__(self, units, picks):
+        super().__init__(units)
+        self.picks = picks
+
+    def pick(self):
+        return self.alive[next(self.picks)]
+
+    def sample(self, k):
+        return [self.alive[next(self.picks)] for _ in range(min(k, len(self.alive)))]
+
+class EventLogWriter:
+    '''
+    Streams battles to a binary event log file.
+
+    Records are packed into an in-memory buffer that is written out once it
+    holds buffer_size bytes, so memory use stays bounded however many
+    battles are logged. New battles are appended to an existing log, which
+    must have been written with the same rules file.
+
+    Parameters:
+        path (str): The log file.
+        buffer_size (int): Bytes buffered before they are written to the file.
+    '''
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        if len(TEMPLATE_NAMES) > 0xFFFF:
+            raise ValueError(f"an event log holds at most {0xFFFF + 1} unit templates, the rules have {len(TEMPLATE_NAMES)}")
+        self.file = open(path, "ab")
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.strings = {}
+        self._battle = None
+        self._lineups = {}
+        if self.file.tell() == 0:
+            self.buffer += HEADER.pack(MAGIC, VERSION, bytes.fromhex(RULES.digest))
+        else:
+            try:
+                for kind, a, b, value, extra, payload in _records(path):
+                    if kind == STRING:
+                        self.strings[payload.decode("utf-8")] = b
+            except ValueError:
+                self.file.close()
+                raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _string(self, text):
+        '''
+        Returns the id of a string, writing a STRING record the first time.
+        '''
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            data = text.encode("utf-8")
+            self.buffer += RECORD.pack(STRING, 0, sid, len(data), 0)
+            self.buffer += _padded(data)
+        return sid
+
+    def begin_battle(self, name1, name2, team1, team2, rng=None):
+        '''
+        Starts logging a battle.
+
+        Parameters:
+            name1 (str): Name of team1's player.
+            name2 (str): Name of team2's player.
+            team1 (list): Units of the first team, in acting order.
+            team2 (list): Units of the second team, in acting order.
+            rng (random.Random): Random generator for the battle's target picks.
+
+        Returns:
+            tuple: Two Teams to pass to simulate_battle; they record every target pick.
+        '''
+        units = [*team1, *team2]
+        # Simulations fight the same lineups over and over, so their BATTLE
+        # and UNIT records are reused while the units and attacks match
+        key = (name1, name2, len(team1), *units, *[u.atk for u in units])
+        lineup = self._lineups.get(key)
+        if lineup is None:
+            if len(units) > 255:
+                raise ValueError("an event log battle holds at most 255 units")
+            if any(u.max_hp > 0xFFFF or u.atk > 0xFFFF for u in units):
+                raise ValueError(f"an event log holds HP and attack up to {0xFFFF}")
+            if len(self._lineups) >= 1024:
+                self._lineups.clear()
+            battle = RECORD.pack(BATTLE, len(team1), len(team2), self._string(name1), self._string(name2))
+            lineup = self._lineups[key] = battle + b"".join([_unit_record(u) for u in units])
+        self.buffer += lineup
+        picks = self._battle = bytearray()
+        return _RecordingTeam(team1, rng, picks), _RecordingTeam(team2, rng, picks)
+
+    def end_battle(self, result):
+        '''
+        Writes the picks and outcome of the current battle, flushing the
+        buffer once it is full.
+
+        Parameters:
+            result (BattleResult): The outcome of the battle.
+
+        Returns:
+            None
+        '''
+        picks = self._battle
+        self._battle = None
+        count = len(picks)
+        picks += bytes(-count % RECORD.size)
+        buffer = self.buffer
+        buffer += RECORD.pack(PICKS, 0, 0, count & 0xFFFF, count >> 16)
+        buffer += picks
+        buffer += RECORD.pack(END, result.winner, result.rounds, result.survivors[0], result.survivors[1])
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered records to the file.
+        '''
+        self.file.write(self.buffer)
+        self.file.flush()
+        del self.buffer[:]
+
+    def close(self):
+        '''
+        Flushes the buffer and closes the file.
+        '''
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+class LoggedBattle:
+    '''
+    One battle decoded from an event log.
+
+    The event records are rebuilt from the logged picks the first time
+    events is read.
+
+    Parameters:
+        names (tuple): Player names of (team1, team2).
+        units (tuple): Two lists of (template name, star, atk, max HP), in lineup order.
+        picks (bytes): Living index positions of the picked targets, in the order they were picked.
+        end (tuple): (winner, team1 survivors, team2 survivors, rounds).
+    '''
+
+    def __init__(self, names, units, picks, end):
+        self.names = names
+        self.units = units
+        self.picks = picks
+        self.end = end
+        self._events = None
+
+    def __repr__(self):
+        return f"LoggedBattle({self.names[0]} vs {self.names[1]}, {len(self.picks)} picks)"
+
+    def lineups(self):
+        '''
+        Rebuilds both lineups at full HP.
+
+        Returns:
+            tuple: Two lists of units, in lineup order; unit id i is the
+                i-th unit of the two lists together.
+        '''
+        lineups = ([], [])
+        for side, units in enumerate(self.units):
+            for name, star, atk, max_hp in units:
+                u = Unit.from_pool(name, star)
+                u.atk = atk
+                lineups[side].append(u)
+        return lineups
+
+    @property
+    def events(self):
+        '''
+        The battle's (kind, a, b, value, extra) event records, in the order
+        they happened.
+
+        Raises:
+            ValueError: If the logged picks do not lead to the logged outcome.
+        '''
+        if self._events is None:
+            team1, team2 = self.lineups()
+            everyone = team1 + team2
+            picks = iter(self.picks)
+            buffer = EventBuffer({u: uid for uid, u in enumerate(everyone)})
+            try:
+                result = simulate_battle(_ReplayTeam(team1, picks), _ReplayTeam(team2, picks), events=buffer)
+            except (StopIteration, IndexError):
+                raise ValueError("the logged picks do not match the logged lineups") from None
+            if (result.winner, *result.survivors, result.rounds) != self.end:
+                raise ValueError("the logged picks do not lead to the logged outcome")
+            self._events = [(buffer[i] & 0xFF, buffer[i] >> 8, buffer[i + 1], buffer[i + 2], buffer[i + 3])
+                            for i in range(0, len(buffer), 4)]
+        return self._events
+
+def _records(path):
+    '''
+    Yields (kind, a, b, value, extra, payload) for every record of a log;
+    payload holds the bytes that follow STRING and PICKS records and is
+    None otherwise.
+
+    Raises:
+        ValueError: If the file is not a log of this version written with
+            the current rules file.
+    '''
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size or HEADER.unpack_from(data)[:2] != (MAGIC, VERSION):
+        raise ValueError(f"{path} is not a version {VERSION} battle event log")
+    if HEADER.unpack_from(data)[2] != bytes.fromhex(RULES.digest):
+        raise ValueError(f"{path} was written with another rules file")
+    offset = HEADER.size
+    size = RECORD.size
+    while offset + size <= len(data):
+        kind, a, b, value, extra = RECORD.unpack_from(data, offset)
+        offset += size
+        payload = None
+        if kind == STRING:
+            payload = data[offset:offset + value]
+            offset += -(-value // size) * size
+        elif kind == PICKS:
+            count = value | extra << 16
+            payload = data[offset:offset + count]
+            offset += -(-count // size) * size
+        yield kind, a, b, value, extra, payload
+
+def read_log(path):
+    '''
+    Decodes every complete battle of an event log.
+
+    Parameters:
+        path (str): The log file.
+
+    Returns:
+        list: LoggedBattle objects, in the order they were logged.
+
+    Raises:
+        ValueError: If the file is not a log of this version written with
+            the current rules file.
+    '''
+    strings = {}
+    battles = []
+    for kind, a, b, value, extra, payload in _records(path):
+        if kind == STRING:
+            strings[b] = payload.decode("utf-8")
+        elif kind == BATTLE:
+            names = (strings[value], strings[extra])
+            units = ([], [])
+            team1_size = a
+            picks = b""
+        elif kind == UNIT:
+            side = 0 if len(units[0]) < team1_size else 1
+            units[side].append((TEMPLATE_NAMES[b], a, value, extra))
+        elif kind == PICKS:
+            picks = payload
+        elif kind == END:
+            battles.append(LoggedBattle(names, units, picks, (a, value, extra, b)))
+    return battles
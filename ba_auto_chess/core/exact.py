@@ -0,0 +1,266 @@
+"""
+Exact win/tie/loss probabilities of small battles by state-space search
+"""
+
+import sys
+from collections import defaultdict
+from fractions import Fraction
+from itertools import combinations
+from core.constants import MAX_BATTLE_ROUNDS
+from core.tables import (DAMAGE, SKILL_AOE_2, SKILL_AOE_3, SKILL_AOE_ALL, SKILL_HEAL, SKILL_SHIELD,
+                         SKILL_TARGETS, damage_base)
+
+class SolverLimit(Exception):
+    '''
+    Raised when a battle has more states than the solver was allowed to keep.
+    '''
+
+class BattleOdds:
+    '''
+    Exact outcome distribution of a battle, from team1's point of view.
+
+    Parameters:
+        win (float): Probability that team1 wins (a Fraction for exact solves).
+        tie (float): Probability of a tie.
+        loss (float): Probability that team2 wins.
+        states (int): States (HP vector and turn position) the solver expanded.
+        by_round (bool): Whether states were keyed by round number rather than
+            round parity (the round limit could be reached).
+    '''
+
+    def __init__(self, win, tie, loss, states, by_round):
+        self.win = win
+        self.tie = tie
+        self.loss = loss
+        self.states = states
+        self.by_round = by_round
+
+    def __repr__(self):
+        return (f"BattleOdds(win={float(self.win):.6f}, tie={float(self.tie):.6f}, "
+                f"loss={float(self.loss):.6f}, states={self.states})")
+
+class _Solver:
+    '''
+    Search state of one battle: unit stats as flat lists, unit i of team2
+    being entry len(team1) + i, and the memo of solved states.
+    '''
+
+    def __init__(self, team1, team2, max_rounds, exact, max_states):
+        units = list(team1) + list(team2)
+        self.n1 = len(team1)
+        self.max_rounds = max_rounds
+        self.max_states = max_states
+        self.one = Fraction(1) if exact else 1.0
+        self.max_hp = [u.max_hp for u in units]
+        self.start = tuple(self.max_hp)
+        self.side = [range(self.n1), range(self.n1, len(units))]
+        self.enemies = [self.side[1]] * self.n1 + [self.side[0]] * len(team2)
+        self.allies = [self.side[0]] * self.n1 + [self.side[1]] * len(team2)
+        self.skill = [u.template.skill_id for u in units]
+        self.restore = [u.atk // 2 for u in units]
+        # damage[i][j]: one hit of unit i on unit j, as Unit.attack computes it
+        self.damage = []
+        for u in units:
+            base = damage_base(u.atk, u.template.skill_id, u.template.element_id)
+            self.damage.append([DAMAGE[base + v.template.element_id] for v in units])
+        self.targets = []
+        for u in units:
+            skill = u.template.skill_id
+            if skill == SKILL_AOE_ALL:
+                self.targets.append(len(units))
+            elif skill == SKILL_AOE_2 or skill == SKILL_AOE_3:
+                self.targets.append(SKILL_TARGETS[skill])
+            else:
+                self.targets.append(1)
+        # Rounds alternate who moves first: team1 on odd rounds
+        self.order = [list(self.side[1]) + list(self.side[0]), list(self.side[0]) + list(self.side[1])]
+        # Runs of identical adjacent units act back to back, so their HP can be sorted
+        stats = [(u.max_hp, u.atk, u.template.skill_id, u.template.element_id) for u in units]
+        self.runs = []
+        start = 0
+        for i in range(1, len(units) + 1):
+            if i == len(units) or i == self.n1 or stats[i] != stats[start]:
+                if i - start > 1:
+                    self.runs.append((start, i))
+                start = i
+        self.by_round = not self._ends_in_time()
+        self.memo = {}
+        self.states = 0
+
+    def _ends_in_time(self):
+        '''
+        Checks that every battle ends by a wipe before the round limit.
+
+        Without shields or heals and with every hit dealing damage, each
+        round takes at least 1 HP off both teams, so a battle lasts at most
+        min(team HP) rounds; then a state's future depends only on its HP and
+        round parity, not on the round number.
+        '''
+        if any(skill in (SKILL_SHIELD, SKILL_HEAL) for skill in self.skill):
+            return False
+        for i, row in enumerate(self.damage):
+            if any(row[j] < 1 for j in self.enemies[i]):
+                return False
+        return min(sum(self.start[:self.n1]), sum(self.start[self.n1:])) <= self.max_rounds
+
+    def canonical(self, hp):
+        if not self.runs:
+            return hp
+        hp = list(hp)
+        for start, stop in self.runs:
+            hp[start:stop] = sorted(hp[start:stop])
+        return tuple(hp)
+
+    def act(self, i, hp):
+        '''
+        Lists the (probability, HP) outcomes of unit i acting, as in Unit.attack.
+        '''
+        enemies = [j for j in self.enemies[i] if hp[j]]
+        if not hp[i] or not enemies:
+            return [(self.one, hp)]
+        hp = list(hp)
+        skill = self.skill[i]
+        if skill == SKILL_SHIELD:
+            hp[i] = min(self.max_hp[i], hp[i] + self.restore[i])
+        elif skill == SKILL_HEAL:
+            for j in self.allies[i]:
+                if hp[j]:
+                    hp[j] = min(self.max_hp[j], hp[j] + self.restore[i])
+        k = self.targets[i]
+        if k >= len(enemies):
+            picks = [enemies]
+        else:
+            # Team.pick and Team.sample draw every k-subset of the living enemies equally often
+            picks = list(combinations(enemies, k))
+        p = self.one / len(picks)
+        damage = self.damage[i]
+        outcomes = []
+        for targets in picks:
+            after = list(hp)
+            for j in targets:
+                after[j] = max(0, after[j] - damage[j])
+            outcomes.append((p, tuple(after)))
+        return outcomes
+
+    def outcome(self, hp):
+        '''
+        Returns team1's (win, tie, loss) indicator of a finished battle.
+        '''
+        alive1 = sum(1 for h in hp[:self.n1] if h)
+        alive2 = sum(1 for h in hp[self.n1:] if h)
+        if alive1 > alive2:
+            return (self.one, 0, 0)
+        if alive2 > alive1:
+            return (0, 0, self.one)
+        return (0, self.one, 0)
+
+    def value(self, round_id, pos, hp):
+        '''
+        Returns team1's (win, tie, loss) probabilities when the pos-th unit
+        in the round's acting order is about to act.
+        '''
+        if not any(hp[:self.n1]) or not any(hp[self.n1:]):
+            return self.outcome(hp)
+        order = self.order[round_id % 2]
+        while pos < len(order) and not hp[order[pos]]:
+            pos += 1
+        if pos == len(order):
+            if round_id >= self.max_rounds:
+                return self.outcome(hp)
+            return self.value(round_id + 1, 0, self.canonical(hp))
+        key = (round_id if self.by_round else round_id % 2, pos, hp)
+        known = self.memo.get(key)
+        if known is not None:
+            return known
+        win = tie = loss = 0
+        for p, after in self.act(order[pos], hp):
+            w, t, l = self.value(round_id, pos + 1, after)
+            win += p * w
+            tie += p * t
+            loss += p * l
+        if self.max_states is not None and len(self.memo) >= self.max_states:
+            raise SolverLimit(f"more than {self.max_states:,} states")
+        self.memo[key] = (win, tie, loss)
+        return win, tie, loss
+
+    def sweep(self):
+        '''
+        Returns team1's (win, tie, loss) probabilities by pushing the
+        distribution of HP vectors forward one action at a time.
+
+        Used when the round limit can be reached: states of different rounds
+        are then distinct anyway, so merging equal HP vectors at each step
+        finds every repeat while only one step's states are kept in memory.
+        '''
+        win = tie = loss = 0
+        dist = {self.canonical(self.start): self.one}
+        for round_id in range(1, self.max_rounds + 1):
+            for i in self.order[round_id % 2]:
+                after = defaultdict(int)
+                for hp, p in dist.items():
+                    for q, state in self.act(i, hp):
+                        after[state] += p * q
+                self.states += len(dist)
+                if self.max_states is not None and len(after) > self.max_states:
+                    raise SolverLimit(f"more than {self.max_states:,} states")
+                dist = after
+            # Finished battles leave the sweep; the rest are merged up to identical units
+            dist = {}
+            for hp, p in after.items():
+                if not any(hp[:self.n1]) or not any(hp[self.n1:]) or round_id == self.max_rounds:
+                    w, t, l = self.outcome(hp)
+                    win += p * w
+                    tie += p * t
+                    loss += p * l
+                else:
+                    hp = self.canonical(hp)
+                    dist[hp] = dist.get(hp, 0) + p
+            if not dist:
+                break
+        return win, tie, loss
+
+def solve_battle(team1, team2, max_rounds=MAX_BATTLE_ROUNDS, exact=False, max_states=None):
+    '''
+    Computes the exact outcome distribution of simulate_battle(team1, team2).
+
+    The search follows simulate_battle turn by turn: the alternating turn
+    order is fixed by round parity, and every random choice of Unit.attack
+    (the single target of a normal attack, shield or heal, and the 2 or 3
+    targets of an AOE skill) is enumerated with its probability. A state is
+    the HP vector, the position in the round's acting order and the round
+    parity (or the round number when the round limit can be reached); each
+    is solved once and memoized, so action sequences that reach the same HP
+    share their future. Adjacent identical units of a team are
+    interchangeable, so their HP values are sorted at every round start.
+
+    The state space grows with the product of the units' HP, which limits
+    the solver to small boards; see README.md for measured sizes.
+
+    Parameters:
+        team1 (list): Units of the first team, in acting order (attack as fielded, HP from max_hp).
+        team2 (list): Units of the second team.
+        max_rounds (int): Maximum number of rounds before the battle is stopped.
+        exact (bool): Compute with Fractions instead of floats.
+        max_states (int): Optional cap on the states held in memory.
+
+    Returns:
+        BattleOdds: The outcome distribution.
+
+    Raises:
+        SolverLimit: If more than max_states states are needed.
+    '''
+    solver = _Solver(team1, team2, max_rounds, exact, max_states)
+    if not solver.n1 or solver.n1 == len(solver.start):
+        win, tie, loss = solver.outcome(solver.start)
+        return BattleOdds(win, tie, loss, 0, solver.by_round)
+    if solver.by_round:
+        win, tie, loss = solver.sweep()
+        return BattleOdds(win, tie, loss, solver.states, True)
+    # A frame per action and per round: every unit may act in every round
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, (len(solver.start) + 1) * max_rounds + 100))
+    try:
+        win, tie, loss = solver.value(1, 0, solver.canonical(solver.start))
+    finally:
+        sys.setrecursionlimit(limit)
+    return BattleOdds(win, tie, loss, len(solver.memo), solver.by_round)
@@ -0,0 +1,239 @@
+"""
+Headless AI-vs-AI games
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from core.ai import GreedyPolicy, SearchPolicy
+from core.arrange import LineupArranger
+from core.battle import simulate_battle, apply_result
+from core import snapshot
+from core.constants import GAME_ROUNDS, WINS_TO_END
+from core.rng import RNG
+from models.player import Player
+from models.shop import Shop
+
+class Game:
+    '''
+    One complete game between two AI players, without any I/O or pauses.
+
+    The game follows main.py round for round: both players get their income
+    (interest and loss streak gold included) and shop from their own offer,
+    purchases merge as usual, then the players deploy and fight, until
+    GAME_ROUNDS rounds are played or a player has WINS_TO_END round wins.
+
+    Parameters:
+        policy1 (Policy): How the first player shops.
+        policy2 (Policy): How the second player shops.
+        rng (RNG): The game's random stream; its children drive the shop and
+            the battles (defaults to the random module).
+        arrangers (tuple): Optional LineupArranger of each player.
+    '''
+
+    def __init__(self, policy1, policy2, rng=None, arrangers=(None, None)):
+        shop_rng, self.battle_rng = rng.spawn(2) if rng is not None else (None, None)
+        self.shop = Shop(rng=shop_rng)
+        self.players = (Player("AI 1", verbose=False, arranger=arrangers[0]),
+                        Player("AI 2", verbose=False, arranger=arrangers[1]))
+        self.policies = (policy1, policy2)
+        self.gold = ([], [])  # Gold of each player after income, per round
+        self.round = 0  # Rounds played
+
+    def finished(self):
+        p1, p2 = self.players
+        return self.round == GAME_ROUNDS or p1.win == WINS_TO_END or p2.win == WINS_TO_END
+
+    def play_round(self):
+        '''
+        Plays one round: income, shopping, deploying and the battle.
+
+        Returns:
+            BattleResult: The outcome of the round's battle.
+        '''
+        p1, p2 = self.players
+        self.round += 1
+        for side, (player, opponent) in enumerate(((p1, p2), (p2, p1))):
+            player.income()
+            self.gold[side].append(player.gold)
+            choices = self.shop.get_choices()
+            for idx in self.policies[side].choose(player, opponent, choices):
+                player.buy_unit(choices[idx], self.shop)
+
+        p1.deploy_units(p2.reserve[:p2.board_size])
+        p2.deploy_units(p1.units)
+        result = simulate_battle(p1.units.copy(), p2.units.copy(), rng=self.battle_rng)
+        apply_result(p1, p2, result)
+        return result
+
+    def play(self):
+        '''
+        Plays the game to the end.
+
+        Returns:
+            dict: The game's record: winner (1, 2 or 0 for a draw), wins of
+                both players, rounds played, each player's gold after
+                income per round and each player's final board as
+                [name, star, atk] lists.
+        '''
+        while not self.finished():
+            self.play_round()
+        return self.record()
+
+    def record(self):
+        '''
+        Returns the game's record (see play).
+        '''
+        p1, p2 = self.players
+        return {
+            "winner": 1 if p1.win > p2.win else 2 if p2.win > p1.win else 0,
+            "wins": [p1.win, p2.win],
+            "rounds": self.round,
+            "gold": [list(self.gold[0]), list(self.gold[1])],
+            "boards": [[[u.name, u.star, u.atk] for u in p.units] for p in self.players],
+        }
+
+    def snapshot(self):
+        '''
+        Saves the game's state (see core/snapshot.py).
+
+        The policies and arrangers are not part of the state; restore()
+        takes them again.
+
+        Returns:
+            bytes: The snapshot.
+        '''
+        return snapshot.pack(self.shop, [self.battle_rng], self.players, self.round,
+                             [len(self.gold[0])] + self.gold[0] + self.gold[1])
+
+    @classmethod
+    def restore(cls, data, policy1, policy2, arrangers=(None, None)):
+        '''
+        Rebuilds a game from a snapshot.
+
+        Parameters:
+            data (bytes): A snapshot from Game.snapshot.
+            policy1 (Policy): How the first player shops from now on.
+            policy2 (Policy): How the second player shops from now on.
+            arrangers (tuple): Optional LineupArranger of each player.
+
+        Returns:
+            Game: The game, ready to play its next round.
+        '''
+        state = snapshot.unpack(data)
+        game = cls.__new__(cls)
+        game.shop = state["shop"]
+        game.battle_rng = state["rngs"][0]
+        game.players = tuple(state["players"])
+        for player, arranger in zip(game.players, arrangers):
+            player.arranger = arranger
+        game.policies = (policy1, policy2)
+        count, gold = state["fields"][0], state["fields"][1:]
+        game.gold = (gold[:count], gold[count:])
+        game.round = state["round"]
+        return game
+
+    def fork(self, policy1=None, policy2=None, arrangers=None):
+        '''
+        Copies the game in memory, so both copies can play on independently.
+
+        Only mutable state is copied: units, players, the shop's copy counts
+        and the random streams. Templates and the shop's pool are shared.
+        With no arguments the copy keeps this game's policies and arrangers.
+
+        Returns:
+            Game: The copy.
+        '''
+        game = Game.__new__(Game)
+        if self.battle_rng is not None:
+            game.battle_rng = snapshot.fork_rng(self.battle_rng)
+        else:
+            game.battle_rng = None
+        game.shop, _ = snapshot.fork_shop(self.shop, snapshot.fork_rng(self.shop.rng))
+        if arrangers is None:
+            arrangers = tuple(player.arranger for player in self.players)
+        game.players = tuple(snapshot.fork_player(player, arranger) for player, arranger in zip(self.players, arrangers))
+        game.policies = (policy1 or self.policies[0], policy2 or self.policies[1])
+        game.gold = (list(self.gold[0]), list(self.gold[1]))
+        game.round = self.round
+        return game
+
+def play_game(rng, ai="greedy", ai_budget=0.05, arrange=False):
+    '''
+    Plays one headless game; executed inside a worker process when a pool is used.
+
+    Parameters:
+        rng (RNG): The game's random stream.
+        ai (str): "greedy" or "search", the policy of both players.
+        ai_budget (float): Seconds the search policy thinks per turn.
+        arrange (bool): Whether both players arrange their lineups with a LineupArranger.
+
+    Returns:
+        dict: The record returned by Game.play.
+    '''
+    game_rng, ai1_rng, ai2_rng = rng.spawn(3)
+    policies = []
+    for ai_rng in (ai1_rng, ai2_rng):
+        # Games already run in parallel, so the search rolls out in-process
+        policies.append(SearchPolicy(ai_budget, workers=1, rng=ai_rng) if ai == "search" else GreedyPolicy())
+    arrangers = (None, None)
+    if arrange:
+        arrangers = tuple(LineupArranger(rng=arrange_rng) for arrange_rng in ai1_rng.spawn(1) + ai2_rng.spawn(1))
+    return Game(policies[0], policies[1], game_rng, arrangers).play()
+
+def _play_chunk(streams, ai, ai_budget, arrange):
+    '''
+    Plays one work unit of games; executed inside a worker process.
+    '''
+    return [play_game(rng, ai, ai_budget, arrange) for rng in streams]
+
+def play_games(games, seed=None, workers=None, ai="greedy", ai_budget=0.05, arrange=False, chunk_size=None):
+    '''
+    Plays many headless games on a process pool.
+
+    The seed's RNG spawns one stream per game, so game i gets the same
+    shop offers and battle draws in every run with the same seed, whatever
+    the worker count. Greedy games are then fully reproducible; the search
+    policy's time budget makes its decisions depend on machine speed.
+
+    Parameters:
+        games (int): Number of games.
+        seed (int): Base seed (a fresh random one if omitted).
+        workers (int): Number of worker processes (defaults to the CPU count,
+            1 runs everything in this process).
+        ai (str): "greedy" or "search", the policy of both players.
+        ai_budget (float): Seconds the search policy thinks per turn.
+        arrange (bool): Whether both players arrange their lineups.
+        chunk_size (int): Games per work unit (defaults to 1 for the search
+            policy and to up to 64 for greedy games, which take about a millisecond).
+
+    Yields:
+        dict: One record per game, in game order, with its index under "game".
+    '''
+    workers = workers or os.cpu_count() or 1
+    streams = RNG(seed).spawn(games)
+    if workers == 1:
+        for i, rng in enumerate(streams):
+            yield dict(game=i, **play_game(rng, ai, ai_budget, arrange))
+        return
+
+    if chunk_size is None:
+        chunk_size = 1 if ai == "search" else max(1, min(64, games // (workers * 8)))
+    chunks = [streams[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    in_flight = {}
+    done = {}
+    next_chunk = 0
+    next_record = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while next_record < len(chunks):
+            while next_chunk < len(chunks) and len(in_flight) < workers * 4:
+                future = pool.submit(_play_chunk, chunks[next_chunk], ai, ai_budget, arrange)
+                in_flight[future] = next_chunk
+                next_chunk += 1
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[in_flight.pop(future)] = future.result()
+            # Records are streamed in game order as soon as they are contiguous
+            while next_record in done:
+                for i, record in enumerate(done.pop(next_record)):
+                    yield dict(game=next_record * chunk_size + i, **record)
+                next_record += 1
@@ -0,0 +1,260 @@
+"""
+Multi-player lobby with HP elimination, round pairings and parallel battles
+"""
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from core.battle import simulate_battle, apply_result
+from core.constants import LOBBY_SIZE, LOBBY_START_HP, LOSS_DAMAGE_BASE, LOSS_DAMAGE_PER_UNIT
+from models.player import Player
+from models.shop import Shop
+from models.unit import Unit
+
+# Pairing slot of the ghost board when an odd number of players is alive
+GHOST = -1
+
+def _fight(team1, team2, rng):
+    '''
+    Plays one battle; executed inside a worker process when a pool is used.
+    '''
+    return simulate_battle(team1, team2, rng=rng)
+
+def _matchings(players):
+    '''
+    Yields every way to split an even-sized list into pairs.
+    '''
+    if not players:
+        yield []
+        return
+    first, rest = players[0], players[1:]
+    for i, other in enumerate(rest):
+        for matching in _matchings(rest[:i] + rest[i + 1:]):
+            yield [(first, other)] + matching
+
+class Lobby:
+    '''
+    A free-for-all game of 2 to LOBBY_SIZE AI players sharing one shop.
+
+    Every round all living players get their income and roll an offer from
+    the shared pool, then buy, then fight the opponent the pairing scheduler
+    gave them. Losing a battle costs HP (see LOSS_DAMAGE_BASE and
+    LOSS_DAMAGE_PER_UNIT) and players at 0 HP are out, their units going
+    back to the shared pool; the last one standing wins.
+
+    Pairings: among all ways to pair the living players, the scheduler picks
+    one that repeats the fewest past matchups, preferring repeats of
+    matchups played longest ago. With an odd number of players one of them
+    fights a ghost, a copy of another living player's board picked at
+    random, and that battle only counts for the real player. The ghost is
+    paired like a player, so the ghost battle rotates too.
+
+    Shop: offers are rolled with their copies held out of the shared pool
+    (Shop.get_choices(hold=True)), so the offers of one phase never promise
+    the same copy twice; copies nobody bought go back after the phase.
+
+    Battles: the round's battles are independent, so they run in parallel on
+    a process pool; each gets its own child stream of the battle RNG, so the
+    results do not depend on the worker count.
+
+    Parameters:
+        players (list): The Player objects (quiet players are best).
+        policies (list): The shopping Policy of each player.
+        rng (RNG): Random stream of the lobby (defaults to the random module).
+        workers (int): Worker processes for the battles (defaults to the CPU
+            count; 1 runs them in this process).
+        start_hp (int): Starting HP of every player.
+    '''
+
+    def __init__(self, players, policies, rng=None, workers=None, start_hp=LOBBY_START_HP):
+        if not 2 <= len(players) <= LOBBY_SIZE:
+            raise ValueError(f"a lobby holds 2 to {LOBBY_SIZE} players")
+        shop_rng, self.battle_rng, pairing_rng = rng.spawn(3) if rng is not None else (None, None, None)
+        self.rng = pairing_rng if pairing_rng is not None else random
+        self.shop = Shop(shared=True, rng=shop_rng)
+        self.players = list(players)
+        self.policies = list(policies)
+        self.hp = [start_hp] * len(players)
+        self.alive = list(range(len(players)))
+        self.eliminated = []  # Player indices in the order they were knocked out
+        self.met = {}  # frozenset of two slots -> [times met, last round]
+        self.round = 0
+        self.ghost_source = None  # The player whose board the ghost copies this round
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Shuts down the worker processes.
+        '''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def finished(self):
+        return len(self.alive) <= 1
+
+    def pairings(self):
+        '''
+        Pairs the living players for the next round.
+
+        Returns:
+            list: (a, b) pairs of player indices; b is GHOST for the player
+                fighting a ghost board.
+        '''
+        slots = list(self.alive)
+        if len(slots) % 2:
+            slots.append(GHOST)
+        # Shuffle first so ties between equally good pairings are broken at random
+        self.rng.shuffle(slots)
+        best = None
+        for matching in _matchings(slots):
+            cost = [0, 0]
+            for a, b in matching:
+                times, last = self.met.get(frozenset((a, b)), (0, 0))
+                cost[0] += times
+                cost[1] += last
+            if best is None or cost < best[0]:
+                best = (cost, matching)
+        return [(a, b) if b == GHOST or a != GHOST else (b, a) for a, b in best[1]]
+
+    def _shop_phase(self, pairs):
+        '''
+        Gives every living player its income, an offer and its purchases.
+        '''
+        opponents = {}
+        for a, b in pairs:
+            opponents[a] = b
+            opponents[b] = a
+        offers = {}
+        for i in self.alive:
+            self.players[i].income()
+            offers[i] = self.shop.get_choices(hold=True)
+        for i in self.alive:
+            player = self.players[i]
+            rival = opponents[i] if opponents[i] != GHOST else self.ghost_source
+            choices = offers[i]
+            for idx in self.policies[i].choose(player, self.players[rival], choices):
+                player.buy_unit(choices[idx], self.shop)
+            self.shop.return_offer(choices)
+
+    def _board(self, i, enemy):
+        '''
+        Deploys player i against an enemy lineup and returns its board.
+        '''
+        player = self.players[i]
+        player.deploy_units(enemy)
+        return player.units.copy()
+
+    def play_round(self):
+        '''
+        Plays one round: pairing, shopping, battles, damage and eliminations.
+
+        Returns:
+            list: One (a, b, result, damage) tuple per battle, where b may be
+                GHOST and damage is the (a, b) HP lost.
+        '''
+        self.round += 1
+        pairs = self.pairings()
+        self.ghost_source = None
+        for a, b in pairs:
+            if b == GHOST:
+                self.ghost_source = self.rng.choice([i for i in self.alive if i != a])
+        self._shop_phase(pairs)
+
+        # Real pairs deploy first, so the ghost copies a board fielded this round
+        boards = {}
+        for a, b in pairs:
+            if b != GHOST:
+                boards[a] = self._board(a, self.players[b].reserve[:self.players[b].board_size])
+                boards[b] = self._board(b, self.players[a].units)
+        battles = []
+        for a, b in pairs:
+            if b == GHOST:
+                ghost = []
+                for unit in boards[self.ghost_source]:
+                    copy = Unit(unit.template)
+                    copy.atk = unit.atk  # Keeps the copied player's synergy bonuses
+                    ghost.append(copy)
+                battles.append((a, b, self._board(a, ghost), ghost))
+            else:
+                battles.append((a, b, boards[a], boards[b]))
+        results = self._run_battles(battles)
+
+        report = []
+        for (a, b, board_a, board_b), result in zip(battles, results):
+            # A ghost's streaks and HP do not matter, so it gets a throwaway player
+            apply_result(self.players[a], self.players[b] if b != GHOST else Player("ghost", verbose=False), result)
+            damage = [0, 0]
+            if result.winner == 0:
+                damage = [LOSS_DAMAGE_BASE, LOSS_DAMAGE_BASE]
+            else:
+                loser = result.winner % 2  # winner 1 -> side 1 (b) loses, winner 2 -> side 0 (a)
+                damage[loser] = LOSS_DAMAGE_BASE + LOSS_DAMAGE_PER_UNIT * result.survivors[1 - loser]
+            if b == GHOST:
+                damage[1] = 0
+            self.hp[a] -= damage[0]
+            if b != GHOST:
+                self.hp[b] -= damage[1]
+            key = frozenset((a, b))
+            self.met[key] = [self.met.get(key, (0, 0))[0] + 1, self.round]
+            report.append((a, b, result, tuple(damage)))
+
+        # Players knocked out in the same round are placed by their remaining HP
+        out = sorted((i for i in self.alive if self.hp[i] <= 0), key=lambda i: self.hp[i])
+        for i in out:
+            self._release_units(i)
+        self.eliminated.extend(out)
+        self.alive = [i for i in self.alive if self.hp[i] > 0]
+        return report
+
+    def _release_units(self, i):
+        '''
+        Returns every unit of an eliminated player to the shared pool and
+        empties the player's reserve and board.
+
+        A unit holds one copy whatever its star level, since each merge
+        already returned one of its two copies (see Player.try_merge).
+        '''
+        player = self.players[i]
+        held = {id(unit): unit for unit in player.reserve + player.units}
+        for unit in held.values():
+            self.shop.release(unit)
+        player.reserve = []
+        player.units = []
+
+    def _run_battles(self, battles):
+        '''
+        Runs the round's battles, in parallel when there is more than one worker.
+        '''
+        rngs = self.battle_rng.spawn(len(battles)) if self.battle_rng is not None else [None] * len(battles)
+        if self.workers == 1 or len(battles) == 1:
+            return [_fight(board_a, board_b, rng) for (a, b, board_a, board_b), rng in zip(battles, rngs)]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=min(self.workers, LOBBY_SIZE // 2))
+        futures = [self._pool.submit(_fight, board_a, board_b, rng)
+                   for (a, b, board_a, board_b), rng in zip(battles, rngs)]
+        return [future.result() for future in futures]
+
+    def standings(self):
+        '''
+        Returns the player indices from first place to last.
+        '''
+        return sorted(self.alive, key=lambda i: -self.hp[i]) + self.eliminated[::-1]
+
+    def play(self):
+        '''
+        Plays rounds until one player is left.
+
+        Returns:
+            list: The player indices from first place to last.
+        '''
+        while not self.finished():
+            self.play_round()
+        return self.standings()
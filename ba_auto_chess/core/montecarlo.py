@@ -0,0 +1,278 @@
+"""
+Monte Carlo battle runner for win-rate estimation
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from statistics import NormalDist
+from core.battle import simulate_battle
+from core.rng import RNG
+from models.unit import Unit
+
+def build_lineup(names, stars=None):
+    '''
+    Builds a lineup of fresh units from UNIT_POOL data.
+
+    Parameters:
+        names (list): Unit names, in acting order.
+        stars (list): Optional star level for each unit (defaults to 1).
+
+    Returns:
+        list: The Unit objects of the lineup.
+    '''
+    return [Unit.from_pool(name, stars[i] if stars else 1) for i, name in enumerate(names)]
+
+def wilson_interval(successes, n, confidence=0.95):
+    '''
+    Computes the Wilson score interval of a binomial proportion.
+
+    Parameters:
+        successes (int): Number of successes.
+        n (int): Number of trials.
+        confidence (float): Confidence level of the interval.
+
+    Returns:
+        tuple: (low, high) bounds of the interval.
+    '''
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    # The bound is exactly 0 or 1 when no trial or every trial succeeded;
+    # rounding would otherwise leave it just inside and exclude a certain outcome
+    low = 0.0 if successes == 0 else max(0.0, centre - half)
+    high = 1.0 if successes == n else min(1.0, centre + half)
+    return low, high
+
+class MatchupStats:
+    '''
+    Aggregated outcome of many simulated battles of lineup A against lineup B.
+
+    elapsed is the simulation time spent on this matchup alone (summed over
+    its chunks, so it is per-worker time), and cached is True when the counts
+    came from a BattleCache instead of being simulated.
+
+    Parameters:
+        confidence (float): Confidence level used for the intervals.
+    '''
+
+    def __init__(self, confidence=0.95):
+        self.confidence = confidence
+        self.wins = 0
+        self.ties = 0
+        self.losses = 0
+        self.elapsed = 0.0
+        self.cached = False
+
+    @property
+    def n(self):
+        return self.wins + self.ties + self.losses
+
+    @property
+    def win_rate(self):
+        return self.wins / self.n if self.n else 0.0
+
+    @property
+    def tie_rate(self):
+        return self.ties / self.n if self.n else 0.0
+
+    @property
+    def loss_rate(self):
+        return self.losses / self.n if self.n else 0.0
+
+    @property
+    def win_interval(self):
+        return wilson_interval(self.wins, self.n, self.confidence)
+
+    @property
+    def tie_interval(self):
+        return wilson_interval(self.ties, self.n, self.confidence)
+
+    @property
+    def loss_interval(self):
+        return wilson_interval(self.losses, self.n, self.confidence)
+
+    @property
+    def sims_per_second(self):
+        return self.n / self.elapsed if self.elapsed else 0.0
+
+    def width(self):
+        '''
+        Returns the widest of the win/tie/loss confidence intervals.
+        '''
+        return max(high - low for low, high in (self.win_interval, self.tie_interval, self.loss_interval))
+
+    def add(self, counts):
+        '''
+        Adds a (wins, ties, losses) chunk result to the totals.
+        '''
+        self.wins += counts[0]
+        self.ties += counts[1]
+        self.losses += counts[2]
+
+    def __repr__(self):
+        low, high = self.win_interval
+        speed = "cached" if self.cached else f"{self.sims_per_second:.0f} sims/s"
+        return (f"MatchupStats(n={self.n}, win={self.win_rate:.3f} [{low:.3f}, {high:.3f}], "
+                f"tie={self.tie_rate:.3f}, loss={self.loss_rate:.3f}, {speed})")
+
+def _run_chunk(team1, team2, rng, count):
+    '''
+    Simulates one work unit of battles; executed inside a worker process.
+
+    Parameters:
+        team1 (list): Units of lineup A.
+        team2 (list): Units of lineup B.
+        rng (RNG): This chunk's random stream.
+        count (int): Number of battles to simulate.
+
+    Returns:
+        tuple: ((wins, ties, losses) from lineup A's point of view, seconds spent).
+    '''
+    start = time.perf_counter()
+    outcomes = [0, 0, 0]
+    for _ in range(count):
+        winner = simulate_battle(team1, team2, rng=rng).winner
+        outcomes[0 if winner == 1 else 1 if winner == 0 else 2] += 1
+    return tuple(outcomes), time.perf_counter() - start
+
+class _Job:
+    '''
+    Scheduling state of one matchup: chunks are folded into the statistics in
+    chunk order, so results for a given seed do not depend on worker timing.
+    '''
+
+    def __init__(self, team1, team2, n, rng, confidence):
+        self.team1 = team1
+        self.team2 = team2
+        self.n = n
+        self.rng = rng
+        self.stats = MatchupStats(confidence)
+        self.cached_counts = (0, 0, 0)  # Counts that were already in the cache
+        self.next_chunk = 0
+        self.submitted = 0
+        self.folded = 0
+        self.pending = {}
+        self.done = False
+        self.cached = False
+
+def run_matchups(matchups, n=1000, seed=0, workers=None, chunk_size=250, ci_width=None, confidence=0.95, cache=None):
+    '''
+    Estimates win/tie/loss rates for many matchups on a process pool.
+
+    Every matchup is split into chunks of chunk_size battles, and the chunks
+    of all matchups share one pool. The seed's RNG spawns one stream per
+    matchup and that stream spawns one per chunk, so matchup i sees the same
+    random numbers in every run with the same seed (common random numbers
+    for A/B comparisons), whatever the worker count. A matchup stops
+    early once every confidence interval is narrower than ci_width.
+
+    Parameters:
+        matchups (list): (lineup A, lineup B) pairs of Unit lists.
+        n (int): Maximum number of battles per matchup.
+        seed (int): Base seed; the same seed gives the same statistics.
+        workers (int): Number of worker processes (defaults to the CPU count,
+            1 runs everything in this process).
+        chunk_size (int): Battles per work unit.
+        ci_width (float): Optional target confidence interval width for early stopping.
+        confidence (float): Confidence level of the intervals.
+        cache (BattleCache): Optional cache; matchups with at least n cached
+            battles are not simulated, matchups with fewer only simulate the
+            missing battles, and new results are added to it.
+
+    Returns:
+        list: One MatchupStats per matchup, in input order.
+    '''
+    workers = workers or os.cpu_count() or 1
+    streams = RNG(seed).spawn(len(matchups))
+    jobs = [_Job(a, b, n, streams[i], confidence) for i, (a, b) in enumerate(matchups)]
+    if cache is not None:
+        for job in jobs:
+            counts = cache.get(job.team1, job.team2)
+            if counts is None:
+                continue
+            job.stats.add(counts)
+            if sum(counts) >= n:
+                job.done = job.cached = job.stats.cached = True
+            else:
+                # The missing battles come from a branch of the stream that
+                # no earlier run drew from, so no battle is counted twice
+                job.cached_counts = counts
+                job.submitted = sum(counts)
+                job.rng = RNG(job.rng.entropy, job.rng.spawn_key + ("resume", job.submitted))
+
+    if workers == 1:
+        for job in jobs:
+            if job.cached:
+                continue
+            while not job.done:
+                count = min(chunk_size, job.n - job.submitted)
+                counts, seconds = _run_chunk(job.team1, job.team2, job.rng.spawn(1)[0], count)
+                job.stats.add(counts)
+                job.stats.elapsed += seconds
+                job.next_chunk += 1
+                job.submitted += count
+                job.done = job.submitted >= job.n or (ci_width is not None and job.stats.width() <= ci_width)
+        return _finish(jobs, cache)
+
+    in_flight = {}
+    max_in_flight = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def refill():
+            for job in jobs:
+                while not job.done and job.submitted < job.n and len(in_flight) < max_in_flight:
+                    count = min(chunk_size, job.n - job.submitted)
+                    future = pool.submit(_run_chunk, job.team1, job.team2, job.rng.spawn(1)[0], count)
+                    in_flight[future] = (job, job.next_chunk)
+                    job.next_chunk += 1
+                    job.submitted += count
+                if len(in_flight) >= max_in_flight:
+                    return
+
+        refill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job, chunk = in_flight.pop(future)
+                if job.done:
+                    continue
+                job.pending[chunk] = future.result()
+                while job.folded in job.pending:
+                    counts, seconds = job.pending.pop(job.folded)
+                    job.stats.add(counts)
+                    job.stats.elapsed += seconds
+                    job.folded += 1
+                    if job.stats.n >= job.n or (ci_width is not None and job.stats.width() <= ci_width):
+                        job.done = True
+                        break
+            refill()
+
+    return _finish(jobs, cache)
+
+def _finish(jobs, cache):
+    '''
+    Adds the newly simulated battles to the cache and returns the
+    statistics, which include the battles that were already cached.
+    '''
+    if cache is not None:
+        for job in jobs:
+            if not job.cached:
+                totals = (job.stats.wins, job.stats.ties, job.stats.losses)
+                cache.add(job.team1, job.team2, tuple(t - c for t, c in zip(totals, job.cached_counts)))
+    return [job.stats for job in jobs]
+
+def run_matchup(lineup_a, lineup_b, n=1000, seed=0, workers=None, chunk_size=250, ci_width=None, confidence=0.95, cache=None):
+    '''
+    Estimates the win/tie/loss rates of lineup A against lineup B.
+
+    See run_matchups for the parameters.
+
+    Returns:
+        MatchupStats: The aggregated statistics.
+    '''
+    return run_matchups([(lineup_a, lineup_b)], n, seed, workers, chunk_size, ci_width, confidence, cache)[0]
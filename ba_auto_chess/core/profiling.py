@@ -0,0 +1,229 @@
+"""
+Optional phase timers and battle event counters
+"""
+
+import json
+import sys
+import time
+from core import battle as battle_module
+from models.player import Player
+from models.shop import Shop
+from models.unit import Unit
+
+# Methods timed while a Profiler is enabled, as (class, method name)
+PHASES = [
+    (Player, "income"),
+    (Player, "buy_unit"),
+    (Player, "try_merge"),
+    (Player, "deploy_units"),
+    (Player, "apply_synergy_bonus"),
+    (Shop, "get_choices"),
+]
+
+class Profiler:
+    '''
+    Times game phases and counts battle events.
+
+    enable() wraps the methods of PHASES, Unit.attack (timed per skill) and
+    simulate_battle (timed per battle and per round, with every battle
+    event counted) and disable() puts the originals back, so the game runs
+    its unmodified code whenever profiling is off. simulate_battle is also
+    replaced in the modules that imported it by name.
+
+    Nested phases are tracked on a stack: every timer has a total time and
+    call count, and the self time of every stack path feeds the flame summary.
+    '''
+
+    def __init__(self):
+        self.timers = {}  # phase -> [calls, seconds]
+        self.counters = {}  # battle event -> count
+        self.rounds = {}  # rounds fought -> battles
+        self.folded = {}  # "outer;inner" stack path -> self seconds
+        self._stack = []  # [phase, start, child seconds] of the open phases
+        self._patches = []  # (owner, attribute, original)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def enable(self):
+        '''
+        Installs the timing wrappers.
+
+        Returns:
+            None
+        '''
+        if self._patches:
+            return
+        for cls, name in PHASES:
+            self._patch(cls, name, self._timed(f"{cls.__name__}.{name}", getattr(cls, name)))
+        self._patch(Unit, "attack", self._timed_attack(Unit.attack))
+        original = battle_module.simulate_battle
+        wrapper = self._timed_battle(original)
+        for module in list(sys.modules.values()):
+            if getattr(module, "simulate_battle", None) is original:
+                self._patch(module, "simulate_battle", wrapper)
+
+    def disable(self):
+        '''
+        Restores the original functions.
+
+        Returns:
+            None
+        '''
+        while self._patches:
+            owner, name, original = self._patches.pop()
+            setattr(owner, name, original)
+
+    def _patch(self, owner, name, replacement):
+        self._patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def _enter(self, phase):
+        self._stack.append([phase, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        phase, start, children = self._stack[-1]
+        elapsed = time.perf_counter() - start
+        path = ";".join(frame[0] for frame in self._stack)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        timer = self.timers.setdefault(phase, [0, 0.0])
+        timer[0] += 1
+        timer[1] += elapsed
+        self.folded[path] = self.folded.get(path, 0.0) + elapsed - children
+
+    def _timed(self, phase, func):
+        '''
+        Wraps a function in a phase timer.
+        '''
+        def wrapper(*args, **kwargs):
+            self._enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._exit()
+        return wrapper
+
+    def _timed_attack(self, attack):
+        '''
+        Wraps Unit.attack in a timer per skill.
+        '''
+        def wrapper(unit, enemies, allies, on_event=None):
+            self._enter(f"Unit.attack[{unit.skill}]")
+            try:
+                return attack(unit, enemies, allies, on_event)
+            finally:
+                self._exit()
+        return wrapper
+
+    def _timed_battle(self, simulate_battle):
+        '''
+        Wraps simulate_battle in a battle timer, a timer per round and an
+        event counter that passes every event on to the caller's callback.
+        '''
+        counters = self.counters
+
+        def wrapper(team1, team2, on_event=None, *args, **kwargs):
+            def count(event, *event_args):
+                counters[event] = counters.get(event, 0) + 1
+                if event == "round":
+                    if event_args[0] > 1:
+                        self._exit()
+                    self._enter("round")
+                if on_event is not None:
+                    on_event(event, *event_args)
+
+            self._enter("simulate_battle")
+            depth = len(self._stack)
+            try:
+                result = simulate_battle(team1, team2, count, *args, **kwargs)
+            finally:
+                # Close the last round (and anything an exception left open)
+                while len(self._stack) >= depth:
+                    self._exit()
+            counters["battle"] = counters.get("battle", 0) + 1
+            self.rounds[result.rounds] = self.rounds.get(result.rounds, 0) + 1
+            return result
+        return wrapper
+
+    def snapshot(self):
+        '''
+        Returns the measurements so far.
+
+        Returns:
+            dict: "timers" (phase -> calls, total_seconds, mean_us), "counters"
+                (battle event -> count, "battle" counting battles) and
+                "rounds_per_battle" (rounds fought -> battles).
+        '''
+        return {
+            "timers": {phase: {"calls": calls, "total_seconds": seconds, "mean_us": seconds / calls * 1e6}
+                       for phase, (calls, seconds) in sorted(self.timers.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "rounds_per_battle": {str(rounds): battles for rounds, battles in sorted(self.rounds.items())},
+        }
+
+    def to_json(self):
+        '''
+        Returns the snapshot as a JSON document.
+        '''
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        '''
+        Returns the snapshot in the Prometheus text exposition format.
+        '''
+        lines = [
+            "# HELP ba_phase_seconds_total Time spent in each game phase, nested phases included.",
+            "# TYPE ba_phase_seconds_total counter",
+        ]
+        lines += [f'ba_phase_seconds_total{{phase="{phase}"}} {seconds:.9f}'
+                  for phase, (calls, seconds) in sorted(self.timers.items())]
+        lines += ["# HELP ba_phase_calls_total Calls of each game phase.", "# TYPE ba_phase_calls_total counter"]
+        lines += [f'ba_phase_calls_total{{phase="{phase}"}} {calls}'
+                  for phase, (calls, seconds) in sorted(self.timers.items())]
+        lines += ["# HELP ba_battle_events_total Battle events by type.", "# TYPE ba_battle_events_total counter"]
+        lines += [f'ba_battle_events_total{{event="{event}"}} {count}'
+                  for event, count in sorted(self.counters.items())]
+        lines += ["# HELP ba_battle_rounds Rounds fought per battle.", "# TYPE ba_battle_rounds histogram"]
+        battles = 0
+        total = 0
+        for rounds, count in sorted(self.rounds.items()):
+            battles += count
+            total += rounds * count
+            lines.append(f'ba_battle_rounds_bucket{{le="{rounds}"}} {battles}')
+        lines += [f'ba_battle_rounds_bucket{{le="+Inf"}} {battles}',
+                  f"ba_battle_rounds_sum {total}", f"ba_battle_rounds_count {battles}"]
+        return "\n".join(lines) + "\n"
+
+    def flame_summary(self):
+        '''
+        Returns the self time of every phase stack in folded-stack format.
+
+        Each line is a ";"-joined stack path and its self time in
+        microseconds, largest first; flamegraph.pl and speedscope read it as is.
+        '''
+        return "".join(f"{path} {round(seconds * 1e6)}\n"
+                       for path, seconds in sorted(self.folded.items(), key=lambda item: -item[1]))
+
+    def dump(self, fmt="json", path=None):
+        '''
+        Writes the snapshot to a file, or to stderr without one.
+
+        Parameters:
+            fmt (str): "json", "prometheus" or "flame".
+            path (str): Output file.
+
+        Returns:
+            None
+        '''
+        text = {"json": self.to_json, "prometheus": self.to_prometheus, "flame": self.flame_summary}[fmt]()
+        if path is None:
+            sys.stderr.write(text if text.endswith("\n") else text + "\n")
+        else:
+            with open(path, "w") as f:
+                f.write(text)
@@ -0,0 +1,128 @@
+"""
+Buffered console renderer with verbosity levels and pacing
+"""
+
+import sys
+import time
+
+# Verbosity levels; a message is shown when its level is at most the renderer's
+SILENT = 0
+SUMMARY = 1
+FULL = 2
+LEVELS = {"silent": SILENT, "summary": SUMMARY, "full": FULL}
+
+class Renderer:
+    '''
+    Collects the game's console output and writes it out in batches.
+
+    Messages are buffered and written with one call per flush: the battle
+    flushes once per round, and prompts flush before asking. Messages above
+    the renderer's level are dropped without being formatted into the buffer.
+
+    Pacing is scheduled rather than slept inline: pace() flushes what is
+    buffered and sets the time the next flush may happen, and only that
+    flush waits for whatever part of the delay the game has not already
+    used up computing. A speed of 2 halves every delay and 0 disables pacing.
+
+    Parameters:
+        level (int): SILENT, SUMMARY or FULL.
+        speed (float): Pacing speed; 1 is normal, 2 twice as fast, 0 instant.
+        stream (file): Output stream (defaults to sys.stdout at write time).
+    '''
+
+    def __init__(self, level=FULL, speed=1.0, stream=None):
+        self.level = level
+        self.speed = speed
+        self.stream = stream
+        self.buffer = []
+        self._resume_at = 0.0  # perf_counter time before which nothing is flushed
+
+    def shows(self, level):
+        '''
+        Returns whether messages of a level are shown, so callers can skip
+        building text that would be dropped.
+        '''
+        return level <= self.level
+
+    def write(self, text="", level=FULL):
+        '''
+        Buffers one line of output.
+
+        Parameters:
+            text (str): The line, without a trailing newline.
+            level (int): SUMMARY for messages shown at every level but
+                silent, FULL for play-by-play detail.
+
+        Returns:
+            None
+        '''
+        if level <= self.level:
+            self.buffer.append(text)
+
+    def flush(self):
+        '''
+        Waits out any scheduled pause, then writes the buffered lines.
+
+        Returns:
+            None
+        '''
+        if not self.buffer:
+            return
+        self._wait()
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write("\n".join(self.buffer) + "\n")
+        stream.flush()
+        self.buffer.clear()
+
+    def pace(self, seconds):
+        '''
+        Flushes the buffer and delays the next flush by seconds / speed.
+
+        Parameters:
+            seconds (float): The delay at normal speed.
+
+        Returns:
+            None
+        '''
+        if not self.speed or self.level < FULL:
+            return
+        self.flush()
+        self._resume_at = max(self._resume_at, time.perf_counter()) + seconds / self.speed
+
+    def _wait(self):
+        remaining = self._resume_at - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def prompt(self, text):
+        '''
+        Flushes the buffer and reads a line of input.
+
+        Parameters:
+            text (str): The prompt.
+
+        Returns:
+            str: The line entered.
+        '''
+        self.flush()
+        self._wait()
+        return input(text)
+
+# The renderer all game output goes through; swap it with use()
+current = Renderer()
+
+def use(renderer):
+    '''
+    Routes all game output through a renderer.
+
+    Parameters:
+        renderer (Renderer): The new renderer.
+
+    Returns:
+        Renderer: The renderer it replaces, after flushing it.
+    '''
+    global current
+    previous = current
+    previous.flush()
+    current = renderer
+    return previous
@@ -0,0 +1,458 @@
+"""
+Append-only columnar store of battle results, read through memory maps
+"""
+
+import json
+import os
+import numpy as np
+from core.constants import MAX_UNITS_ON_FIELD, RULES
+from core.ruleset import MAX_STAR
+from models.unit import POOL_INDEX
+
+STORE_VERSION = 1
+
+# Rows a writer buffers before appending them to the column files
+CHUNK_ROWS = 1 << 16
+
+# Rows per query block, which bounds a query's working memory
+BLOCK_ROWS = 1 << 20
+
+def units_dtype(templates):
+    '''
+    Returns the dtype of the units column: the smallest unsigned integer
+    whose largest value, which marks an empty slot, is not a template id.
+
+    Parameters:
+        templates (int): Number of unit templates in the rules file.
+
+    Returns:
+        str: "u1" or "<u2".
+
+    Raises:
+        ValueError: If the templates do not fit in 16 bits.
+    '''
+    for dtype in ("u1", "<u2"):
+        if templates <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError(f"a result store holds at most {np.iinfo('<u2').max} unit templates, not {templates}")
+
+def empty_slot(dtype):
+    '''
+    Returns the units column value of an empty lineup slot.
+    '''
+    return int(np.iinfo(dtype).max)
+
+def columns(slots, templates, schools, elements):
+    '''
+    Returns the store's column layout.
+
+    Every column is one file of fixed-width little-endian rows; the shape
+    after the row count is the per-row shape. Side 0 is team1, side 1 team2.
+
+    Parameters:
+        slots (int): Lineup slots per side.
+        templates (int): Number of unit templates.
+        schools (int): Number of schools.
+        elements (int): Number of elements.
+
+    Returns:
+        dict: Column name -> (dtype string, per-row shape).
+    '''
+    return {
+        "seed": ("<u8", ()),  # Seed of the random stream the battle was drawn from
+        "winner": ("u1", ()),  # 1 or 2 for the winning team, 0 for a tie
+        "survivors": ("u1", (2,)),
+        "rounds": ("<u2", ()),
+        "units": (units_dtype(templates), (2, slots)),  # Template id (position in the rules file) or empty_slot
+        "stars": ("u1", (2, slots)),
+        "schools": ("u1", (2, schools)),  # Units of each school per side
+        "elements": ("u1", (2, elements)),  # Units of each element per side
+    }
+
+class ResultWriter:
+    '''
+    Appends battle results to a store directory.
+
+    Rows are buffered into chunks of chunk_rows and each full chunk is
+    appended to the column files. The row count in meta.json is only
+    advanced after a chunk's columns are written, so readers, and a writer
+    reopening the store after a crash, ignore any partial chunk.
+
+    Template ids are stored in one byte, or two for rules files with more
+    than 255 units; the units column's largest value (empty) marks an empty
+    slot.
+
+    Parameters:
+        path (str): The store directory; created if needed, appended to if it exists.
+        chunk_rows (int): Rows per chunk.
+    '''
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS):
+        units_dtype(len(RULES.names))  # Rejects rules files with too many units
+        self.path = path
+        self.chunk_rows = chunk_rows
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta["rules"] != RULES.digest:
+                raise ValueError(f"{path} holds results of another rules file")
+        else:
+            self.meta = {"version": STORE_VERSION, "rows": 0, "slots": MAX_UNITS_ON_FIELD, "rules": RULES.digest,
+                         "templates": list(RULES.names), "schools": list(RULES.schools),
+                         "elements": list(RULES.elements), "synergy_tiers": RULES.synergy_tiers}
+        self.layout = columns(self.meta["slots"], len(self.meta["templates"]), len(self.meta["schools"]),
+                              len(self.meta["elements"]))
+        self.empty = empty_slot(self.layout["units"][0])
+        self.files = {}
+        for name, (dtype, shape) in self.layout.items():
+            f = self.files[name] = open(os.path.join(path, name + ".col"), "ab")
+            # Drop rows of a chunk that was being written when a writer died
+            f.truncate(self.meta["rows"] * np.dtype(dtype).itemsize * int(np.prod(shape)))
+        self._buffer = {name: [] for name in self.layout}
+        self._buffered = 0
+        self._school_of = np.array(RULES.school_id, dtype=np.intp)
+        self._element_of = np.array(RULES.element_id, dtype=np.intp)
+        self._save_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _save_meta(self):
+        temp = os.path.join(self.path, "meta.json.tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(temp, os.path.join(self.path, "meta.json"))
+
+    def add(self, team1, team2, result, seed=0):
+        '''
+        Appends one battle.
+
+        Parameters:
+            team1 (list): The first team's units, as fielded.
+            team2 (list): The second team's units.
+            result (BattleResult): The outcome.
+            seed (int): Seed of the battle's random stream.
+
+        Returns:
+            None
+        '''
+        slots = self.meta["slots"]
+        units = np.full((1, 2, slots), self.empty, dtype=self.layout["units"][0])
+        stars = np.zeros((1, 2, slots), dtype=np.uint8)
+        for side, team in enumerate((team1, team2)):
+            for i, unit in enumerate(team[:slots]):
+                units[0, side, i] = POOL_INDEX[unit.name]
+                stars[0, side, i] = unit.star
+        self.add_batch(units, stars, [result.winner], [result.survivors], [result.rounds], [seed])
+
+    def add_batch(self, units, stars, winner, survivors, rounds, seeds):
+        '''
+        Appends many battles at once; the school and element columns are
+        derived from the units.
+
+        Parameters:
+            units (ndarray): (battles, 2, slots) template ids, the writer's
+                empty value for no unit.
+            stars (ndarray): (battles, 2, slots) star levels.
+            winner (ndarray): (battles,) 1, 2 or 0 for a tie.
+            survivors (ndarray): (battles, 2) surviving units per team.
+            rounds (ndarray): (battles,) rounds fought.
+            seeds (ndarray): (battles,) seed of each battle's random stream.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a column does not have the store's shape or a
+                template id is not one of the store's.
+        '''
+        units = np.asarray(units)
+        battles = len(units)
+        shapes = {"units": (units.shape, (battles, 2, self.meta["slots"])),
+                  "stars": (np.shape(stars), (battles, 2, self.meta["slots"])),
+                  "survivors": (np.shape(survivors), (battles, 2)),
+                  "winner": (np.shape(winner), (battles,)),
+                  "rounds": (np.shape(rounds), (battles,)),
+                  "seeds": (np.shape(seeds), (battles,))}
+        for name, (shape, expected) in shapes.items():
+            if shape != expected:
+                raise ValueError(f"{name} has shape {shape}, the store takes {expected}")
+        if ((units < 0) | ((units >= len(self.meta["templates"])) & (units != self.empty))).any():
+            raise ValueError(f"units holds ids that are neither templates of the store nor empty ({self.empty})")
+        units = units.astype(self.layout["units"][0], copy=False)
+        present = units != self.empty
+        template = np.where(present, units, 0)
+        batch = {
+            "seed": np.asarray(seeds, dtype=np.uint64),
+            "winner": np.asarray(winner, dtype=np.uint8),
+            "survivors": np.asarray(survivors, dtype=np.uint8),
+            "rounds": np.asarray(rounds, dtype=np.uint16),
+            "units": units,
+            "stars": np.asarray(stars, dtype=np.uint8),
+            "schools": _counts(self._school_of[template], present, len(self.meta["schools"])),
+            "elements": _counts(self._element_of[template], present, len(self.meta["elements"])),
+        }
+        for name, values in batch.items():
+            self._buffer[name].append(values)
+        self._buffered += len(units)
+        while self._buffered >= self.chunk_rows:
+            self._write(self.chunk_rows)
+
+    def _write(self, rows):
+        '''
+        Appends the first rows buffered rows to the column files.
+        '''
+        for name, (dtype, shape) in self.layout.items():
+            values = np.concatenate(self._buffer[name]) if len(self._buffer[name]) > 1 else self._buffer[name][0]
+            self.files[name].write(np.ascontiguousarray(values[:rows], dtype=dtype).tobytes())
+            self.files[name].flush()
+            self._buffer[name] = [values[rows:]] if len(values) > rows else []
+        self._buffered -= rows
+        self.meta["rows"] += rows
+        self._save_meta()
+
+    def flush(self):
+        '''
+        Writes the buffered rows as a (short) chunk.
+
+        Returns:
+            None
+        '''
+        if self._buffered:
+            self._write(self._buffered)
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+def _counts(ids, present, size):
+    '''
+    Counts, per battle and side, the present slots with each id.
+    '''
+    counts = np.zeros(ids.shape[:2] + (size,), dtype=np.uint8)
+    for value in range(size):
+        counts[..., value] = np.count_nonzero((ids == value) & present, axis=2)
+    return counts
+
+class ResultStore:
+    '''
+    Read-only view of a store directory.
+
+    Every column is a read-only NumPy memory map of the committed rows, so
+    opening a store costs nothing and queries only page in the columns they
+    touch.
+
+    Parameters:
+        path (str): The store directory.
+    '''
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{path} is not a version {STORE_VERSION} result store")
+        self.rows = self.meta["rows"]
+        self.templates = self.meta["templates"]
+        self.schools = self.meta["schools"]
+        self.elements = self.meta["elements"]
+        layout = columns(self.meta["slots"], len(self.templates), len(self.schools), len(self.elements))
+        self.empty = empty_slot(layout["units"][0])
+        self.columns = {}
+        for name, (dtype, shape) in layout.items():
+            if self.rows:
+                self.columns[name] = np.memmap(os.path.join(path, name + ".col"), dtype=dtype, mode="r",
+                                               shape=(self.rows,) + shape)
+            else:
+                self.columns[name] = np.zeros((0,) + shape, dtype=dtype)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def blocks(self, block_rows=BLOCK_ROWS):
+        '''
+        Yields (start, stop) row ranges covering the store.
+        '''
+        for start in range(0, self.rows, block_rows):
+            yield start, min(start + block_rows, self.rows)
+
+def _slots(store, name, start, stop):
+    '''
+    Returns a (slots, sides) copy of a lineup column for a block of rows,
+    so that each slot is one contiguous array.
+    '''
+    values = store[name][start:stop]
+    return np.ascontiguousarray(values.reshape(-1, values.shape[2]).T)
+
+def _has(units, template):
+    '''
+    Returns a (sides,) mask of the lineups fielding a template.
+    '''
+    found = units[0] == template
+    for slot in units[1:]:
+        found |= slot == template
+    return found
+
+def _side_filter(store, start, stop, units, filters):
+    '''
+    Returns a (sides,) mask of the sides a query counts; side s of row r is
+    entry 2 * r + s.
+
+    A side passes when its lineup has every unit of filters["with"] and
+    size filters["size"], its opponent has every unit of filters["against"],
+    and the battle's rounds are within the bounds.
+    '''
+    mask = np.ones(units.shape[1], dtype=bool)
+    if filters.get("size") is not None:
+        mask &= (units != store.empty).sum(axis=0, dtype=np.int8) == filters["size"]
+    for template in filters.get("with", ()):
+        mask &= _has(units, template)
+    for template in filters.get("against", ()):
+        mask &= _has(units, template).reshape(-1, 2)[:, ::-1].reshape(-1)
+    if filters.get("min_rounds") is not None or filters.get("max_rounds") is not None:
+        rounds = store["rounds"][start:stop]
+        within = np.ones(stop - start, dtype=bool)
+        if filters.get("min_rounds") is not None:
+            within &= rounds >= filters["min_rounds"]
+        if filters.get("max_rounds") is not None:
+            within &= rounds <= filters["max_rounds"]
+        mask &= np.repeat(within, 2)
+    return mask
+
+# Outcome of each side by winner column value: 0 won, 1 tied, 2 lost;
+# 3 marks the sides a query filters out
+OUTCOME = np.array([[1, 1], [0, 2], [2, 0]], dtype=np.intp)
+FILTERED = 3
+
+# Groups per histogrammed lane of membership bits
+LANE_BITS = 16
+
+def win_rates(store, by, filters=None):
+    '''
+    Aggregates the win rate of lineups grouped by a feature.
+
+    Each battle counts once for each side that passes the filters; a side
+    belongs to every group it has (a lineup with Hina and Iori counts for
+    both), but only once per group however many copies it fields.
+
+    The store is scanned in blocks. Group membership is packed into 16-bit
+    lanes, sixteen groups per lane, and each lane is histogrammed together
+    with the side's outcome; the group totals are unpacked from the
+    histograms at the end, so a block costs a few passes over its columns
+    however many groups there are.
+
+    Parameters:
+        store (ResultStore): The results.
+        by (str): "units" (per template), "stars" (per template and star),
+            "schools" (per school and active synergy tier) or "elements"
+            (per element mix, the count of each element in the lineup).
+        filters (dict): Optional "with" and "against" template id lists,
+            "size", "min_rounds" and "max_rounds".
+
+    Returns:
+        list: (group label, sides, wins, ties) tuples, most sides first.
+    '''
+    filters = filters or {}
+    labels, groups = _groups(store, by)
+    if by == "elements":
+        hist = np.zeros((1, groups, 4), dtype=np.int64)
+    else:
+        hist = np.zeros((-(-groups // LANE_BITS), 1 << LANE_BITS, 4), dtype=np.int64)
+    for start, stop in store.blocks():
+        units = _slots(store, "units", start, stop)
+        outcome = OUTCOME[store["winner"][start:stop]].reshape(-1)
+        outcome[~_side_filter(store, start, stop, units, filters)] = FILTERED
+        if by == "elements":
+            keys = [_element_key(store, start, stop)]
+        else:
+            keys = _member_lanes(store, by, start, stop, units, groups)
+        for lane, key in enumerate(keys):
+            hist[lane] += np.bincount(key.astype(np.intp) * 4 + outcome, minlength=hist.shape[1] * 4).reshape(-1, 4)
+    if by == "elements":
+        totals = hist[0]
+    else:
+        totals = np.zeros((hist.shape[0] * LANE_BITS, 4), dtype=np.int64)
+        value = np.arange(1 << LANE_BITS)
+        for lane in range(hist.shape[0]):
+            for bit in range(LANE_BITS):
+                totals[lane * LANE_BITS + bit] = hist[lane][(value >> bit) & 1 == 1].sum(axis=0)
+    table = []
+    for g in np.flatnonzero(totals[:groups, :FILTERED].sum(axis=1)):
+        wins, ties, losses = (int(n) for n in totals[g, :FILTERED])
+        table.append((labels(g), wins + ties + losses, wins, ties))
+    table.sort(key=lambda row: -row[1])
+    return table
+
+def _tiers(store):
+    return sorted(int(needed) for needed in store.meta["synergy_tiers"])
+
+def _groups(store, by):
+    '''
+    Returns (label function, number of groups) of a grouping.
+    '''
+    if by == "units":
+        return (lambda g: store.templates[g]), len(store.templates)
+    if by == "stars":
+        return (lambda g: f"{store.templates[g // MAX_STAR]} ★{g % MAX_STAR + 1}"), len(store.templates) * MAX_STAR
+    if by == "schools":
+        tiers = _tiers(store)
+        return (lambda g: f"{store.schools[g // len(tiers)]} {tiers[g % len(tiers)]}+"), len(store.schools) * len(tiers)
+    if by == "elements":
+        base = store.meta["slots"] + 1
+        def label(g):
+            counts = [(g // base ** e) % base for e in range(len(store.elements))]
+            return " ".join(f"{count} {element}" for element, count in zip(store.elements, counts) if count)
+        return label, base ** len(store.elements)
+    raise ValueError(f"unknown grouping {by!r}")
+
+def _element_key(store, start, stop):
+    '''
+    Numbers the element mix of each side, in base slots + 1.
+    '''
+    counts = store["elements"][start:stop]
+    base = store.meta["slots"] + 1
+    key = np.zeros(counts.shape[:2], dtype=np.intp)
+    for e in range(counts.shape[2]):
+        key += counts[:, :, e].astype(np.intp) * base ** e
+    return key.reshape(-1)
+
+def _member_lanes(store, by, start, stop, units, groups):
+    '''
+    Packs the groups each side belongs to into (sides,) uint16 arrays; bit b
+    of lane l is group 16 * l + b.
+    '''
+    lanes = -(-groups // LANE_BITS)
+    if by == "schools":
+        counts = _slots(store, "schools", start, stop)
+        tiers = _tiers(store)
+        packed = [np.zeros(units.shape[1], dtype=np.uint16) for _ in range(lanes)]
+        for g in range(groups):
+            school, tier = divmod(g, len(tiers))
+            packed[g // LANE_BITS] |= (counts[school] >= tiers[tier]).astype(np.uint16) << (g % LANE_BITS)
+        return packed
+    # bits[w][k] is the bit of group k in 64-bit word w; column blank, which
+    # empty slots are looked up in, sets none. One-byte ids index the table
+    # directly, wider ones have their empty slots remapped to a small table
+    blank = max(groups, store.empty) if store.empty <= np.iinfo(np.uint8).max else groups
+    bits = np.zeros(((groups + 63) // 64, blank + 1), dtype="<u8")
+    for g in range(groups):
+        bits[g // 64, g] = 1 << (g % 64)
+    key = units
+    if by == "stars":
+        stars = np.minimum(_slots(store, "stars", start, stop), MAX_STAR)
+        key = units.astype(np.uint16 if blank <= np.iinfo(np.uint16).max else np.intp) * MAX_STAR + stars - 1
+        key[units == store.empty] = blank
+    elif blank != store.empty:
+        key = np.where(units == store.empty, blank, units)
+    packed = []
+    for table in bits:
+        word = np.take(table, key[0])
+        for slot in key[1:]:
+            word |= np.take(table, slot)
+        packed.extend(word.view("<u2").reshape(-1, 4).T)
+    return packed[:lanes]
@@ -0,0 +1,354 @@
+"""
+Unit, skill, element and synergy definitions loaded from a data file
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import sys
+from array import array
+
+# The data file used when BA_AUTO_CHESS_RULES does not name another one
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "units.json")
+
+# Skills whose behaviour the battle engines implement; a data file gives each its parameters
+IMPLEMENTED_SKILLS = ("/", "shield", "heal", "AOE-2", "AOE-3", "AOE-all")
+
+# Star levels with precompiled stat tables; higher stars are computed on upgrade
+MAX_STAR = 4
+
+# Bump when the compiled layout changes, so stale cache entries are never read
+COMPILED_VERSION = 1
+
+class RulesetError(ValueError):
+    '''
+    Raised when a rules data file does not match the schema.
+    '''
+
+def _fail(where, message):
+    raise RulesetError(f"{where}: {message}")
+
+def _check_keys(where, value, required, optional=()):
+    if not isinstance(value, dict):
+        _fail(where, "expected an object")
+    missing = [key for key in required if key not in value]
+    if missing:
+        _fail(where, f"missing {', '.join(missing)}")
+    unknown = [key for key in value if key not in required and key not in optional]
+    if unknown:
+        _fail(where, f"unknown field {', '.join(unknown)}")
+
+def _check_int(where, value, minimum):
+    if type(value) is not int or value < minimum:
+        _fail(where, f"expected an integer of at least {minimum}, got {value!r}")
+
+def _check_number(where, value):
+    if type(value) not in (int, float) or value <= 0:
+        _fail(where, f"expected a positive number, got {value!r}")
+
+def _int_keys(where, table):
+    '''
+    Converts the string keys of a JSON object to positive integers.
+    '''
+    if not isinstance(table, dict):
+        _fail(where, "expected an object")
+    result = {}
+    for key, value in table.items():
+        if not key.isdigit() or int(key) < 1:
+            _fail(where, f"key {key!r} is not a positive integer")
+        _check_int(f"{where}.{key}", value, 0)
+        result[int(key)] = value
+    return result
+
+def validate(data):
+    '''
+    Checks parsed rules data against the schema.
+
+    The file holds "version" (1), "elements" (attacker element -> defender
+    element -> damage multiplier, for every pair), "skills" (each of
+    IMPLEMENTED_SKILLS -> its damage "divisor" and "targets", the number
+    of random enemies hit, which only AOE-2 and AOE-3 may change; AOE-all
+    has 0 for every enemy and the others 1), "schools" (names, in id order), "synergy_tiers" (units of
+    one school -> ATK bonus), "pool_copies" (unit cost -> copies in a
+    shared pool), "star_growth" ("hp" and "atk" multipliers per star) and
+    "units" (objects with name, cost, hp, atk, skill, school and element).
+
+    Parameters:
+        data (dict): The parsed file.
+
+    Returns:
+        None
+
+    Raises:
+        RulesetError: Naming the first field that does not match.
+    '''
+    _check_keys("rules", data, ("version", "elements", "skills", "schools", "synergy_tiers",
+                                "pool_copies", "star_growth", "units"))
+    if data["version"] != 1:
+        _fail("version", f"unsupported version {data['version']!r}")
+
+    elements = data["elements"]
+    if not isinstance(elements, dict) or not elements:
+        _fail("elements", "expected a non-empty object")
+    for attacker, row in elements.items():
+        _check_keys(f"elements.{attacker}", row, tuple(elements))
+        for defender, multiplier in row.items():
+            if type(multiplier) not in (int, float) or multiplier < 0:
+                _fail(f"elements.{attacker}.{defender}", f"expected a non-negative number, got {multiplier!r}")
+
+    _check_keys("skills", data["skills"], IMPLEMENTED_SKILLS)
+    for skill, params in data["skills"].items():
+        _check_keys(f"skills.{skill}", params, ("targets", "divisor"))
+        _check_int(f"skills.{skill}.divisor", params["divisor"], 1)
+        # Only the random-target AOE skills have a configurable target count
+        if skill in ("AOE-2", "AOE-3"):
+            _check_int(f"skills.{skill}.targets", params["targets"], 1)
+        elif params["targets"] != (0 if skill == "AOE-all" else 1):
+            _fail(f"skills.{skill}.targets", f"{skill} always hits {'every enemy (0)' if skill == 'AOE-all' else 'one enemy (1)'}")
+
+    schools = data["schools"]
+    if not isinstance(schools, list) or not all(isinstance(school, str) for school in schools):
+        _fail("schools", "expected a list of names")
+    if len(set(schools)) != len(schools):
+        _fail("schools", "names must be unique")
+
+    _int_keys("synergy_tiers", data["synergy_tiers"])
+    copies = _int_keys("pool_copies", data["pool_copies"])
+    _check_keys("star_growth", data["star_growth"], ("hp", "atk"))
+    for stat, growth in data["star_growth"].items():
+        _check_number(f"star_growth.{stat}", growth)
+
+    units = data["units"]
+    if not isinstance(units, list) or not units:
+        _fail("units", "expected a non-empty list")
+    names = set()
+    for i, unit in enumerate(units):
+        where = f"units[{i}]"
+        _check_keys(where, unit, ("name", "cost", "hp", "atk", "skill", "school", "element"))
+        if not isinstance(unit["name"], str) or not unit["name"]:
+            _fail(f"{where}.name", "expected a name")
+        if unit["name"] in names:
+            _fail(f"{where}.name", f"duplicate unit {unit['name']!r}")
+        names.add(unit["name"])
+        _check_int(f"{where}.cost", unit["cost"], 1)
+        if unit["cost"] not in copies:
+            _fail(f"{where}.cost", f"no pool_copies entry for cost {unit['cost']}")
+        _check_int(f"{where}.hp", unit["hp"], 1)
+        _check_int(f"{where}.atk", unit["atk"], 0)
+        if unit["skill"] not in data["skills"]:
+            _fail(f"{where}.skill", f"unknown skill {unit['skill']!r}")
+        if unit["school"] not in schools:
+            _fail(f"{where}.school", f"unknown school {unit['school']!r}")
+        if unit["element"] not in elements:
+            _fail(f"{where}.element", f"unknown element {unit['element']!r}")
+
+class Ruleset:
+    '''
+    The compiled form of a rules data file.
+
+    Names are interned to integer ids (an element's, skill's and school's
+    position in elements, skills and schools), and the units are stored as
+    parallel arrays indexed by their position in the file: cost, skill,
+    school and element ids, and one HP and one ATK array per star level up
+    to MAX_STAR, built with the same rounding as UnitTemplate.upgraded.
+
+    Parameters:
+        fields (dict): The compiled fields (see compile_rules).
+    '''
+
+    def __init__(self, fields):
+        self.digest = fields["digest"]
+        self.elements = tuple(fields["elements"])
+        self.multiplier = tuple(fields["multiplier"])  # [attacker id * len(elements) + defender id]
+        self.skills = tuple(fields["skills"])
+        self.skill_targets = tuple(fields["skill_targets"])
+        self.skill_divisor = tuple(fields["skill_divisor"])
+        self.schools = tuple(fields["schools"])
+        self.synergy_tiers = dict(fields["synergy_tiers"])
+        self.pool_copies = dict(fields["pool_copies"])
+        self.star_growth = tuple(fields["star_growth"])  # (hp, atk) multipliers
+        self.names = tuple(fields["names"])
+        self.cost = array("i", fields["cost"])
+        self.skill_id = array("h", fields["skill_id"])
+        self.school_id = array("h", fields["school_id"])
+        self.element_id = array("h", fields["element_id"])
+        self.hp = [array("i", table) for table in fields["hp"]]  # hp[star - 1][unit index]
+        self.atk = [array("i", table) for table in fields["atk"]]
+
+    def _fields(self):
+        '''
+        Returns the fields as marshal-friendly values, arrays as raw bytes.
+        '''
+        return {
+            "digest": self.digest, "elements": self.elements, "multiplier": self.multiplier,
+            "skills": self.skills, "skill_targets": self.skill_targets, "skill_divisor": self.skill_divisor,
+            "schools": self.schools, "synergy_tiers": self.synergy_tiers, "pool_copies": self.pool_copies,
+            "star_growth": self.star_growth, "names": self.names,
+            "cost": self.cost.tobytes(), "skill_id": self.skill_id.tobytes(),
+            "school_id": self.school_id.tobytes(), "element_id": self.element_id.tobytes(),
+            "hp": [table.tobytes() for table in self.hp], "atk": [table.tobytes() for table in self.atk],
+        }
+
+    def unit_pool(self):
+        '''
+        Returns the units as the list of dicts known as UNIT_POOL.
+        '''
+        return [{"name": name, "cost": self.cost[i], "hp": self.hp[0][i], "atk": self.atk[0][i],
+                 "skill": self.skills[self.skill_id[i]], "school": self.schools[self.school_id[i]],
+                 "element": self.elements[self.element_id[i]]}
+                for i, name in enumerate(self.names)]
+
+    def multiplier_table(self):
+        '''
+        Returns the element multipliers as nested dicts (attacker -> defender -> multiplier).
+        '''
+        n = len(self.elements)
+        return {a: {d: self.multiplier[i * n + j] for j, d in enumerate(self.elements)}
+                for i, a in enumerate(self.elements)}
+
+def compile_rules(data, digest):
+    '''
+    Compiles validated rules data into a Ruleset.
+
+    Parameters:
+        data (dict): Parsed rules data that passed validate().
+        digest (str): Content hash of the file it came from.
+
+    Returns:
+        Ruleset: The compiled rules.
+    '''
+    elements = list(data["elements"])
+    skills = list(data["skills"])
+    schools = list(data["schools"])
+    units = data["units"]
+    hp_growth, atk_growth = data["star_growth"]["hp"], data["star_growth"]["atk"]
+    hp = [[unit["hp"] for unit in units]]
+    atk = [[unit["atk"] for unit in units]]
+    for _ in range(1, MAX_STAR):
+        hp.append([int(value * hp_growth) for value in hp[-1]])
+        atk.append([int(value * atk_growth) for value in atk[-1]])
+    return Ruleset({
+        "digest": digest,
+        "elements": elements,
+        "multiplier": [float(data["elements"][a][d]) for a in elements for d in elements],
+        "skills": skills,
+        "skill_targets": [data["skills"][s]["targets"] for s in skills],
+        "skill_divisor": [data["skills"][s]["divisor"] for s in skills],
+        "schools": schools,
+        "synergy_tiers": {int(k): v for k, v in data["synergy_tiers"].items()},
+        "pool_copies": {int(k): v for k, v in data["pool_copies"].items()},
+        "star_growth": (hp_growth, atk_growth),
+        "names": [unit["name"] for unit in units],
+        "cost": [unit["cost"] for unit in units],
+        "skill_id": [skills.index(unit["skill"]) for unit in units],
+        "school_id": [schools.index(unit["school"]) for unit in units],
+        "element_id": [elements.index(unit["element"]) for unit in units],
+        "hp": hp,
+        "atk": atk,
+    })
+
+def _from_cache(fields):
+    '''
+    Rebuilds a Ruleset from the fields stored by Ruleset._fields.
+    '''
+    for key, typecode in (("cost", "i"), ("skill_id", "h"), ("school_id", "h"), ("element_id", "h")):
+        table = array(typecode)
+        table.frombytes(fields[key])
+        fields[key] = table
+    for key in ("hp", "atk"):
+        tables = []
+        for raw in fields[key]:
+            table = array("i")
+            table.frombytes(raw)
+            tables.append(table)
+        fields[key] = tables
+    return Ruleset(fields)
+
+def default_cache_dir():
+    '''
+    Returns the compiled rules cache directory (BA_AUTO_CHESS_CACHE, or ~/.cache/ba_auto_chess).
+    '''
+    return os.environ.get("BA_AUTO_CHESS_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "ba_auto_chess")
+
+def load(path=None, cache_dir=None, use_cache=True):
+    '''
+    Loads a rules data file, through the compiled cache when possible.
+
+    The rules' digest is a SHA-256 of the file's bytes alone, so saved data
+    stamped with it stays valid across Python upgrades. The cache entry is
+    keyed by the digest, COMPILED_VERSION and the marshal format, so an
+    edited file, a new compiled layout or another Python version never
+    reads a stale entry. A hit skips JSON parsing,
+    validation and compiling and only unmarshals the stored arrays; a miss
+    compiles the file and writes the entry (atomically, through a temporary
+    file; an unwritable cache directory is not an error).
+
+    Parameters:
+        path (str): The data file (defaults to DEFAULT_RULES).
+        cache_dir (str): The cache directory (defaults to default_cache_dir()).
+        use_cache (bool): Whether to read and write the cache.
+
+    Returns:
+        Ruleset: The compiled rules.
+
+    Raises:
+        RulesetError: If the file is not valid JSON or does not match the schema.
+    '''
+    path = path or DEFAULT_RULES
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    key = hashlib.sha256(f"{digest}/{COMPILED_VERSION}/{marshal.version}/"
+                         f"{sys.version_info[0]}.{sys.version_info[1]}".encode()).hexdigest()
+    cached = os.path.join(cache_dir or default_cache_dir(), f"rules-{key}.bin")
+    if use_cache:
+        try:
+            with open(cached, "rb") as f:
+                return _from_cache(marshal.load(f))
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            pass
+
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise RulesetError(f"{path}: {e}") from None
+    try:
+        validate(data)
+    except RulesetError as e:
+        raise RulesetError(f"{path}: {e}") from None
+    rules = compile_rules(data, digest)
+
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            temp = f"{cached}.{os.getpid()}.tmp"
+            with open(temp, "wb") as f:
+                marshal.dump(rules._fields(), f)
+            os.replace(temp, cached)
+        except OSError:
+            pass
+    return rules
+
+def main():
+    '''
+    Validates and precompiles rules files, e.g. every variant of a balance sweep.
+
+    Returns:
+        None
+    '''
+    paths = sys.argv[1:] or [DEFAULT_RULES]
+    failed = False
+    for path in paths:
+        try:
+            rules = load(path)
+        except (OSError, RulesetError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            failed = True
+        else:
+            print(f"{path}: {len(rules.names)} units, {len(rules.schools)} schools, digest {rules.digest[:12]}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
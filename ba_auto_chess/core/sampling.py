@@ -0,0 +1,79 @@
+"""
+Weighted sampling structures
+"""
+
+import random
+
+class FenwickSampler:
+    '''
+    Draws indices with probability proportional to integer weights.
+
+    Backed by a Fenwick (binary indexed) tree, so changing a weight and
+    drawing an index are both O(log n).
+
+    Parameters:
+        weights (list): Initial non-negative integer weight of each index.
+        rng (random.Random): Random generator for sample() (defaults to the random module).
+    '''
+
+    def __init__(self, weights, rng=None):
+        self.rng = rng if rng is not None else random
+        self.size = len(weights)
+        self.weights = list(weights)
+        self.tree = [0] * (self.size + 1)
+        self.total = 0
+        for i, weight in enumerate(self.weights):
+            self._add(i, weight)
+        self._top = 1 << self.size.bit_length() if self.size else 0
+
+    def _add(self, i, delta):
+        self.total += delta
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def update(self, i, delta):
+        '''
+        Adds delta to the weight of index i.
+
+        Parameters:
+            i (int): The index to change.
+            delta (int): The weight change; the weight must stay non-negative.
+
+        Returns:
+            None
+        '''
+        if self.weights[i] + delta < 0:
+            raise ValueError(f"weight of index {i} would become negative")
+        self.weights[i] += delta
+        self._add(i, delta)
+
+    def find(self, r):
+        '''
+        Returns the index whose cumulative weight range contains r.
+
+        Parameters:
+            r (int): A value in [0, total).
+
+        Returns:
+            int: The index.
+        '''
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= r:
+                pos = nxt
+                r -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def sample(self):
+        '''
+        Draws one index with probability weight / total.
+
+        Returns:
+            int: The drawn index.
+        '''
+        return self.find(self.rng.randrange(self.total))
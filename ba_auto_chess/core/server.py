@@ -0,0 +1,344 @@
+"""
+Asyncio match server hosting many games over a line protocol
+"""
+
+import asyncio
+import os
+import secrets
+import sys
+from core import snapshot
+from core.ai import GreedyPolicy
+from core.battle import simulate_battle, apply_result
+from core.constants import GAME_ROUNDS, WINS_TO_END
+from core.rng import RNG
+from models.player import Player
+from models.shop import Shop
+
+# Line protocol, one UTF-8 message per line, fields separated by single spaces.
+#
+# Server to client:
+#   HELLO <version> <match id>             once, after connecting
+#   RESUMED <round>                        reply to RESUME; play continues after that round
+#   ROUND <round> <gold>                   a shopping phase starts; gold after income
+#   SHOP <idx> <name> <cost> <hp> <atk> <skill> <school> <element>
+#                                          one line per offered unit
+#   BUY? <seconds>                         waiting for a BUY; the AI shops for
+#                                          the player once the seconds run out
+#   TIMEOUT                                the AI shopped for the player
+#   RESERVE <gold> [<name>:<star> ...]     the player's gold and reserve after shopping
+#   BATTLE <winner> <survivors> <enemy survivors> <rounds>
+#                                          winner is 1 (the player), 2 (the AI) or 0
+#   SCORE <wins> <enemy wins>
+#   END WIN|LOSS|DRAW                      the game is over; the server closes
+#   ERR <message>                          a bad command; the BUY? still stands
+#   BYE                                    reply to QUIT
+#
+# Client to server:
+#   PLAY                                   after HELLO: start a new game
+#   RESUME <match id>                      after HELLO: continue a game whose connection
+#                                          (or server) was lost; needs --state-dir
+#   BUY [<idx> ...]                        buy these offers, in order (none to skip)
+#   QUIT                                   leave the game
+PROTOCOL_VERSION = 2
+
+class _Quit(Exception):
+    '''
+    Raised when the client leaves the game or disconnects.
+    '''
+
+class Match:
+    '''
+    One game of a connected player against the AI.
+
+    The rounds follow main.py: income, shopping, deploying and a battle,
+    until GAME_ROUNDS rounds are played or a side has WINS_TO_END wins.
+    While the server waits for a command the match is a suspended coroutine,
+    so idle players cost no CPU.
+
+    With a state_dir the match snapshots itself (core/snapshot.py) there at
+    the start and after every round, so a client can RESUME it after a lost
+    connection or a server restart; the file is removed when the game ends
+    or the player quits.
+
+    Parameters:
+        reader (StreamReader): The connection's input.
+        writer (StreamWriter): The connection's output.
+        rng (RNG): The match's random stream.
+        policy (Policy): How the AI shops, and how the player's shopping is
+            done once shop_timeout runs out.
+        shop_timeout (float): Seconds the player has for each BUY.
+        match_id (str): The id clients resume the match with.
+        state_dir (str): Directory of the match snapshots, or None for none.
+    '''
+
+    def __init__(self, reader, writer, rng, policy, shop_timeout, match_id=None, state_dir=None):
+        self.reader = reader
+        self.writer = writer
+        self.policy = policy
+        self.shop_timeout = shop_timeout
+        self.match_id = match_id or secrets.token_hex(8)
+        self.state_dir = state_dir
+        shop_rng, self.battle_rng = rng.spawn(2)
+        self.shop = Shop(rng=shop_rng)
+        self.player = Player("Player", verbose=False)
+        self.ai = Player("AI", verbose=False)
+        self.round = 0
+        self.timeouts = 0
+
+    @classmethod
+    def resume(cls, reader, writer, data, policy, shop_timeout, match_id, state_dir):
+        '''
+        Rebuilds a match from its snapshot.
+
+        Returns:
+            Match: The match, ready to play its next round.
+        '''
+        state = snapshot.unpack(data)
+        match = cls.__new__(cls)
+        match.reader, match.writer = reader, writer
+        match.policy, match.shop_timeout = policy, shop_timeout
+        match.match_id, match.state_dir = match_id, state_dir
+        match.shop = state["shop"]
+        match.battle_rng = state["rngs"][0]
+        match.player, match.ai = state["players"]
+        match.round = state["round"]
+        match.timeouts = state["fields"][0]
+        return match
+
+    def path(self):
+        return os.path.join(self.state_dir, f"{self.match_id}.snap")
+
+    def save(self):
+        '''
+        Writes the match snapshot, replacing the previous one atomically.
+        '''
+        if self.state_dir is None:
+            return
+        data = snapshot.pack(self.shop, [self.battle_rng], [self.player, self.ai], self.round, [self.timeouts])
+        temp = self.path() + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, self.path())
+
+    def discard(self):
+        '''
+        Removes the match snapshot once the match cannot be resumed any more.
+        '''
+        if self.state_dir is not None:
+            try:
+                os.unlink(self.path())
+            except FileNotFoundError:
+                pass
+
+    def send(self, *lines):
+        self.writer.write(("\n".join(lines) + "\n").encode())
+
+    async def _read_purchase(self, choices):
+        '''
+        Reads BUY commands until a valid one arrives or the time runs out.
+
+        Returns:
+            list: Indices into choices, or None on timeout.
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.shop_timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if not line:
+                raise _Quit()
+            command, *fields = line.decode("utf-8", "replace").split() or [""]
+            if command == "QUIT":
+                self.discard()
+                self.send("BYE")
+                raise _Quit()
+            if command != "BUY":
+                self.send(f"ERR expected BUY or QUIT, got {command or 'an empty line'}")
+                continue
+            try:
+                picked = [int(field) for field in fields]
+            except ValueError:
+                self.send("ERR BUY takes offer indices")
+                continue
+            if any(not 0 <= idx < len(choices) for idx in picked) or len(set(picked)) != len(picked):
+                self.send(f"ERR offer indices must be distinct and in 0..{len(choices) - 1}")
+                continue
+            return picked
+
+    async def _shop(self, round_id):
+        '''
+        Runs the shopping phase of both sides.
+        '''
+        player, ai, shop = self.player, self.ai, self.shop
+        player.income()
+        choices = shop.get_choices()
+        self.send(f"ROUND {round_id} {player.gold}",
+                  *(f"SHOP {i} {u.name} {u.cost} {u.max_hp} {u.atk} {u.skill} {u.school} {u.element}"
+                    for i, u in enumerate(choices)),
+                  f"BUY? {self.shop_timeout:g}")
+        await self.writer.drain()
+        picked = await self._read_purchase(choices)
+        if picked is None:
+            self.timeouts += 1
+            self.send("TIMEOUT")
+            picked = self.policy.choose(player, ai, choices)
+        for idx in picked:
+            player.buy_unit(choices[idx], shop)
+        self.send(" ".join([f"RESERVE {player.gold}"] + [f"{u.name}:{u.star}" for u in player.reserve]))
+
+        ai.income()
+        choices = shop.get_choices()
+        for idx in self.policy.choose(ai, player, choices):
+            ai.buy_unit(choices[idx], shop)
+
+    async def play(self):
+        '''
+        Plays the match to the end.
+
+        Returns:
+            None
+        '''
+        player, ai = self.player, self.ai
+        self.save()
+        while self.round < GAME_ROUNDS and player.win < WINS_TO_END and ai.win < WINS_TO_END:
+            await self._shop(self.round + 1)
+            player.deploy_units(ai.reserve[:ai.board_size])
+            ai.deploy_units(player.units)
+            result = simulate_battle(player.units.copy(), ai.units.copy(), rng=self.battle_rng)
+            apply_result(player, ai, result)
+            self.round += 1
+            self.save()
+            self.send(f"BATTLE {result.winner} {result.survivors[0]} {result.survivors[1]} {result.rounds}",
+                      f"SCORE {player.win} {ai.win}")
+        outcome = "WIN" if player.win > ai.win else "LOSS" if ai.win > player.win else "DRAW"
+        self.discard()
+        self.send(f"END {outcome}")
+        await self.writer.drain()
+
+class MatchServer:
+    '''
+    Hosts one Match per connection on a single event loop.
+
+    Parameters:
+        seed (int): Root seed; every match gets the next child stream (a
+            fresh random seed if omitted).
+        shop_timeout (float): Seconds players have for each BUY.
+        policy (Policy): The AI's policy (defaults to GreedyPolicy). It runs on
+            the event loop, so it should be fast; a search policy's time budget
+            would stall every other match.
+        state_dir (str): Directory for match snapshots; enables RESUME.
+    '''
+
+    def __init__(self, seed=None, shop_timeout=30.0, policy=None, state_dir=None):
+        self.rng = RNG(seed)
+        self.shop_timeout = shop_timeout
+        self.policy = policy if policy is not None else GreedyPolicy()
+        self.state_dir = state_dir
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+        self.playing = set()  # Ids of the matches being played
+        self.active = 0
+        self.peak = 0
+        self.finished = 0
+        self.timeouts = 0
+
+    async def _open(self, reader, writer):
+        '''
+        Greets a client and starts or resumes the match it asks for.
+
+        Returns:
+            Match: The match, or None if the request was refused.
+        '''
+        match_id = secrets.token_hex(8)
+        writer.write(f"HELLO {PROTOCOL_VERSION} {match_id}\n".encode())
+        line = await asyncio.wait_for(reader.readline(), self.shop_timeout)
+        command, *fields = line.decode("utf-8", "replace").split() or [""]
+        if command == "QUIT":
+            writer.write(b"BYE\n")
+            return None
+        if command == "PLAY" and not fields:
+            return Match(reader, writer, self.rng.spawn(1)[0], self.policy, self.shop_timeout, match_id, self.state_dir)
+        if command == "RESUME" and len(fields) == 1:
+            match_id = fields[0]
+            # Ids are hex tokens, which also keeps them safe to use as file names
+            if self.state_dir is None or len(match_id) != 16 or not all(c in "0123456789abcdef" for c in match_id):
+                writer.write(b"ERR no saved match with that id\n")
+                return None
+            if match_id in self.playing:
+                writer.write(b"ERR that match is being played\n")
+                return None
+            try:
+                with open(os.path.join(self.state_dir, f"{match_id}.snap"), "rb") as f:
+                    data = f.read()
+                match = Match.resume(reader, writer, data, self.policy, self.shop_timeout, match_id, self.state_dir)
+            except (OSError, snapshot.SnapshotError):
+                writer.write(b"ERR no saved match with that id\n")
+                return None
+            writer.write(f"RESUMED {match.round}\n".encode())
+            return match
+        writer.write(b"ERR expected PLAY or RESUME <match id>\n")
+        return None
+
+    async def handle(self, reader, writer):
+        '''
+        Plays a match with a newly connected client.
+        '''
+        match = None
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            match = await self._open(reader, writer)
+            if match is not None:
+                self.playing.add(match.match_id)
+                await match.play()
+        except (_Quit, ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.active -= 1
+            if match is not None:
+                self.playing.discard(match.match_id)
+                self.finished += 1
+                self.timeouts += match.timeouts
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"active {self.active}  peak {self.peak}  finished {self.finished}  timeouts {self.timeouts}",
+                  file=sys.stderr, flush=True)
+
+    async def serve(self, address, report_interval=5.0):
+        '''
+        Accepts connections until cancelled.
+
+        Parameters:
+            address (str): "host:port" for TCP or "unix:/path" for a Unix socket.
+            report_interval (float): Seconds between status lines on stderr (0 for none).
+
+        Returns:
+            None
+        '''
+        if address.startswith("unix:"):
+            path = address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle, path, backlog=4096)
+        else:
+            host, _, port = address.rpartition(":")
+            server = await asyncio.start_server(self.handle, host or None, int(port), backlog=4096)
+        reporter = asyncio.create_task(self._report(report_interval)) if report_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
@@ -0,0 +1,343 @@
+"""
+Binary game-state snapshots and cheap in-memory forks
+"""
+
+import copy
+import random
+import struct
+from array import array
+from core.constants import RULES
+from core.rng import RNG
+from core.sampling import FenwickSampler
+from models.player import Player
+from models.shop import Shop
+from models.unit import Unit, TEMPLATES, POOL_INDEX
+
+# Snapshot layout, little-endian, built from fixed-size structs and
+# length-prefixed arrays (u32 count + items). Nothing is pickled, so
+# loading a snapshot can only ever build the game objects below.
+#
+#   header   magic "BASN", version u16, rules digest (32 bytes)
+#   meta     rounds played u16, caller fields (i32 array)
+#   rngs     u8 count; per generator: kind u8 (0 = the random module or none, 1 = RNG),
+#            then for RNG: entropy (u8 length + bytes), spawn key (u8 length +
+#            u32s), children spawned u32, Mersenne Twister state (625 u32s),
+#            gauss flag u8 + f64. The shop's generator comes last
+#   units    u32 count + UNIT records (template id, star, hp, atk); every unit
+#            below is an index into this table
+#   shop     present u8; shared u8, pool (u16 template ids), copies left (u32
+#            array), held offer units (u16 array)
+#   players  u8 count; per player: name (u16 length + UTF-8), PLAYER record
+#            (board size, gold, fail, win), then reserve, deployed units and
+#            the synergy tracker's field order (u16 arrays)
+MAGIC = b"BASN"
+VERSION = 1
+HEADER = struct.Struct("<4sH32s")
+UNIT = struct.Struct("<HBii")  # template id, star, hp, atk
+PLAYER = struct.Struct("<Hiii")  # board size, gold, fail, win
+
+# Template ids: pool position of every unit in the rules file
+TEMPLATE_NAMES = list(TEMPLATES)
+
+class SnapshotError(ValueError):
+    '''
+    Raised when data is not a snapshot of this game and rules file.
+    '''
+
+class _Writer:
+    def __init__(self):
+        self.out = bytearray()
+
+    def pack(self, fmt, *values):
+        self.out += struct.pack(fmt, *values)
+
+    def array(self, typecode, values):
+        values = array(typecode, values)
+        self.pack("<I", len(values))
+        self.out += values.tobytes()
+
+    def text(self, value):
+        data = value.encode("utf-8")
+        self.pack("<H", len(data))
+        self.out += data
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def take(self, size):
+        end = self.pos + size
+        if end > len(self.data):
+            raise SnapshotError("snapshot is truncated")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def raw_array(self, typecode, count):
+        values = array(typecode)
+        values.frombytes(self.take(count * values.itemsize))
+        return values
+
+    def array(self, typecode):
+        return self.raw_array(typecode, self.unpack("<I")[0])
+
+    def text(self):
+        return bytes(self.take(self.unpack("<H")[0])).decode("utf-8")
+
+def _template_id(template):
+    index = POOL_INDEX.get(template.name)
+    if index is None or template.star < 1:
+        raise SnapshotError(f"{template!r} is not a unit of the rules file")
+    return index
+
+def _write_rng(w, rng):
+    if not isinstance(rng, RNG):
+        if rng is not random and rng is not None:
+            raise SnapshotError("only RNG streams and the random module can be snapshotted")
+        w.pack("<B", 0)
+        return
+    entropy = rng.entropy.to_bytes((rng.entropy.bit_length() + 7) // 8, "little")
+    version, state, gauss = rng.getstate()
+    w.pack("<BB", 1, len(entropy))
+    w.out += entropy
+    w.pack("<B", len(rng.spawn_key))
+    w.out += array("I", rng.spawn_key).tobytes()
+    w.pack("<I", rng.children_spawned)
+    w.out += array("I", state).tobytes()
+    w.pack("<Bd", gauss is not None, gauss or 0.0)
+
+def _read_rng(r):
+    kind, = r.unpack("<B")
+    if kind == 0:
+        return random
+    entropy = int.from_bytes(r.take(r.unpack("<B")[0]), "little")
+    spawn_key = r.raw_array("I", r.unpack("<B")[0])
+    children, = r.unpack("<I")
+    state = r.raw_array("I", 625)
+    has_gauss, gauss = r.unpack("<Bd")
+    rng = RNG.__new__(RNG)
+    rng.entropy = entropy
+    rng.spawn_key = tuple(spawn_key)
+    rng.children_spawned = children
+    rng.setstate((3, tuple(state), gauss if has_gauss else None))
+    return rng
+
+def _unit_table(players, shop):
+    '''
+    Numbers every distinct unit of the players and the shop's held offers.
+    '''
+    ids = {}
+    for player in players:
+        for group in (player.reserve, player.units, player.synergy.field):
+            for unit in group:
+                ids.setdefault(unit, len(ids))
+    if shop is not None:
+        for unit in shop._held:
+            ids.setdefault(unit, len(ids))
+    return ids
+
+def pack(shop, rngs, players, round_id=0, fields=()):
+    '''
+    Packs a game state into a snapshot.
+
+    Parameters:
+        shop (Shop): The game's shop (or None).
+        rngs (list): The game's random streams besides the shop's, e.g. the battle RNG.
+        players (list): The players.
+        round_id (int): The number of rounds played.
+        fields (list): Extra integers of the caller (e.g. gold history), restored as a list.
+
+    Returns:
+        bytes: The snapshot.
+
+    Raises:
+        SnapshotError: If a unit or generator cannot be represented.
+    '''
+    w = _Writer()
+    w.pack("<4sH32s", MAGIC, VERSION, bytes.fromhex(RULES.digest))
+    w.pack("<H", round_id)
+    w.array("i", fields)
+
+    generators = list(rngs) + ([shop.rng] if shop is not None else [])
+    w.pack("<B", len(generators))
+    for rng in generators:
+        _write_rng(w, rng)
+
+    ids = _unit_table(players, shop)
+    w.pack("<I", len(ids))
+    for unit in ids:
+        w.out += UNIT.pack(_template_id(unit.template), unit.star, unit.hp, unit.atk)
+
+    w.pack("<B", shop is not None)
+    if shop is not None:
+        w.pack("<B", shop.shared)
+        w.array("H", [_template_id(template) for template in shop.pool])
+        w.array("I", shop.sampler.weights if shop.shared else ())
+        w.array("H", [ids[unit] for unit in shop._held])
+
+    w.pack("<B", len(players))
+    for player in players:
+        w.text(player.name)
+        w.out += PLAYER.pack(player.board_size, player.gold, player.fail, player.win)
+        for group in (player.reserve, player.units, player.synergy.field):
+            w.array("H", [ids[unit] for unit in group])
+    return bytes(w.out)
+
+def _template(template_id, star):
+    template = TEMPLATES[TEMPLATE_NAMES[template_id]]
+    for _ in range(1, star):
+        template = template.upgraded()
+    return template
+
+def unpack(data):
+    '''
+    Rebuilds a game state from a snapshot.
+
+    Parameters:
+        data (bytes): A snapshot from pack().
+
+    Returns:
+        dict: shop (Shop or None), rngs (list), players (list of quiet
+            Player objects without an arranger), round and fields.
+
+    Raises:
+        SnapshotError: If data is not a snapshot of this version and rules file.
+    '''
+    if len(data) < HEADER.size:
+        raise SnapshotError("not a game snapshot")
+    magic, version, digest = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise SnapshotError("not a version 1 game snapshot")
+    if digest != bytes.fromhex(RULES.digest):
+        raise SnapshotError("the snapshot was taken with another rules file")
+    r = _Reader(data)
+    r.pos = HEADER.size
+    try:
+        round_id, = r.unpack("<H")
+        fields = r.array("i").tolist()
+        generators = [_read_rng(r) for _ in range(r.unpack("<B")[0])]
+
+        units = []
+        for _ in range(r.unpack("<I")[0]):
+            template_id, star, hp, atk = r.unpack(UNIT.format)
+            unit = Unit(_template(template_id, star))
+            unit.hp = hp
+            unit.atk = atk
+            units.append(unit)
+
+        shop = None
+        if r.unpack("<B")[0]:
+            shared, = r.unpack("<B")
+            pool = [TEMPLATES[TEMPLATE_NAMES[i]] for i in r.array("H")]
+            weights = r.array("I")
+            held = r.array("H")
+            shop = Shop(pool, rng=generators.pop())
+            if shared:
+                shop.shared = True
+                shop._index = {template.name: i for i, template in enumerate(shop.pool)}
+                shop.sampler = FenwickSampler(weights.tolist(), shop.rng)
+            shop._held = {units[i] for i in held}
+
+        players = []
+        for _ in range(r.unpack("<B")[0]):
+            name = r.text()
+            board_size, gold, fail, win = r.unpack(PLAYER.format)
+            player = Player(name, board_size, verbose=False)
+            player.gold, player.fail, player.win = gold, fail, win
+            reserve, field, order = ([units[i] for i in r.array("H")] for _ in range(3))
+            _restore_field(player, reserve, field, order)
+            players.append(player)
+    except SnapshotError:
+        raise
+    except (struct.error, IndexError, KeyError, ValueError, TypeError) as e:
+        raise SnapshotError(f"corrupt snapshot: {e}") from None
+    return {"shop": shop, "rngs": generators, "players": players, "round": round_id, "fields": fields}
+
+def _restore_field(player, reserve, field, order):
+    '''
+    Gives a fresh player its reserve and deployed units, rebuilding the
+    synergy tracker in the order units entered the field.
+    '''
+    player.reserve = reserve
+    player.units = field
+    atk = [unit.atk for unit in order]
+    for unit in order:
+        player.synergy.add(unit, [])
+    # The tracker recomputes attack on the way; the saved values are authoritative
+    for unit, value in zip(order, atk):
+        unit.atk = value
+
+def fork_rng(rng):
+    '''
+    Copies a random stream; the random module is shared rather than copied.
+    '''
+    if rng is random:
+        return random
+    twin = RNG.__new__(RNG)
+    twin.entropy = rng.entropy
+    twin.spawn_key = rng.spawn_key
+    twin.children_spawned = rng.children_spawned
+    twin.setstate(rng.getstate())
+    return twin
+
+def fork_shop(shop, rng):
+    '''
+    Copies a shop's mutable state: the copies left and held offers.
+
+    The template pool and name index never change, so the copy shares them.
+
+    Parameters:
+        shop (Shop): The shop.
+        rng (random.Random): The copy's random stream.
+
+    Returns:
+        tuple: (the copy, dict mapping each held unit to its copy).
+    '''
+    twin = copy.copy(shop)
+    twin.rng = rng
+    if shop.shared:
+        sampler = twin.sampler = copy.copy(shop.sampler)
+        sampler.rng = rng
+        sampler.weights = list(shop.sampler.weights)
+        sampler.tree = list(shop.sampler.tree)
+    held = {}
+    for unit in shop._held:
+        held[unit] = Unit(unit.template)
+        held[unit].hp, held[unit].atk = unit.hp, unit.atk
+    twin._held = set(held.values())
+    return twin, held
+
+def fork_player(player, arranger=None):
+    '''
+    Copies a player with fresh units, including its deployed board and synergies.
+
+    Parameters:
+        player (Player): The player.
+        arranger (LineupArranger): The copy's arranger (None for none).
+
+    Returns:
+        Player: The quiet copy.
+    '''
+    # A shallow copy brings the scalars (gold, fail, win, ...); the unit containers are replaced below
+    twin = copy.copy(player)
+    twin.verbose = False
+    twin.arranger = arranger
+    twins = {}
+    for group in (player.reserve, player.units, player.synergy.field):
+        for unit in group:
+            if unit not in twins:
+                twins[unit] = Unit(unit.template)
+                twins[unit].hp, twins[unit].atk = unit.hp, unit.atk
+    twin.reserve = [twins[u] for u in player.reserve]
+    twin.units = [twins[u] for u in player.units]
+    # The tracker's tiers and bonus table never change, so only its unit maps are copied
+    synergy = twin.synergy = copy.copy(player.synergy)
+    synergy.members = {school: {twins[u]: None for u in members} for school, members in player.synergy.members.items()}
+    synergy.field = {twins[u]: None for u in player.synergy.field}
+    return twin
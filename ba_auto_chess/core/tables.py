@@ -0,0 +1,76 @@
+"""
+Integer ids and precomputed damage tables shared by the battle engines
+"""
+
+from core.constants import RULES
+
+# Elements, skills and schools interned to small integer ids (their position
+# in the rules file); the strings are only used for display
+ELEMENTS = list(RULES.elements)
+SKILLS = list(RULES.skills)
+SCHOOLS = list(RULES.schools)
+
+ELEMENT_ID = {element: i for i, element in enumerate(ELEMENTS)}
+SKILL_ID = {skill: i for i, skill in enumerate(SKILLS)}
+SCHOOL_ID = {school: i for i, school in enumerate(SCHOOLS)}
+
+SKILL_SHIELD = SKILL_ID["shield"]
+SKILL_HEAL = SKILL_ID["heal"]
+SKILL_AOE_2 = SKILL_ID["AOE-2"]
+SKILL_AOE_3 = SKILL_ID["AOE-3"]
+SKILL_AOE_ALL = SKILL_ID["AOE-all"]
+
+# Damage divisor and number of random targets per skill id (0 = every enemy)
+SKILL_DIVISOR = list(RULES.skill_divisor)
+SKILL_TARGETS = list(RULES.skill_targets)
+
+# Battle event kinds of core.eventlog records, emitted by the engine itself
+# when it is given an event buffer (kinds 0-4 are the log's own records)
+EVENT_ROUND = 5
+EVENT_TURN = 6
+EVENT_ATTACK = 7
+EVENT_CAST = 8
+EVENT_AOE_HIT = 9
+EVENT_SHIELD = 10
+EVENT_HEAL = 11
+EVENT_DEATH = 12
+
+# Element multiplier flattened as [attacker element id * len(ELEMENTS) + defender element id]
+MULTIPLIER = list(RULES.multiplier)
+
+# Per-hit damage flattened as [((atk * len(SKILLS) + skill id) * len(ELEMENTS)
+# + attacker element id) * len(ELEMENTS) + defender element id]
+DAMAGE = []
+
+_ROW = len(SKILLS) * len(ELEMENTS) * len(ELEMENTS)
+
+def _grow(atk_limit):
+    '''
+    Extends DAMAGE in place so that it covers every atk below atk_limit.
+    '''
+    for atk in range(len(DAMAGE) // _ROW, atk_limit):
+        for skill in range(len(SKILLS)):
+            for attacker in range(len(ELEMENTS)):
+                for defender in range(len(ELEMENTS)):
+                    multiplier = MULTIPLIER[attacker * len(ELEMENTS) + defender]
+                    DAMAGE.append(int(atk * multiplier) // SKILL_DIVISOR[skill])
+
+def damage_base(atk, skill_id, element_id):
+    '''
+    Returns the DAMAGE offset of an attacker; adding the defender's element
+    id gives the damage of one hit.
+
+    Parameters:
+        atk (int): The attacker's current attack.
+        skill_id (int): The attacker's skill id.
+        element_id (int): The attacker's element id.
+
+    Returns:
+        int: Offset into DAMAGE.
+    '''
+    if atk * _ROW >= len(DAMAGE):
+        _grow(atk * 2)
+    return ((atk * len(SKILLS) + skill_id) * len(ELEMENTS) + element_id) * len(ELEMENTS)
+
+# Covers every pool unit up to ★3 with synergy bonuses; larger atk grows the table
+_grow(64)
@@ -0,0 +1,363 @@
+"""
+Strategy tournaments with adaptive pairing, Elo-scale ratings and checkpoints
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from core.ai import GreedyPolicy, SearchPolicy
+from core.arrange import LineupArranger
+from core.game import Game
+from core.rng import RNG
+
+CHECKPOINT_VERSION = 1
+
+# Elo points per natural-log unit of playing strength
+ELO_SCALE = 400 / math.log(10)
+
+def parse_strategy(spec):
+    '''
+    Parses a strategy name.
+
+    A strategy is a buying policy, "greedy" or "search" with an optional
+    time budget in seconds ("search:0.02"), optionally followed by
+    "+arrange" for a LineupArranger, again with an optional budget
+    ("greedy+arrange:0.1").
+
+    Parameters:
+        spec (str): The strategy name.
+
+    Returns:
+        tuple: (policy name, policy budget, arrange budget or None).
+
+    Raises:
+        ValueError: If the name is not a valid strategy.
+    '''
+    policy, plus, arrange = spec.partition("+")
+    name, _, budget = policy.partition(":")
+    if name not in ("greedy", "search") or (budget and name == "greedy"):
+        raise ValueError(f"unknown buying policy in strategy {spec!r}")
+    arrange_name, _, arrange_budget = arrange.partition(":")
+    if plus and arrange_name != "arrange":
+        raise ValueError(f"unknown strategy option {arrange!r} in {spec!r}")
+    try:
+        policy_budget = float(budget) if budget else 0.05
+        arrange_budget = (float(arrange_budget) if arrange_budget else 0.2) if plus else None
+    except ValueError:
+        raise ValueError(f"bad time budget in strategy {spec!r}") from None
+    return name, policy_budget, arrange_budget
+
+def build_strategy(spec, rng):
+    '''
+    Creates the policy and arranger of a strategy for one game.
+
+    Parameters:
+        spec (str): The strategy name (see parse_strategy).
+        rng (RNG): The player's random stream.
+
+    Returns:
+        tuple: (Policy, LineupArranger or None).
+    '''
+    name, policy_budget, arrange_budget = parse_strategy(spec)
+    policy_rng, arrange_rng = rng.spawn(2)
+    # Games already run in parallel, so the search rolls out in-process
+    policy = SearchPolicy(policy_budget, workers=1, rng=policy_rng) if name == "search" else GreedyPolicy()
+    arranger = LineupArranger(arrange_budget, rng=arrange_rng) if arrange_budget is not None else None
+    return policy, arranger
+
+def play_matchup(seed, game_ids, spec1, spec2):
+    '''
+    Plays games between two strategies; executed inside a worker process.
+
+    Game k is played with the seed's child stream k, and the first strategy
+    takes the first seat in even games and the second seat in odd ones, so
+    neither profits from moving first.
+
+    Parameters:
+        seed (int): The tournament's root seed.
+        game_ids (list): The game numbers to play.
+        spec1 (str): The first strategy.
+        spec2 (str): The second strategy.
+
+    Returns:
+        list: One score per game from spec1's point of view: 1 for a win,
+            0.5 for a draw and 0 for a loss.
+    '''
+    scores = []
+    for k in game_ids:
+        game_rng, rng1, rng2 = RNG(seed, (k,)).spawn(3)
+        (policy1, arranger1), (policy2, arranger2) = build_strategy(spec1, rng1), build_strategy(spec2, rng2)
+        swapped = k % 2 == 1
+        if swapped:
+            game = Game(policy2, policy1, game_rng, (arranger2, arranger1))
+        else:
+            game = Game(policy1, policy2, game_rng, (arranger1, arranger2))
+        winner = game.play()["winner"]
+        policy1.close()
+        policy2.close()
+        if winner == 0:
+            scores.append(0.5)
+        else:
+            scores.append(1.0 if (winner == 1) != swapped else 0.0)
+    return scores
+
+class Tournament:
+    '''
+    Ranks strategies by playing headless games between them.
+
+    Ratings: the strategies' strengths are fitted to all results so far as
+    a Bradley-Terry model (the model behind Elo) and reported on the Elo
+    scale with a mean of 1500. Unlike online Elo updates the fit does not
+    depend on the order games finish in, which varies with the workers, and
+    a resumed run rates exactly as if it had never stopped. Draws count half a win
+    and every pair starts with one virtual draw, which keeps ratings finite
+    while a strategy has no wins.
+
+    Scheduling: every work unit goes to the pair of strategies where one
+    more game is expected to shrink the variance of the ratings the most:
+    the pair maximizing p(1 - p) * (1 / I_a^2 + 1 / I_b^2), where p is the
+    predicted score between them and I is a strategy's Fisher information
+    (the inverse of its rating variance), counting games still in flight.
+    Close matchups between uncertain strategies are played first; lopsided
+    or well-measured ones are revisited less and less.
+
+    Checkpoints: the win, draw and game counts of every pair and the next
+    game number are written to a JSON file (atomically, through a temporary
+    file) every checkpoint_interval seconds and when the run stops, even on
+    KeyboardInterrupt. Loading it resumes the tournament; the games in flight
+    at the time of the kill are simply not counted.
+
+    Parameters:
+        strategies (list): Strategy names (see parse_strategy), at least two.
+        seed (int): Root seed; game k always uses the seed's child stream k
+            (a fresh random seed if omitted).
+        checkpoint (str): Path of the checkpoint file, or None for none.
+        checkpoint_interval (float): Seconds between checkpoints.
+    '''
+
+    def __init__(self, strategies, seed=None, checkpoint=None, checkpoint_interval=30.0):
+        if len(strategies) < 2 or len(set(strategies)) != len(strategies):
+            raise ValueError("a tournament needs at least two distinct strategies")
+        for spec in strategies:
+            parse_strategy(spec)
+        n = len(strategies)
+        self.strategies = list(strategies)
+        self.seed = RNG(seed).entropy
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.score = [[0.0] * n for _ in range(n)]  # score[a][b]: points a took off b
+        self.games = [[0] * n for _ in range(n)]  # games[a][b] == games[b][a]
+        self.next_game = 0
+        self.played = 0
+        self.strength = [1.0] * n  # Bradley-Terry strength; rating = 1500 + ELO_SCALE * ln(strength)
+        self._pending = [[0] * n for _ in range(n)]
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def resume(cls, path, checkpoint_interval=30.0):
+        '''
+        Loads a tournament from its checkpoint file.
+
+        Parameters:
+            path (str): The checkpoint file; later checkpoints overwrite it.
+            checkpoint_interval (float): Seconds between checkpoints.
+
+        Returns:
+            Tournament: The tournament, ready to continue.
+        '''
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} tournament checkpoint")
+        tournament = cls(state["strategies"], state["seed"], path, checkpoint_interval)
+        tournament.score = state["score"]
+        tournament.games = state["games"]
+        tournament.next_game = state["next_game"]
+        tournament.played = sum(map(sum, tournament.games)) // 2
+        tournament.fit()
+        return tournament
+
+    def save(self):
+        '''
+        Writes the checkpoint file, replacing the previous one atomically.
+
+        Returns:
+            None
+        '''
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "strategies": self.strategies,
+            "seed": self.seed,
+            "next_game": self.next_game,
+            "score": self.score,
+            "games": self.games,
+        }
+        temp = self.checkpoint + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp, self.checkpoint)
+        self._saved_at = time.monotonic()
+
+    def _expected(self, a, b):
+        return self.strength[a] / (self.strength[a] + self.strength[b])
+
+    def fit(self, iterations=200, tolerance=1e-9):
+        '''
+        Refits the strengths to all results with minorization-maximization.
+
+        Each pass is O(n^2) for n strategies and starts from the current
+        strengths, so a few passes after every work unit keep the fit
+        converged while a run goes on.
+
+        Parameters:
+            iterations (int): Maximum number of passes.
+            tolerance (float): Largest relative change that stops the fit early.
+
+        Returns:
+            None
+        '''
+        n = len(self.strategies)
+        # One virtual draw per pair: half a point each way
+        points = [sum(self.score[a][b] + 0.5 for b in range(n) if b != a) for a in range(n)]
+        strength = self.strength
+        for _ in range(iterations):
+            change = 0.0
+            for a in range(n):
+                denominator = sum((self.games[a][b] + 1) / (strength[a] + strength[b]) for b in range(n) if b != a)
+                updated = points[a] / denominator
+                change = max(change, abs(updated - strength[a]) / strength[a])
+                strength[a] = updated
+            # Pin the geometric mean to 1 so the mean rating stays 1500
+            norm = math.exp(sum(map(math.log, strength)) / n)
+            strength[:] = [s / norm for s in strength]
+            if change < tolerance:
+                break
+
+    def _information(self, a, pending=False):
+        '''
+        Returns the Fisher information of a strategy's log-strength.
+        '''
+        total = 0.0
+        for b in range(len(self.strategies)):
+            if b != a:
+                p = self._expected(a, b)
+                games = self.games[a][b] + 1 + (self._pending[a][b] if pending else 0)
+                total += games * p * (1 - p)
+        return total
+
+    def ratings(self):
+        '''
+        Returns the standings.
+
+        Returns:
+            list: One dict per strategy, best first: strategy, rating,
+                error (one standard error, in Elo points) and games.
+        '''
+        table = []
+        for a, spec in enumerate(self.strategies):
+            table.append({
+                "strategy": spec,
+                "rating": round(1500 + ELO_SCALE * math.log(self.strength[a]), 1),
+                "error": round(ELO_SCALE / math.sqrt(self._information(a)), 1),
+                "games": sum(self.games[a]),
+            })
+        table.sort(key=lambda row: -row["rating"])
+        return table
+
+    def next_pair(self):
+        '''
+        Picks the pair of strategies whose next games tell the most.
+
+        Returns:
+            tuple: (a, b) strategy indices.
+        '''
+        n = len(self.strategies)
+        information = [self._information(a, pending=True) for a in range(n)]
+        best = None
+        for a in range(n):
+            for b in range(a + 1, n):
+                p = self._expected(a, b)
+                gain = p * (1 - p) * (1 / information[a] ** 2 + 1 / information[b] ** 2)
+                if best is None or gain > best[0]:
+                    best = (gain, a, b)
+        return best[1], best[2]
+
+    def _schedule(self, chunk_size):
+        '''
+        Assigns the next work unit: a pair and its game numbers.
+        '''
+        a, b = self.next_pair()
+        game_ids = list(range(self.next_game, self.next_game + chunk_size))
+        self.next_game += chunk_size
+        self._pending[a][b] += chunk_size
+        self._pending[b][a] += chunk_size
+        return a, b, game_ids
+
+    def _record(self, a, b, game_ids, scores):
+        '''
+        Adds a finished work unit to the results.
+        '''
+        self._pending[a][b] -= len(game_ids)
+        self._pending[b][a] -= len(game_ids)
+        for score in scores:
+            self.score[a][b] += score
+            self.score[b][a] += 1 - score
+        self.games[a][b] += len(scores)
+        self.games[b][a] += len(scores)
+        self.played += len(scores)
+        self.fit(iterations=5)
+        if self.checkpoint is not None and time.monotonic() - self._saved_at >= self.checkpoint_interval:
+            self.save()
+        return [{"game": k, "strategies": [self.strategies[a], self.strategies[b]], "score": score}
+                for k, score in zip(game_ids, scores)]
+
+    def run(self, games, workers=None, chunk_size=16):
+        '''
+        Plays games until the tournament has played a total number of them.
+
+        Work units of chunk_size games of one pair are scheduled as workers
+        free up, and their results are applied and yielded as they arrive.
+
+        Parameters:
+            games (int): Total number of games, including those of earlier runs.
+            workers (int): Number of worker processes (defaults to the CPU
+                count, 1 runs everything in this process).
+            chunk_size (int): Games per work unit.
+
+        Yields:
+            dict: One record per game, in completion order: game number,
+                the two strategies and the first one's score.
+        '''
+        workers = workers or os.cpu_count() or 1
+        try:
+            if workers == 1:
+                while self.played < games:
+                    a, b, game_ids = self._schedule(min(chunk_size, games - self.played))
+                    scores = play_matchup(self.seed, game_ids, self.strategies[a], self.strategies[b])
+                    yield from self._record(a, b, game_ids, scores)
+                return
+
+            in_flight = {}
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                try:
+                    while self.played < games:
+                        scheduled = self.played + sum(len(job[2]) for job in in_flight.values())
+                        while scheduled < games and len(in_flight) < workers * 2:
+                            job = self._schedule(min(chunk_size, games - scheduled))
+                            a, b, game_ids = job
+                            in_flight[pool.submit(play_matchup, self.seed, game_ids,
+                                                  self.strategies[a], self.strategies[b])] = job
+                            scheduled += len(game_ids)
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            yield from self._record(*in_flight.pop(future), future.result())
+                finally:
+                    for future in in_flight:
+                        future.cancel()
+        finally:
+            self._pending = [[0] * len(self.strategies) for _ in self.strategies]
+            self.fit()
+            if self.checkpoint is not None:
+                self.save()
@@ -2,9 +2,13 @@
 Game tutorial text and display functionality
 """
 
+from core import render
+from core.render import SUMMARY
+
 def show_tutorial(language="en"):
     '''
-    Displays the game tutorial in the selected language.
+    Displays the game tutorial in the selected language through the
+    current renderer, then waits for Enter.
     
     Parameters:
         language (str): Language choice, "en" for English, "zh" for Chinese
@@ -99,9 +103,6 @@ Enjoy the game!
 祝您游戏愉快！
 '''
     
-    if language == "en":
-        print(tutorial_en)
-    else:
-        print(tutorial_zh)
-    
-    input("\nPress Enter to return to game... / 按Enter键返回游戏...\n")
\ No newline at end of file
+    out = render.current
+    out.write(tutorial_en if language == "en" else tutorial_zh, SUMMARY)
+    out.prompt("\nPress Enter to return to game... / 按Enter键返回游戏...\n")
@@ -0,0 +1,506 @@
+"""
+Vectorized battle engines simulating many battles at once with NumPy or a compiled Numba kernel
+"""
+
+import numpy as np
+from core.constants import MAX_BATTLE_ROUNDS
+from core.tables import DAMAGE, ELEMENTS, SKILLS, SKILL_SHIELD, SKILL_HEAL, SKILL_TARGETS, damage_base
+
+try:
+    import numba
+except ImportError:  # Numba is optional; batches then run on the NumPy kernel
+    numba = None
+
+TARGET_COUNT = np.array(SKILL_TARGETS)
+
+_damage_cache = [None]
+
+def _damage_array(atk_limit):
+    '''
+    Returns the shared DAMAGE table as an array indexed [atk, skill, attacker element, defender element].
+    '''
+    damage_base(atk_limit, 0, 0)
+    table = _damage_cache[0]
+    if table is None or table.size != len(DAMAGE):
+        table = np.array(DAMAGE, dtype=np.int16).reshape(-1, len(SKILLS), len(ELEMENTS), len(ELEMENTS))
+        _damage_cache[0] = table
+    return table
+
+class BatchTeams:
+    '''
+    Struct-of-arrays encoding of one team in each of a batch of battles.
+
+    All arrays have shape (battles, slots). Empty slots have zero HP and
+    never act or get targeted.
+
+    Parameters:
+        hp (ndarray): Maximum HP of each unit.
+        atk (ndarray): Attack of each unit (synergy bonus included).
+        element (ndarray): Element id of each unit (core.tables.ELEMENT_ID).
+        skill (ndarray): Skill id of each unit (core.tables.SKILL_ID).
+        school (ndarray): School id of each unit (core.tables.SCHOOL_ID).
+    '''
+
+    def __init__(self, hp, atk, element, skill, school):
+        self.hp = np.asarray(hp, dtype=np.int32)
+        self.atk = np.asarray(atk, dtype=np.int32)
+        self.element = np.asarray(element, dtype=np.int8)
+        self.skill = np.asarray(skill, dtype=np.int8)
+        self.school = np.asarray(school, dtype=np.int8)
+
+    @property
+    def shape(self):
+        return self.hp.shape
+
+    @classmethod
+    def from_lineups(cls, lineups, slots=None):
+        '''
+        Encodes one lineup of Unit objects per battle.
+
+        Parameters:
+            lineups (list): One list of units per battle.
+            slots (int): Number of slots per team (defaults to the longest lineup).
+
+        Returns:
+            BatchTeams: The encoded team.
+        '''
+        slots = slots or max((len(lineup) for lineup in lineups), default=0)
+        fields = np.zeros((5, len(lineups), slots), dtype=np.int32)
+        for b, lineup in enumerate(lineups):
+            for i, u in enumerate(lineup):
+                fields[:, b, i] = (u.max_hp, u.atk, u.element_id, u.skill_id, u.school_id)
+        return cls(*fields)
+
+    @classmethod
+    def repeat(cls, lineup, battles, slots=None):
+        '''
+        Encodes the same lineup of Unit objects for every battle in a batch.
+
+        Parameters:
+            lineup (list): The units of the lineup.
+            battles (int): Batch size.
+            slots (int): Number of slots per team (defaults to the lineup size).
+
+        Returns:
+            BatchTeams: The encoded team.
+        '''
+        one = cls.from_lineups([lineup], slots)
+        return cls(*(np.repeat(a, battles, axis=0) for a in (one.hp, one.atk, one.element, one.skill, one.school)))
+
+class BatchResult:
+    '''
+    Outcome arrays of a batch of battles.
+
+    Parameters:
+        winner (ndarray): 1 if team1 won, 2 if team2 won, 0 for a tie.
+        survivors (ndarray): Shape (battles, 2) surviving unit counts.
+        rounds (ndarray): Number of rounds fought in each battle.
+        damage (tuple): Per-unit damage dealt, one (battles, slots) array per team.
+        healing (tuple): Per-unit HP restored, one (battles, slots) array per team.
+    '''
+
+    def __init__(self, winner, survivors, rounds, damage, healing):
+        self.winner = winner
+        self.survivors = survivors
+        self.rounds = rounds
+        self.damage = damage
+        self.healing = healing
+
+    def rates(self):
+        '''
+        Returns the (win, tie, loss) rates of team1.
+        '''
+        n = len(self.winner)
+        return (np.count_nonzero(self.winner == 1) / n, np.count_nonzero(self.winner == 0) / n,
+                np.count_nonzero(self.winner == 2) / n)
+
+class _Side:
+    '''
+    Slot-major working arrays of one team: shape (slots, running battles),
+    so each acting slot reads one contiguous row.
+
+    order[:n_alive] lists the living slots of each battle and pos is its
+    inverse, so a random living target is one gather and a death is a
+    swap-remove.
+    '''
+
+    def __init__(self, team):
+        self.max_hp = np.ascontiguousarray(team.hp.T, dtype=np.int16)
+        self.hp = self.max_hp.copy()
+        self.atk = np.ascontiguousarray(team.atk.T, dtype=np.int16)
+        self.element = np.ascontiguousarray(team.element.T, dtype=np.intp)
+        self.count = TARGET_COUNT[team.skill.T]
+        self.shield = team.skill.T == SKILL_SHIELD
+        self.heal = team.skill.T == SKILL_HEAL
+        self.dealt = np.zeros(self.hp.shape, dtype=np.int32)
+        self.healed = np.zeros(self.hp.shape, dtype=np.int32)
+        # Damage of each slot against each defender element: (slots, elements, battles)
+        table = _damage_array(int(team.atk.max(initial=0)) + 1)
+        self.damage = np.ascontiguousarray(table[self.atk, team.skill.T, self.element].transpose(0, 2, 1))
+        self.n_alive = np.count_nonzero(self.hp > 0, axis=0)
+        if self.n_alive.min(initial=len(self.hp)) == len(self.hp):
+            self.order = np.repeat(np.arange(len(self.hp))[:, None], self.hp.shape[1], axis=1)
+            self.pos = self.order.copy()
+        else:
+            self.order = np.argsort(self.hp <= 0, axis=0, kind="stable")
+            self.pos = np.argsort(self.order, axis=0)
+        # Skill kinds present in each slot over the whole batch, to skip unused branches
+        self.slot_shield = self.shield.any(axis=1).tolist()
+        self.slot_heal = self.heal.any(axis=1).tolist()
+        self.slot_picks = np.max(self.count, axis=1, initial=0).tolist()
+        self.slot_all = (self.count == 0).any(axis=1).tolist()
+
+    def keep(self, running):
+        '''
+        Drops the columns of battles that are no longer running.
+        '''
+        for name in ("max_hp", "hp", "atk", "element", "count", "shield", "heal", "dealt", "healed", "order", "pos"):
+            setattr(self, name, np.ascontiguousarray(getattr(self, name)[:, running]))
+        self.damage = np.ascontiguousarray(self.damage[:, :, running])
+        self.n_alive = self.n_alive[running]
+
+    def remove_dead(self, slots, cols):
+        '''
+        Swap-removes one dead slot from the living list of each given battle.
+        '''
+        last = self.n_alive[cols] - 1
+        at = self.pos[slots, cols]
+        moved = self.order[last, cols]
+        self.order[at, cols] = moved
+        self.pos[moved, cols] = at
+        self.n_alive[cols] = last
+
+    def reindex(self, cols):
+        '''
+        Rebuilds the living list of the given battles after several deaths.
+        '''
+        alive = self.hp[:, cols] > 0
+        n_alive = np.count_nonzero(alive, axis=0)
+        at = np.where(alive, np.cumsum(alive, axis=0) - 1, n_alive + np.cumsum(~alive, axis=0) - 1)
+        width = self.hp.shape[1]
+        slots = np.arange(len(alive))[:, None]
+        self.order.reshape(-1)[at * width + cols] = slots
+        self.pos.reshape(-1)[slots * width + cols] = at
+        self.n_alive[cols] = n_alive
+
+def _sample_ranks(rng, n, picks):
+    '''
+    Draws up to 3 distinct uniform positions in [0, n) for every battle.
+
+    Returns:
+        list: One position array per pick.
+    '''
+    u = rng.random((picks, len(n)))
+    first = (u[0] * n).astype(np.intp)
+    ranks = [first]
+    if picks >= 2:
+        second = (u[1] * np.maximum(n - 1, 1)).astype(np.intp)
+        second += second >= first
+        ranks.append(second)
+    if picks >= 3:
+        low, high = np.minimum(first, second), np.maximum(first, second)
+        third = (u[2] * np.maximum(n - 2, 1)).astype(np.intp)
+        third += third >= low
+        third += third >= high
+        ranks.append(third)
+    return ranks
+
+def _team_turn(a, b, rng):
+    '''
+    Lets every living unit of side a act once, slot by slot, in all battles.
+
+    Single-target and AOE-2/AOE-3 attacks only gather and scatter the picked
+    targets; AOE-all and heal touch the whole team.
+    '''
+    width = a.hp.shape[1]
+    cols = np.arange(width)
+    hp_b = b.hp.reshape(-1)
+    element_b = b.element.reshape(-1)
+    for j in range(a.hp.shape[0]):
+        hp_j = a.hp[j]
+        act = (hp_j > 0) & (b.n_alive > 0)
+        if not act.any():
+            continue
+        amount = a.atk[j] // 2
+
+        # Shield skill: add shield to self
+        if a.slot_shield[j]:
+            shield = act & a.shield[j]
+            new = np.minimum(hp_j + amount, a.max_hp[j])
+            a.healed[j] += np.where(shield, new - hp_j, 0)
+            np.copyto(hp_j, new, where=shield)
+
+        # Heal skill: heal all living allies
+        if a.slot_heal[j]:
+            heal = (a.hp > 0) & (act & a.heal[j])
+            new = np.minimum(a.hp + amount, a.max_hp)
+            a.healed[j] += np.where(heal, new - a.hp, 0).sum(axis=0)
+            np.copyto(a.hp, new, where=heal)
+
+        # Random targets: distinct uniform positions in the living list
+        picks = a.slot_picks[j]
+        if picks:
+            n = b.n_alive.copy()
+            count = a.count[j]
+            damage_j = a.damage[j].reshape(-1)
+            last = len(b.order) - 1
+            targets = [np.take(b.order, np.minimum(rank, last) * width + cols) for rank in _sample_ranks(rng, n, picks)]
+            for k, target in enumerate(targets, 1):
+                hit = act & (count >= k) & (n >= k)
+                flat = target * width + cols
+                old = np.take(hp_b, flat)
+                damage = np.take(damage_j, np.take(element_b, flat) * width + cols)
+                new = np.where(hit, np.maximum(old - damage, 0), old)
+                hp_b[flat] = new
+                a.dealt[j] += old - new
+                died = np.flatnonzero(hit & (new == 0))
+                if len(died):
+                    b.remove_dead(target[died], died)
+
+        # AOE-all skill: attack every living enemy
+        if a.slot_all[j]:
+            hit = (b.hp > 0) & (act & (a.count[j] == 0))
+            damage = np.take_along_axis(a.damage[j], b.element, axis=0)
+            new = np.where(hit, np.maximum(b.hp - damage, 0), b.hp)
+            a.dealt[j] += (b.hp - new).sum(axis=0)
+            died = np.flatnonzero((hit & (new == 0)).any(axis=0))
+            b.hp[...] = new
+            if len(died):
+                b.reindex(died)
+
+def _play_battles(teams, table, count, shield_id, heal_id, max_rounds, seed, lo, hi,
+                  survivors, rounds, dealt1, healed1, dealt2, healed2):
+    '''
+    Plays battles lo to hi of a batch to the end, one after the other.
+
+    teams holds the (hp, atk, element, skill) arrays of team1 then team2.
+    Each battle's units are copied into small per-side working arrays, and
+    each side keeps its living slots in order[:n_alive] with pos as the
+    inverse, like models.team.Team: k distinct targets are a partial
+    Fisher-Yates shuffle of the living list and a death is a swap-remove.
+    Random numbers come from a splitmix64 stream started at seed.
+    '''
+    hp1, atk1, element1, skill1, hp2, atk2, element2, skill2 = teams
+    slots = max(hp1.shape[1], hp2.shape[1], 1)
+    hp = np.zeros((2, slots), dtype=np.int32)
+    max_hp = np.zeros((2, slots), dtype=np.int32)
+    atk = np.zeros((2, slots), dtype=np.int32)
+    element = np.zeros((2, slots), dtype=np.intp)
+    skill = np.zeros((2, slots), dtype=np.intp)
+    dealt = np.zeros((2, slots), dtype=np.int32)
+    healed = np.zeros((2, slots), dtype=np.int32)
+    order = np.zeros((2, slots), dtype=np.intp)
+    pos = np.zeros((2, slots), dtype=np.intp)
+    n_alive = np.zeros(2, dtype=np.intp)
+    picked = np.zeros(slots, dtype=np.intp)
+    acting = np.zeros(slots, dtype=np.intp)
+    state = seed
+    for b in range(lo, hi):
+        for s in range(slots):
+            dealt[0, s] = dealt[1, s] = healed[0, s] = healed[1, s] = 0
+            max_hp[0, s] = hp1[b, s] if s < hp1.shape[1] else 0
+            max_hp[1, s] = hp2[b, s] if s < hp2.shape[1] else 0
+        for s in range(hp1.shape[1]):
+            atk[0, s], element[0, s], skill[0, s] = atk1[b, s], element1[b, s], skill1[b, s]
+        for s in range(hp2.shape[1]):
+            atk[1, s], element[1, s], skill[1, s] = atk2[b, s], element2[b, s], skill2[b, s]
+        for t in range(2):
+            n = 0
+            for s in range(slots):
+                hp[t, s] = max_hp[t, s]
+                if hp[t, s] > 0:
+                    order[t, n] = s
+                    pos[t, s] = n
+                    n += 1
+            n_alive[t] = n
+
+        round_num = 1
+        while round_num <= max_rounds and n_alive[0] > 0 and n_alive[1] > 0:
+            for turn in range(2):
+                # Team1 moves first on odd rounds, team2 on even rounds
+                a = turn if round_num % 2 == 1 else 1 - turn
+                d = 1 - a
+                # Units only die on the other team's turn, so the living
+                # acting slots are listed once, in lineup order
+                m = 0
+                for j in range(slots):
+                    acting[m] = j
+                    m += hp[a, j] > 0
+                for u in range(m):
+                    if n_alive[d] == 0:
+                        break
+                    j = acting[u]
+                    kind = skill[a, j]
+                    power = atk[a, j]
+                    own = element[a, j]
+                    k = count[kind]
+                    if k == 0:
+                        # AOE-all skill: attack every living enemy
+                        k = n_alive[d]
+                        for i in range(k):
+                            picked[i] = order[d, i]
+                    else:
+                        amount = power // 2
+                        if kind == shield_id:
+                            # Shield skill: add shield to self
+                            new = min(hp[a, j] + amount, max_hp[a, j])
+                            healed[a, j] += new - hp[a, j]
+                            hp[a, j] = new
+                        elif kind == heal_id:
+                            # Heal skill: heal all living allies
+                            for s in range(slots):
+                                old = hp[a, s]
+                                new = min(old + amount, max_hp[a, s]) if old > 0 else 0
+                                healed[a, j] += new - old
+                                hp[a, s] = new
+
+                        # Random targets: the first k entries of a partial shuffle of the living list
+                        n = n_alive[d]
+                        k = min(k, n)
+                        for i in range(k):
+                            state += np.uint64(0x9E3779B97F4A7C15)
+                            z = (state ^ (state >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+                            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+                            z ^= z >> np.uint64(31)
+                            r = i + np.intp(((z >> np.uint64(32)) * np.uint64(n - i)) >> np.uint64(32))
+                            s = order[d, r]
+                            order[d, r] = order[d, i]
+                            pos[d, order[d, r]] = r
+                            order[d, i] = s
+                            pos[d, s] = i
+                            picked[i] = s
+
+                    for i in range(k):
+                        s = picked[i]
+                        old = hp[d, s]
+                        new = max(old - table[power, kind, own, element[d, s]], 0)
+                        hp[d, s] = new
+                        dealt[a, j] += old - new
+                        if old > 0 and new == 0:
+                            last = n_alive[d] - 1
+                            moved = order[d, last]
+                            order[d, pos[d, s]] = moved
+                            pos[d, moved] = pos[d, s]
+                            n_alive[d] = last
+            round_num += 1
+
+        rounds[b] = round_num - 1
+        survivors[b, 0] = n_alive[0]
+        survivors[b, 1] = n_alive[1]
+        for s in range(hp1.shape[1]):
+            dealt1[b, s], healed1[b, s] = dealt[0, s], healed[0, s]
+        for s in range(hp2.shape[1]):
+            dealt2[b, s], healed2[b, s] = dealt[1, s], healed[1, s]
+
+def _play_chunks(teams, table, count, shield_id, heal_id, max_rounds, seeds, chunk,
+                 survivors, rounds, dealt1, healed1, dealt2, healed2):
+    '''
+    Plays a batch in chunks of chunk battles, one random stream per chunk,
+    spread over Numba's worker threads.
+    '''
+    battles = len(rounds)
+    for c in numba.prange(len(seeds)):
+        _play_battles(teams, table, count, shield_id, heal_id, max_rounds, seeds[c], c * chunk,
+                      min((c + 1) * chunk, battles), survivors, rounds, dealt1, healed1, dealt2, healed2)
+
+if numba is not None:
+    _play_battles = numba.njit(cache=True, nogil=True)(_play_battles)
+    _play_chunks = numba.njit(cache=True, parallel=True)(_play_chunks)
+
+# Battles per random stream of the compiled kernel; fixed so that results
+# do not depend on the number of threads
+COMPILED_CHUNK = 1024
+
+def _simulate_compiled(team1, team2, rng, max_rounds):
+    '''
+    Runs a batch on the Numba-compiled kernel; see simulate_batch.
+    '''
+    battles = team1.shape[0]
+    teams = (team1.hp, team1.atk, team1.element, team1.skill, team2.hp, team2.atk, team2.element, team2.skill)
+    table = _damage_array(max(int(team1.atk.max(initial=0)), int(team2.atk.max(initial=0))) + 1)
+    seeds = rng.integers(2 ** 64, size=-(-battles // COMPILED_CHUNK), dtype=np.uint64)
+    survivors = np.zeros((battles, 2), dtype=np.int32)
+    rounds = np.zeros(battles, dtype=np.int32)
+    dealt1, dealt2 = np.zeros(team1.shape, dtype=np.int32), np.zeros(team2.shape, dtype=np.int32)
+    healed1, healed2 = np.zeros_like(dealt1), np.zeros_like(dealt2)
+    _play_chunks(teams, table, TARGET_COUNT, SKILL_SHIELD, SKILL_HEAL, max_rounds, seeds, COMPILED_CHUNK,
+                 survivors, rounds, dealt1, healed1, dealt2, healed2)
+
+    winner = np.where(survivors[:, 0] > survivors[:, 1], 1, np.where(survivors[:, 1] > survivors[:, 0], 2, 0))
+    return BatchResult(winner, survivors, rounds, (dealt1, dealt2), (healed1, healed2))
+
+def simulate_batch(team1, team2, rng=None, max_rounds=MAX_BATTLE_ROUNDS, compiled=None):
+    '''
+    Simulates a batch of independent battles with the same rules as
+    core.battle.simulate_battle.
+
+    When Numba is installed the batch runs on a compiled kernel that plays
+    each battle to the end in machine code (compiled once and cached on
+    disk). Otherwise, every round, all running battles advance together
+    with masked array operations; finished battles are dropped from the
+    working arrays once they make up half of them.
+
+    Parameters:
+        team1 (BatchTeams): The first team of each battle.
+        team2 (BatchTeams): The second team of each battle.
+        rng (numpy.random.Generator): Random generator (a fresh one if omitted).
+        max_rounds (int): Maximum number of rounds before a battle is stopped.
+        compiled (bool): Whether to use the compiled kernel (defaults to
+            whether Numba is installed).
+
+    Returns:
+        BatchResult: The outcome of every battle.
+    '''
+    rng = rng if rng is not None else np.random.default_rng()
+    if compiled is None:
+        compiled = numba is not None
+    if compiled:
+        if numba is None:
+            raise ImportError("the compiled battle kernel needs Numba")
+        return _simulate_compiled(team1, team2, rng, max_rounds)
+    battles = team1.shape[0]
+    idx = np.arange(battles)
+    side1, side2 = _Side(team1), _Side(team2)
+
+    survivors = np.zeros((battles, 2), dtype=np.int32)
+    rounds = np.zeros(battles, dtype=np.int32)
+    dealt1, dealt2 = np.zeros(team1.shape, dtype=np.int32), np.zeros(team2.shape, dtype=np.int32)
+    healed1, healed2 = np.zeros_like(dealt1), np.zeros_like(dealt2)
+
+    round_num = 1
+    finished = np.zeros(battles, dtype=bool)
+    while len(idx):
+        running = (side1.n_alive > 0) & (side2.n_alive > 0)
+        if round_num > max_rounds:
+            running[:] = False
+        # Finished battles are frozen (one side has no living units), so they
+        # only need their round count now and can be dropped lazily
+        ended = ~running & ~finished
+        rounds[idx[ended]] = round_num - 1
+        finished |= ended
+        alive = np.count_nonzero(running)
+        if alive * 2 <= len(idx):
+            # Record and drop the finished battles
+            done = ~running
+            ids = idx[done]
+            survivors[ids, 0] = side1.n_alive[done]
+            survivors[ids, 1] = side2.n_alive[done]
+            dealt1[ids], dealt2[ids] = side1.dealt[:, done].T, side2.dealt[:, done].T
+            healed1[ids], healed2[ids] = side1.healed[:, done].T, side2.healed[:, done].T
+            idx = idx[running]
+            finished = finished[running]
+            if not alive:
+                break
+            side1.keep(running)
+            side2.keep(running)
+
+        if round_num % 2 == 1:
+            _team_turn(side1, side2, rng)
+            _team_turn(side2, side1, rng)
+        else:
+            _team_turn(side2, side1, rng)
+            _team_turn(side1, side2, rng)
+        round_num += 1
+
+    winner = np.where(survivors[:, 0] > survivors[:, 1], 1, np.where(survivors[:, 1] > survivors[:, 0], 2, 0))
+    return BatchResult(winner, survivors, rounds, (dealt1, dealt2), (healed1, healed2))
@@ -0,0 +1,159 @@
+"""
+Load generator for the match server
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+async def _connect(address):
+    '''
+    Opens a connection to "host:port" or "unix:/path".
+    '''
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:"):])
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port))
+
+async def play_client(address, stats, rng, think, idle_share):
+    '''
+    Plays one match as a simple client.
+
+    At every BUY? the client thinks for up to think seconds and then buys
+    the offers it can afford in offer order, or, with probability
+    idle_share, stays silent so the server's shop timeout hands the turn to
+    the AI.
+
+    Parameters:
+        address (str): The server address.
+        stats (dict): Totals updated in place: results, timeouts, latencies, errors.
+        rng (random.Random): Random generator for think times and idling.
+        think (float): Maximum seconds of thinking per turn.
+        idle_share (float): Share of turns left to time out.
+
+    Returns:
+        None
+    '''
+    reader, writer = await _connect(address)
+    try:
+        gold = 0
+        offers = []
+        sent = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                stats["errors"] += 1
+                return
+            kind, *fields = line.decode().split()
+            if kind == "HELLO":
+                writer.write(b"PLAY\n")
+            elif kind == "ROUND":
+                gold = int(fields[1])
+                offers = []
+            elif kind == "SHOP":
+                offers.append(int(fields[2]))
+            elif kind == "BUY?":
+                if rng.random() < idle_share:
+                    continue
+                await asyncio.sleep(rng.uniform(0, think))
+                picked = []
+                for idx, cost in enumerate(offers):
+                    if cost <= gold:
+                        picked.append(idx)
+                        gold -= cost
+                writer.write(("BUY " + " ".join(map(str, picked)) + "\n").encode())
+                sent = time.perf_counter()
+            elif kind == "TIMEOUT":
+                stats["timeouts"] += 1
+            elif kind == "RESERVE" and sent is not None:
+                stats["latencies"].append(time.perf_counter() - sent)
+                sent = None
+            elif kind == "ERR":
+                stats["errors"] += 1
+            elif kind == "END":
+                stats["results"][fields[0]] = stats["results"].get(fields[0], 0) + 1
+                return
+    finally:
+        writer.close()
+
+async def run_load(address, matches, think, idle_share, seed):
+    '''
+    Runs matches concurrent clients against a server.
+
+    Returns:
+        dict: results, timeouts, latencies, errors and elapsed seconds.
+    '''
+    stats = {"results": {}, "timeouts": 0, "latencies": [], "errors": 0}
+    root = random.Random(seed)
+    clients = [play_client(address, stats, random.Random(root.getrandbits(64)), think, idle_share)
+               for _ in range(matches)]
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*clients, return_exceptions=True)
+    stats["elapsed"] = time.perf_counter() - start
+    stats["errors"] += sum(isinstance(outcome, Exception) for outcome in outcomes)
+    return stats
+
+async def _wait_for_server(address, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await _connect(address)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.write(b"QUIT\n")
+            writer.close()
+            return
+
+def main():
+    '''
+    Runs the load generator and prints a summary.
+
+    With --spawn the match server is started as a subprocess on the same
+    address and stopped afterwards; otherwise a server must already be
+    listening (python main.py --serve ADDRESS).
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Load generator for main.py --serve")
+    parser.add_argument("--address", default="127.0.0.1:7777", help="host:port or unix:/path of the server")
+    parser.add_argument("--matches", type=int, default=1000, help="concurrent matches")
+    parser.add_argument("--think", type=float, default=1.0, help="maximum seconds a client thinks per turn")
+    parser.add_argument("--idle", type=float, default=0.1, help="share of turns left to the server's shop timeout")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the clients' choices")
+    parser.add_argument("--spawn", action="store_true", help="start the server as a subprocess")
+    parser.add_argument("--shop-timeout", type=float, default=2.0, help="shop timeout of a spawned server")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        server = subprocess.Popen([sys.executable, main_py, "--serve", args.address,
+                                   "--shop-timeout", str(args.shop_timeout), "--seed", str(args.seed)])
+    try:
+        if server is not None:
+            asyncio.run(_wait_for_server(args.address))
+        stats = asyncio.run(run_load(args.address, args.matches, args.think, args.idle, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(stats["latencies"])
+    finished = sum(stats["results"].values())
+    print(f"{finished}/{args.matches} matches finished in {stats['elapsed']:.1f}s "
+          f"({finished / stats['elapsed']:.1f} matches/s), results {stats['results']}")
+    print(f"{len(latencies)} purchases, {stats['timeouts']} shop timeouts, {stats['errors']} errors")
+    if latencies:
+        print(f"BUY -> RESERVE latency: p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -2,65 +2,256 @@
 Main entry point for the Blue Archive Auto Chess game
 """
 
+import argparse
+import asyncio
+import json
+import sys
 import time
+from core.constants import GAME_ROUNDS, WINS_TO_END, LOBBY_SIZE
 from models.shop import Shop
 from models.player import Player
 from core.tutorial import show_tutorial
-from core.battle import battle
+from core.battle import battle, replay_battle
+from core.ai import GreedyPolicy, SearchPolicy
+from core.arrange import LineupArranger
 from core.display import game_round
+from core.eventlog import EventLogWriter, read_log
+from core.game import play_games
+from core.lobby import Lobby, GHOST
+from core.profiling import Profiler
+from core import render
+from core.render import Renderer, LEVELS, SUMMARY
+from core.rng import RNG
+from core.server import MatchServer
+
+def replay(path):
+    '''
+    Replays every battle of an event log at the renderer's speed.
+    
+    Parameters:
+        path (str): The event log file.
+        
+    Returns:
+        None
+    '''
+    try:
+        battles = read_log(path)
+    except ValueError as e:
+        sys.exit(f"Cannot replay: {e}")
+    for i, logged in enumerate(battles):
+        render.current.write(f"\n\n🎞️ Battle {i + 1}/{len(battles)}: {logged.names[0]} vs {logged.names[1]}", SUMMARY)
+        replay_battle(logged)
+
+def headless(args):
+    '''
+    Plays AI-vs-AI games without prompts or pauses.
+    
+    Prints one JSON record per game to stdout as the games finish, in game
+    order, then the game rate to stderr.
+    
+    Parameters:
+        args (Namespace): The parsed command line.
+        
+    Returns:
+        None
+    '''
+    start = time.perf_counter()
+    games = 0
+    for record in play_games(args.games, args.seed, args.workers, args.ai, args.ai_budget, args.arrange != "none"):
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+        games += 1
+    elapsed = time.perf_counter() - start
+    print(f"{games} games in {elapsed:.2f}s ({games / elapsed:.1f} games/s)", file=sys.stderr)
+
+def lobby(args):
+    '''
+    Plays an AI lobby to the end, reporting every round through the renderer.
+    
+    Parameters:
+        args (Namespace): The parsed command line.
+        
+    Returns:
+        None
+    '''
+    out = render.current
+    lobby_rng, ai_rng = RNG(args.seed).spawn(2) if args.seed is not None else (None, None)
+    ai_rngs = ai_rng.spawn(args.lobby) if ai_rng is not None else [None] * args.lobby
+    players = [Player(f"AI {i + 1}", verbose=False) for i in range(args.lobby)]
+    policies = [SearchPolicy(args.ai_budget, workers=1, rng=rng) if args.ai == "search" else GreedyPolicy()
+                for rng in ai_rngs]
+    names = [player.name for player in players]
+    with Lobby(players, policies, lobby_rng, args.workers) as game:
+        while not game.finished():
+            report = game.play_round()
+            out.write(f"\n========== Lobby round {game.round} ==========", SUMMARY)
+            for a, b, result, damage in report:
+                name_b = "Ghost" if b == GHOST else names[b]
+                winner = {0: "draw", 1: names[a], 2: name_b}[result.winner]
+                out.write(f"{names[a]} vs {name_b}: {winner} "
+                          f"({result.survivors[0]}-{result.survivors[1]} left, -{damage[0]}/-{damage[1]} HP)", SUMMARY)
+            out.write("HP: " + ", ".join(f"{names[i]} {game.hp[i]}" for i in game.alive), SUMMARY)
+            out.flush()
+        standings = game.standings()
+    for policy in policies:
+        policy.close()
+    out.write("\n🏆 Final standings:", SUMMARY)
+    for place, i in enumerate(standings, 1):
+        out.write(f"{place}. {names[i]}", SUMMARY)
+
+def serve(args):
+    '''
+    Hosts games for network clients until interrupted.
+    
+    Parameters:
+        args (Namespace): The parsed command line.
+        
+    Returns:
+        None
+    '''
+    server = MatchServer(args.seed, args.shop_timeout, state_dir=args.state_dir)
+    print(f"Serving matches on {args.serve}", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(server.serve(args.serve))
+    except KeyboardInterrupt:
+        pass
 
 def main():
     '''
     The main game loop that initializes the game and runs multiple rounds.
     
     Sets up the game environment with players and shop, then runs a fixed
-    number of game rounds before ending the game.
+    number of game rounds before ending the game. With --log every battle
+    is also recorded to an event log, and --replay plays a log back instead
+    of starting a game. --headless plays AI-vs-AI games in bulk instead,
+    --lobby plays a free-for-all lobby of AI players,
+    --serve hosts games for network clients,
+    and --profile reports where the time of any of these runs went.
+    
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Blue Archive Auto Chess")
+    parser.add_argument("--log", metavar="FILE", help="record every battle to a binary event log")
+    parser.add_argument("--replay", metavar="FILE", help="replay the battles of an event log")
+    parser.add_argument("--speed", type=float, default=1.0, help="battle pacing (2 = twice as fast, 0 = no pauses)")
+    parser.add_argument("--verbosity", choices=list(LEVELS), default="full",
+                        help="game output: every battle action (full), shops and outcomes (summary) or none (silent)")
+    parser.add_argument("--seed", type=int, help="seed the shop and battles so the game can be reproduced")
+    parser.add_argument("--ai", choices=["search", "greedy"], default="search", help="how the AI shops")
+    parser.add_argument("--ai-budget", type=float, default=0.05, help="seconds the search AI thinks per turn")
+    parser.add_argument("--arrange", choices=["none", "ai", "all"], default="none",
+                        help="who picks the deployed lineup with the arrangement optimizer")
+    parser.add_argument("--arrange-budget", type=float, default=0.2, help="seconds spent arranging a lineup")
+    parser.add_argument("--headless", action="store_true",
+                        help="play AI-vs-AI games without prompts, printing one JSON record per game")
+    parser.add_argument("--games", type=int, default=100, help="number of --headless games")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes for --headless and --lobby (defaults to the CPU count)")
+    parser.add_argument("--lobby", type=int, metavar="PLAYERS",
+                        help=f"play a free-for-all lobby of 2 to {LOBBY_SIZE} AI players with HP elimination")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="host games for network clients on host:port or unix:/path (see core/server.py)")
+    parser.add_argument("--shop-timeout", type=float, default=30.0,
+                        help="seconds a --serve client has to shop before the AI shops for it")
+    parser.add_argument("--state-dir", metavar="DIR",
+                        help="snapshot --serve matches here after every round so clients can RESUME them")
+    parser.add_argument("--profile", choices=["json", "prometheus", "flame"],
+                        help="time game phases and count battle events, then dump them in this format")
+    parser.add_argument("--profile-out", metavar="FILE", help="file for the --profile dump (default: stderr)")
+    args = parser.parse_args()
+    if args.lobby is not None and not 2 <= args.lobby <= LOBBY_SIZE:
+        parser.error(f"--lobby takes 2 to {LOBBY_SIZE} players")
+    render.use(Renderer(LEVELS[args.verbosity], args.speed))
+    
+    profiler = None
+    if args.profile:
+        # Worker processes are not instrumented, so profiled headless games run in this process
+        args.workers = 1
+        profiler = Profiler()
+        profiler.enable()
+    try:
+        if args.replay:
+            replay(args.replay)
+        elif args.headless:
+            headless(args)
+        elif args.lobby:
+            lobby(args)
+        elif args.serve:
+            serve(args)
+        else:
+            play(args)
+    finally:
+        render.current.flush()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump(args.profile, args.profile_out)
+
+def play(args):
+    '''
+    Plays one interactive game against the AI.
     
+    Parameters:
+        args (Namespace): The parsed command line.
+        
     Returns:
         None
     '''
-    print("\n=== Welcome to Blue Archive Auto Chess Game! ===")
+    out = render.current
+    out.write("\n=== Welcome to Blue Archive Auto Chess Game! ===", SUMMARY)
 
     # Prompt for tutorial
-    show_help = input("Would you like to see the game tutorial? (y/n): ").lower().strip()
+    show_help = out.prompt("Would you like to see the game tutorial? (y/n): ").lower().strip()
 
     if show_help == 'y' or show_help == 'yes':
         # Choose language
-        language_choice = input("Choose language / 选择语言 (en/zh): ").lower().strip()
+        language_choice = out.prompt("Choose language / 选择语言 (en/zh): ").lower().strip()
         language = "en" if language_choice != "zh" else "zh"
     
     
         show_tutorial(language)
     
-    # Create shop instance
-    shop = Shop()
+    # Create shop instance; a seed gives the shop, the battles and the AI their own streams
+    shop_rng, battle_rng, ai_rng = RNG(args.seed).spawn(3) if args.seed is not None else (None, None, None)
+    shop = Shop(rng=shop_rng)
     
     # Get player name
-    player_name = input("Enter your name: ")
+    player_name = out.prompt("Enter your name: ")
 
-    print(f"\nWelcome, {player_name}!")
+    out.write(f"\nWelcome, {player_name}!", SUMMARY)
     
-    player1 = Player(player_name)
-    player2 = Player("🤖 AI")
+    # The arranger's stream is a child of the AI's, so seeded games keep their other streams
+    arranger = None
+    if args.arrange != "none":
+        arranger = LineupArranger(args.arrange_budget, rng=ai_rng.spawn(1)[0] if ai_rng is not None else None)
+    player1 = Player(player_name, arranger=arranger if args.arrange == "all" else None)
+    player2 = Player("🤖 AI", arranger=arranger)
+    try:
+        log = EventLogWriter(args.log) if args.log else None
+    except ValueError as e:
+        sys.exit(f"Cannot log to {args.log}: {e}")
+    policy = SearchPolicy(args.ai_budget, rng=ai_rng) if args.ai == "search" else GreedyPolicy()
 
     # Main game loop
-    for round_id in range(1, 6):
-        print(f"\n\n🌟🌟 Round {round_id} 🌟🌟")
-        game_round(player1, player2, shop)
-        battle(player1, player2)
-        if player1.win == 3 or player2.win == 3:
+    for round_id in range(1, GAME_ROUNDS + 1):
+        out.write(f"\n\n🌟🌟 Round {round_id} 🌟🌟", SUMMARY)
+        game_round(player1, player2, shop, policy)
+        battle(player1, player2, log, battle_rng)
+        if player1.win == WINS_TO_END or player2.win == WINS_TO_END:
             break
+    if log is not None:
+        log.close()
+    policy.close()
 
     # Game end and results
-    print("\n🎮 Game Over! Thanks for Playing!")
+    out.write("\n🎮 Game Over! Thanks for Playing!", SUMMARY)
 
-    print(f"\n{player1.name} won {player1.win} rounds, {player2.name} won {player2.win} rounds.")
+    out.write(f"\n{player1.name} won {player1.win} rounds, {player2.name} won {player2.win} rounds.", SUMMARY)
     if player1.win > player2.win:
-        print(f"Congratulations {player1.name}, you are the champion!")
+        out.write(f"Congratulations {player1.name}, you are the champion!", SUMMARY)
     elif player1.win < player2.win:
-        print(f"Better luck next time, {player1.name}!")
+        out.write(f"Better luck next time, {player1.name}!", SUMMARY)
     else:
-        print("It's a draw!") 
+        out.write("It's a draw!", SUMMARY)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
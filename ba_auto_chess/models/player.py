@@ -2,8 +2,10 @@
 Player class definition
 """
 
-from collections import defaultdict
+from core import render
 from core.constants import MAX_UNITS_ON_FIELD
+from core.render import SUMMARY, FULL
+from models.synergy import SynergyTracker
 from models.unit import Unit
 
 class Player:
@@ -16,16 +18,94 @@ class Player:
     
     Parameters:
         name (str): The name of the player.
+        board_size (int): Maximum number of units deployed on the field.
+        verbose (bool): Whether the player's actions are sent to the renderer.
+        arranger (LineupArranger): Optional optimizer choosing which reserve
+            units to deploy, and in which order, against the opponent.
     '''
     
-    def __init__(self, name):
+    def __init__(self, name, board_size=MAX_UNITS_ON_FIELD, verbose=True, arranger=None):
         self.name = name
+        self.board_size = board_size
+        self.verbose = verbose
+        self.arranger = arranger
         self.gold = 5
         self.units = []  # Units on the field
         self.reserve = []  # Units in reserve
+        self._slots = {}  # (name, star) -> units in reserve, in reserve order
+        self.synergy = SynergyTracker()  # School synergies of the units on the field
         self.fail = 0  # Track consecutive losses for comeback gold
         self.win = 0  # Track wins for comeback gold
     
+    @property
+    def reserve(self):
+        '''
+        The player's reserve, in deployment order.
+        
+        Change it through buy_unit, sell_unit and try_merge so the merge
+        index stays in sync; assigning a new list rebuilds the index.
+        '''
+        return self._reserve
+    
+    @reserve.setter
+    def reserve(self, units):
+        self._reserve = list(units)
+        self._slots = {}
+        for unit in self._reserve:
+            self._slots.setdefault((unit.name, unit.star), []).append(unit)
+    
+    def _add_to_reserve(self, unit):
+        '''
+        Appends a unit to the reserve and the merge index.
+        '''
+        self._reserve.append(unit)
+        self._slots.setdefault((unit.name, unit.star), []).append(unit)
+    
+    def _remove_from_index(self, unit):
+        '''
+        Removes a unit from the merge index.
+        '''
+        key = (unit.name, unit.star)
+        slots = self._slots[key]
+        slots.remove(unit)
+        if not slots:
+            del self._slots[key]
+    
+    def clone(self, verbose=False):
+        '''
+        Copies the player's gold, streaks and reserve for what-if evaluation.
+        
+        The copy owns fresh units built from the same templates, so buying,
+        merging and deploying on it leaves this player untouched.
+        
+        Parameters:
+            verbose (bool): Whether the copy reports its actions.
+            
+        Returns:
+            Player: The copy.
+        '''
+        copy = Player(self.name, self.board_size, verbose)
+        copy.gold = self.gold
+        copy.fail = self.fail
+        copy.win = self.win
+        copy.reserve = [Unit(unit.template) for unit in self.reserve]
+        return copy
+    
+    def income_breakdown(self, gold=None):
+        '''
+        Computes the income the player would get at the start of a turn.
+        
+        Parameters:
+            gold (int): Gold the interest is paid on (defaults to the current gold).
+            
+        Returns:
+            tuple: (base income, interest, loss streak gold).
+        '''
+        base_income = 5
+        interest = (self.gold if gold is None else gold) // 5  # 20% interest
+        streak_gold = self.fail  # Gold bonus for consecutive losses
+        return base_income, interest, streak_gold
+    
     def income(self):
         '''
         Calculates and adds income to the player's gold at the start of their turn.
@@ -36,17 +116,16 @@ class Player:
         Returns:
             None
         '''
-        base_income = 5
-        interest = self.gold // 5  # 20% interest
-        streak_gold = self.fail  # Gold bonus for consecutive losses
+        base_income, interest, streak_gold = self.income_breakdown()
         
         total_income = base_income + interest + streak_gold
         self.gold += total_income
         
-        print(f"{self.name} gets income: base {base_income} + interest {interest} + loss streak {streak_gold} = {total_income} gold.")
-        print(f"Gold :{self.gold}")
+        if self.verbose:
+            render.current.write(f"{self.name} gets income: base {base_income} + interest {interest} + loss streak {streak_gold} = {total_income} gold.", SUMMARY)
+            render.current.write(f"Gold :{self.gold}", SUMMARY)
     
-    def buy_unit(self, unit):
+    def buy_unit(self, unit, shop=None):
         '''
         Purchases a unit from the shop and adds it to the player's reserve.
         
@@ -56,93 +135,144 @@ class Player:
         
         Parameters:
             unit (Unit): The unit to purchase.
+            shop (Shop): The shop it is bought from; a shared pool gives up one copy.
             
         Returns:
             bool: True if purchase successful, False otherwise.
         '''
         if self.gold < unit.cost:
-            print(f"{self.name} doesn't have enough gold to buy {unit.name}.")
+            if self.verbose:
+                render.current.write(f"{self.name} doesn't have enough gold to buy {unit.name}.", SUMMARY)
+            return False
+        
+        if shop is not None and not shop.purchase(unit):
+            if self.verbose:
+                render.current.write(f"{unit.element}{unit.name} is sold out.", SUMMARY)
             return False
         
         self.gold -= unit.cost
-        self.reserve.append(unit)
-        print(f"{self.name} bought {unit.element}{unit.name}")
+        self._add_to_reserve(unit)
+        if self.verbose:
+            render.current.write(f"{self.name} bought {unit.element}{unit.name}")
         
-        # Try to merge after each purchase
-        self.try_merge()
+        # Try to merge after each purchase; only the bought unit's group can be mergeable
+        self.try_merge(shop, (unit.name, unit.star))
         return True
     
-    def try_merge(self):
+    def sell_unit(self, index, shop=None):
+        '''
+        Sells a unit from the reserve for its cost.
+        
+        Parameters:
+            index (int): Position of the unit in the reserve.
+            shop (Shop): The shop to return the unit's copy to.
+            
+        Returns:
+            Unit: The sold unit.
+        '''
+        unit = self._reserve.pop(index)
+        self._remove_from_index(unit)
+        if unit in self.units:
+            self.units.remove(unit)
+        if unit in self.synergy.field:
+            self.synergy.remove(unit, [])
+        self.gold += unit.cost
+        if shop is not None:
+            shop.release(unit)
+        if self.verbose:
+            render.current.write(f"{self.name} sold {unit.element}{unit.name}★{unit.star} for {unit.cost} gold.")
+        return unit
+    
+    def try_merge(self, shop=None, key=None):
         '''
         Attempts to merge three identical units into an upgraded version.
         
         Checks the player's reserve for sets of three identical units with the same name,
-        removes them, and adds a new unit with increased star level.
+        removes them, and adds a new unit with increased star level. Each merge
+        turns two units into one, so one copy goes back to a shared shop pool.
+        
+        Merge candidates are looked up in the (name, star) index. A merge can
+        only make the upgraded unit's group mergeable, so a cascade checks one
+        group per step.
         
+        Parameters:
+            shop (Shop): The shop to return merged copies to.
+            key (tuple): The (name, star) group that just changed, if known.
+            
         Returns:
             None
         '''
-        # Count units by name
-        name_count = defaultdict(list)
-        for i, unit in enumerate(self.reserve):
-            name_count[unit.name].append(i)
-        
-        # Check for mergeable units (2 or more of the same name and star)
-        for name, indices in name_count.items():
-            # Group units by star level
-            by_star = defaultdict(list)
-            for idx in indices:
-                by_star[self.reserve[idx].star].append(idx)
+        # Without a hint (e.g. a reserve assigned by hand) every step rescans
+        # the index counts in reserve order, like the original full rescan
+        rescan = key is None
+        while True:
+            if rescan:
+                key = self._find_mergeable()
+            if key is None or len(self._slots.get(key, ())) < 2:
+                return
+            
+            # The two earliest units of the group merge
+            first, second = self._slots[key][:2]
+            self._remove_from_index(first)
+            self._remove_from_index(second)
+            self._reserve.remove(first)
+            self._reserve.remove(second)
             
-            # Try to merge for each star level
-            for star, idx_list in by_star.items():
-                if len(idx_list) >= 2:
-                    # Get properties from first unit
-                    base_unit = self.reserve[idx_list[0]]
-                    
-                    # Create upgraded unit
-                    upgraded = Unit(
-                        base_unit.name, 
-                        base_unit.cost, 
-                        base_unit.max_hp, 
-                        base_unit.base_atk,
-                        base_unit.skill,
-                        base_unit.school,
-                        base_unit.element
-                    )
-                    upgraded.star = star
-                    upgraded.upgrade()  # Increase star and stats
-                    
-                    # Remove 3 units from reserve (starting with highest index to avoid shifting issues)
-                    for idx in sorted(idx_list[:2], reverse=True):
-                        self.reserve.pop(idx)
-                    
-                    # Add the upgraded unit
-                    self.reserve.append(upgraded)
-                    
-                    print(f"{self.name} successfully merged {upgraded.element}{upgraded.name} to ★{upgraded.star}")
-                    
-                    # Recursively check for more merges
-                    self.try_merge()
-                    return
-    
-    def deploy_units(self):
+            # Create upgraded unit from the next star level's template
+            upgraded = Unit(first.template.upgraded())
+            self._add_to_reserve(upgraded)
+            if shop is not None:
+                shop.release(upgraded)
+            
+            if self.verbose:
+                render.current.write(f"{self.name} successfully merged {upgraded.element}{upgraded.name} to ★{upgraded.star}", SUMMARY)
+            
+            # Check for a cascade into the next star level
+            key = (upgraded.name, upgraded.star)
+    
+    def _find_mergeable(self):
+        '''
+        Finds the first mergeable group in reserve order: the first name by
+        first appearance, then its first star level by first appearance.
+        
+        Returns:
+            tuple: The (name, star) key, or None if nothing can merge.
+        '''
+        if all(len(slots) < 2 for slots in self._slots.values()):
+            return None
+        stars_by_name = {}
+        for unit in self._reserve:
+            stars_by_name.setdefault(unit.name, {})[unit.star] = None
+        for name, stars in stars_by_name.items():
+            for star in stars:
+                if len(self._slots[(name, star)]) >= 2:
+                    return (name, star)
+        return None
+    
+    def deploy_units(self, enemy=None):
         '''
         Selects units from the reserve to deploy on the battlefield.
         
-        Takes the first MAX_UNITS_ON_FIELD units from the reserve and prepares
-        them for battle by resetting their health points to maximum.
+        Takes the first board_size units from the reserve, or the lineup
+        chosen by the player's arranger when it has one and the enemy lineup
+        is known, and prepares them for battle by resetting their health
+        points to maximum.
+        
+        Parameters:
+            enemy (list): The lineup about to be fought, in acting order.
         
         Returns:
             None
         '''
+        if self.arranger is not None and enemy:
+            chosen = self.arranger.arrange(self.reserve, enemy, self.board_size)
+        else:
+            # Take up to board_size units from reserve
+            chosen = self.reserve[:self.board_size]
+        
         # Reset units list
         self.units = []
-        
-        # Take up to MAX_UNITS_ON_FIELD from reserve
-        deploy_count = min(MAX_UNITS_ON_FIELD, len(self.reserve))
-        for i in range(deploy_count):
-            unit = self.reserve[i]
+        for unit in chosen:
             unit.hp = unit.max_hp  # Reset HP for battle
             self.units.append(unit)
         
@@ -159,71 +289,54 @@ class Player:
         Returns:
             None
         '''
+        out = render.current
         if not self.reserve:
-            print(f"{self.name} has no units.")
+            out.write(f"{self.name} has no units.", SUMMARY)
             return
         
-        print(f"{'No.':<4} {'Name':<12} {'★':<2} {'HP':<5} {'ATK':<5} {'Skill':<10} {'School'}")
-        print("-" * 60)
+        out.write(f"{'No.':<4} {'Name':<12} {'★':<2} {'HP':<5} {'ATK':<5} {'Skill':<10} {'School'}", SUMMARY)
+        out.write("-" * 60, SUMMARY)
         
         for i, unit in enumerate(self.reserve):
-            print(f"{i:<4} {unit.element+unit.name:<12} {unit.star:<2} {unit.max_hp:<5} {unit.atk:<5} {unit.skill:<10} {unit.school}")
+            out.write(f"{i:<4} {unit.element+unit.name:<12} {unit.star:<2} {unit.max_hp:<5} {unit.atk:<5} {unit.skill:<10} {unit.school}", SUMMARY)
     
     def get_synergy(self):
         '''
-        Calculates school synergy bonuses based on deployed units.
+        Describes the school synergy bonuses of the deployed units.
         
-        Counts the number of units from each school and determines which
-        synergy bonuses are active (requiring at least 2 units from a school).
+        Synergies are tracked incrementally as units enter or leave the
+        field; a school reaching a tier of SYNERGY_TIERS gives all of its
+        units that tier's ATK bonus.
         
         Returns:
             list: A list of strings describing active synergy bonuses.
         '''
-        school_count = defaultdict(int)
-        for u in self.units:
-            school_count[u.school] += 1
-        
-        # Create dictionary recording whether each school has synergy
-        synergy_active = {school: count >= 2 for school, count in school_count.items()}
-        
-        # Return descriptions for display
-        bonus_descriptions = [f"{school} synergy(+1 ATK)" for school, active in synergy_active.items() if active]
-        
-        return bonus_descriptions
+        return [f"{school} synergy(+{bonus} ATK)" for school, count, bonus in self.synergy.active()]
     
     def apply_synergy_bonus(self):
         '''
         Applies school synergy bonuses to deployed units.
         
-        Updates the attack values of all deployed units based on active
-        school synergies, giving +1 attack to units from schools with
-        at least 2 representatives on the field.
+        Updates the synergy tracker with the current field and recomputes
+        attack only for units whose bonus changed: units that entered or
+        left the field, and the members of schools that crossed a tier.
         
         Returns:
             None
         '''
-        # Calculate school unit counts
-        school_count = defaultdict(int)
-        for u in self.units:
-            school_count[u.school] += 1
-        
-        # Create active synergy set for faster lookup
-        active_synergies = {school for school, count in school_count.items() if count >= 2}
+        changed = self.synergy.sync(self.units)
+        if not self.verbose:
+            return
         
-        # Display active synergiesCOMP9001/project/ba_auto_chess/main.py
+        # Display active synergies
+        out = render.current
+        active_synergies = self.synergy.active()
         if active_synergies:
-            print("\n=== School Synergies ===")
-            for school in active_synergies:
-                print(f"🔹 {school} synergy active! - All {school} members get +1 ATK")
-        
-        # Apply synergy bonus
-        for u in self.units:
-            # First reset to base attack
-            original_atk = u.atk
-            u.atk = u.base_atk
-            
-            # If unit's school has synergy, increase attack
-            if u.school in active_synergies:
-                u.atk += 1
-                if u.atk != original_atk:  # Only show if attack changed
-                    print(f"  └─ {u.element}{u.name}★{u.star} attack: {u.base_atk} → {u.atk}")
\ No newline at end of file
+            out.write("\n=== School Synergies ===", SUMMARY)
+            for school, count, bonus in active_synergies:
+                out.write(f"🔹 {school} synergy active! ({count} units) - All {school} members get +{bonus} ATK", SUMMARY)
+        
+        # Only show units whose attack changed
+        for u in changed:
+            if u in self.synergy.field and u.atk != u.base_atk:
+                out.write(f"  └─ {u.element}{u.name}★{u.star} attack: {u.base_atk} → {u.atk}")
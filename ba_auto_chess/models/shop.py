@@ -3,9 +3,9 @@ Shop class definition
 """
 
 import random
-import copy
-from models.unit import Unit
-from core.constants import UNIT_POOL
+from models.unit import Unit, TEMPLATES
+from core.constants import SHOP_SIZE, SHARED_POOL_COPIES
+from core.sampling import FenwickSampler
 
 class Shop:
     '''
@@ -14,38 +14,141 @@ class Shop:
     The Shop class manages the available units for purchase and provides
     a selection mechanism for players to choose from.
     
+    By default the pool is unlimited. With shared=True it models a shared
+    auto chess pool: every unit has a limited number of copies depending on
+    its cost tier, offers are drawn with probability proportional to the
+    remaining copies, purchases take copies out and sold or merged units
+    give copies back.
+    
     Parameters:
-        pool (list): A list of Unit objects available for purchase in the game.
+        pool (list): A list of UnitTemplate objects available for purchase in the game.
+        shared (bool): Whether to track a finite number of copies per unit.
+        copies (dict): Copies per unit by cost tier in shared mode.
+        rng (random.Random): Random generator for the offers (defaults to the random module).
     '''
     
-    def __init__(self, pool=None):
-        self.pool = pool if pool is not None else []
-        # If no pool provided, create units from UNIT_POOL constants
-        if not self.pool:
-            for unit_data in UNIT_POOL:
-                self.pool.append(Unit(
-                    unit_data["name"],
-                    unit_data["cost"],
-                    unit_data["hp"],
-                    unit_data["atk"],
-                    unit_data["skill"],
-                    unit_data["school"],
-                    unit_data["element"]
-                ))
-    
-    def get_choices(self):
+    def __init__(self, pool=None, shared=False, copies=None, rng=None):
+        # If no pool provided, offer every UNIT_POOL template
+        self.pool = list(pool) if pool else list(TEMPLATES.values())
+        self.rng = rng if rng is not None else random
+        self.shared = shared
+        self.sampler = None
+        if shared:
+            copies = copies if copies is not None else SHARED_POOL_COPIES
+            self._index = {template.name: i for i, template in enumerate(self.pool)}
+            self.sampler = FenwickSampler([copies[template.cost] for template in self.pool], self.rng)
+        self._held = set()  # Offered units whose copies are out of the pool until bought or returned
+    
+    def get_choices(self, hold=False):
         '''
         Generates a random selection of units for purchase.
         
         Picks a random subset of units from the pool to offer to the player
-        during their shopping phase.
+        during their shopping phase. In shared mode every slot is drawn by
+        remaining copies, so the same unit can show up more than once but
+        never more often than it has copies left.
+        
+        With hold=True the offered copies stay out of the shared pool, so
+        offers rolled by several players in the same phase never promise the
+        same copy twice. Buying a held unit keeps its copy; return_offer()
+        puts the copies of the units nobody bought back.
+        
+        Parameters:
+            hold (bool): Whether to keep the offered copies out of the pool.
         
         Returns:
             list: A list of up to 5 Unit objects randomly selected from the shop's pool.
         '''
+        if self.shared:
+            return self._draw_shared(hold)
+        
         # Choose up to 5 units randomly
-        choices_count = min(5, len(self.pool))
-        choices = random.sample(self.pool, choices_count)
+        choices_count = min(SHOP_SIZE, len(self.pool))
+        choices = self.rng.sample(self.pool, choices_count)
+        
+        # Return fresh units sharing the immutable templates
+        return [Unit(template) for template in choices]
+    
+    def _draw_shared(self, hold=False):
+        '''
+        Draws one offer from the shared pool, holding back the drawn copies
+        until the offer is complete, or until return_offer() with hold=True.
+        '''
+        sampler = self.sampler
+        drawn = []
+        while len(drawn) < SHOP_SIZE and sampler.total:
+            i = sampler.sample()
+            sampler.update(i, -1)
+            drawn.append(i)
+        units = [Unit(self.pool[i]) for i in drawn]
+        if hold:
+            self._held.update(units)
+        else:
+            for i in drawn:
+                sampler.update(i, 1)
+        return units
+    
+    def return_offer(self, units):
+        '''
+        Puts the copies of held offer units that were not bought back into the pool.
+        
+        Parameters:
+            units (list): An offer from get_choices(hold=True).
+            
+        Returns:
+            None
+        '''
+        for unit in units:
+            if unit in self._held:
+                self._held.discard(unit)
+                self.sampler.update(self._index[unit.name], 1)
+    
+    def remaining(self, name):
+        '''
+        Returns how many copies of a unit are left in the shared pool.
+        
+        Parameters:
+            name (str): The unit's name.
+            
+        Returns:
+            int: Remaining copies, or None when the pool is unlimited.
+        '''
+        if not self.shared:
+            return None
+        return self.sampler.weights[self._index[name]]
+    
+    def purchase(self, unit):
+        '''
+        Takes one copy of a unit out of the shared pool.
         
-        # Return deep copies to avoid modifying the original units
-        return [copy.deepcopy(unit) for unit in choices]
\ No newline at end of file
+        Parameters:
+            unit (Unit): The unit being bought.
+            
+        Returns:
+            bool: False if no copy is left, True otherwise (always True for an unlimited pool).
+        '''
+        if not self.shared:
+            return True
+        if unit in self._held:
+            # Its copy was taken out of the pool when it was offered
+            self._held.discard(unit)
+            return True
+        i = self._index[unit.name]
+        if self.sampler.weights[i] == 0:
+            return False
+        self.sampler.update(i, -1)
+        return True
+    
+    def release(self, unit, count=1):
+        '''
+        Returns copies of a unit to the shared pool.
+        
+        Parameters:
+            unit (Unit): The sold or merged unit.
+            count (int): Number of copies to return.
+            
+        Returns:
+            None
+        '''
+        if self.shared:
+            self.sampler.update(self._index[unit.name], count)
@@ -0,0 +1,129 @@
+"""
+School synergy tracker
+"""
+
+from core.constants import SYNERGY_TIERS
+from core.tables import SCHOOLS
+
+def _bonus_by_count(tiers):
+    '''
+    Expands synergy tiers into a list indexed by school count.
+
+    Parameters:
+        tiers (dict): Units needed -> ATK bonus.
+
+    Returns:
+        list: The ATK bonus for 0..max(tiers) units; larger counts use the last entry.
+    '''
+    bonus = [0] * (max(tiers, default=0) + 1)
+    for needed, value in sorted(tiers.items()):
+        for count in range(needed, len(bonus)):
+            bonus[count] = value
+    return bonus
+
+class SynergyTracker:
+    '''
+    Keeps school counts and synergy bonuses of the units on the field.
+
+    Units are added and removed as they enter or leave the field. Only the
+    units whose bonus changes get their attack recomputed: the unit that
+    moved, plus the other members of its school when the school crosses a
+    tier threshold.
+
+    Parameters:
+        tiers (dict): Units of one school needed -> ATK bonus (defaults to SYNERGY_TIERS).
+    '''
+
+    def __init__(self, tiers=None):
+        self.tiers = dict(SYNERGY_TIERS if tiers is None else tiers)
+        self._bonus = _bonus_by_count(self.tiers)
+        self.members = {}  # school id -> {unit: None}, in the order units entered
+        self.field = {}  # units on the field, in the order they entered
+
+    def bonus_for(self, count):
+        '''
+        Returns the ATK bonus of a school with count units on the field.
+        '''
+        return self._bonus[min(count, len(self._bonus) - 1)]
+
+    def bonus(self, school_id):
+        '''
+        Returns the current ATK bonus of a school.
+        '''
+        return self.bonus_for(len(self.members.get(school_id, ())))
+
+    def add(self, unit, changed):
+        '''
+        Puts a unit on the field.
+
+        Parameters:
+            unit (Unit): The unit entering the field.
+            changed (list): Units whose attack was recomputed, extended in place.
+
+        Returns:
+            None
+        '''
+        members = self.members.setdefault(unit.school_id, {})
+        before = self.bonus_for(len(members))
+        members[unit] = None
+        self.field[unit] = None
+        after = self.bonus_for(len(members))
+        self._set_bonus(members if after != before else (unit,), after, changed)
+
+    def remove(self, unit, changed):
+        '''
+        Takes a unit off the field and restores its base attack.
+
+        Parameters:
+            unit (Unit): The unit leaving the field.
+            changed (list): Units whose attack was recomputed, extended in place.
+
+        Returns:
+            None
+        '''
+        members = self.members[unit.school_id]
+        before = self.bonus_for(len(members))
+        del members[unit]
+        del self.field[unit]
+        if not members:
+            del self.members[unit.school_id]
+        self._set_bonus((unit,), 0, changed)
+        after = self.bonus_for(len(members))
+        if after != before:
+            self._set_bonus(members, after, changed)
+
+    def sync(self, units):
+        '''
+        Updates the tracker so that exactly the given units are on the field.
+
+        Parameters:
+            units (list): The units now on the field.
+
+        Returns:
+            list: Units whose attack was recomputed, in the order it happened.
+        '''
+        changed = []
+        field = set(units)
+        for unit in [u for u in self.field if u not in field]:
+            self.remove(unit, changed)
+        for unit in units:
+            if unit not in self.field:
+                self.add(unit, changed)
+        return changed
+
+    def active(self):
+        '''
+        Lists the schools with an active synergy.
+
+        Returns:
+            list: (school, unit count, ATK bonus) tuples, in the order the schools entered the field.
+        '''
+        return [(SCHOOLS[school_id], len(members), self.bonus_for(len(members)))
+                for school_id, members in self.members.items() if self.bonus_for(len(members))]
+
+    def _set_bonus(self, units, bonus, changed):
+        for unit in units:
+            atk = unit.base_atk + bonus
+            if unit.atk != atk:
+                unit.atk = atk
+                changed.append(unit)
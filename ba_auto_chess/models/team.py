@@ -0,0 +1,105 @@
+"""
+Team class definition
+"""
+
+import random
+
+class Team:
+    '''
+    One side of a battle with a maintained index of its living units.
+
+    The living units are kept in an unordered list with a position map, so
+    picking a random target is O(1), sampling k targets is O(k), removing a
+    defeated unit is O(1) and checking whether the team is wiped out is O(1).
+
+    Parameters:
+        units (list): The team's units, in acting order.
+        rng (random.Random): Random generator for target picks (defaults to the random module).
+    '''
+
+    def __init__(self, units, rng=None):
+        self.units = list(units)
+        self.rng = rng if rng is not None else random
+        self.alive = [u for u in self.units if u.is_alive()]
+        self._pos = {id(u): i for i, u in enumerate(self.alive)}
+
+    def reset(self):
+        '''
+        Restores every unit to full HP and rebuilds the living index.
+
+        Returns:
+            None
+        '''
+        for u in self.units:
+            u.hp = u.max_hp
+        self.alive = list(self.units)
+        self._pos = {id(u): i for i, u in enumerate(self.alive)}
+
+    def __len__(self):
+        return len(self.units)
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def alive_count(self):
+        '''
+        Returns the number of living units.
+        '''
+        return len(self.alive)
+
+    def wiped(self):
+        '''
+        Checks whether every unit of the team has been defeated.
+
+        Returns:
+            bool: True if no unit is alive.
+        '''
+        return not self.alive
+
+    def remove(self, unit):
+        '''
+        Removes a defeated unit from the living index.
+
+        Parameters:
+            unit (Unit): The unit whose HP just dropped to 0.
+
+        Returns:
+            None
+        '''
+        i = self._pos.pop(id(unit))
+        last = self.alive.pop()
+        if last is not unit:
+            self.alive[i] = last
+            self._pos[id(last)] = i
+
+    def pick(self):
+        '''
+        Picks one living unit uniformly at random.
+
+        Returns:
+            Unit: The picked unit.
+        '''
+        return self.alive[self.rng.randrange(len(self.alive))]
+
+    def sample(self, k):
+        '''
+        Picks up to k distinct living units uniformly at random.
+
+        Parameters:
+            k (int): Number of units to pick.
+
+        Returns:
+            list: The picked units.
+        '''
+        n = len(self.alive)
+        if k >= n:
+            return self.rng.sample(self.alive, n)
+        randrange = self.rng.randrange
+        chosen = set()
+        picked = []
+        while len(picked) < k:
+            i = randrange(n)
+            if i not in chosen:
+                chosen.add(i)
+                picked.append(self.alive[i])
+        return picked
@@ -2,37 +2,162 @@
 Unit class definition
 """
 
-import random
-from core.constants import ELEMENT_DAMAGE_MULTIPLIER
+from functools import lru_cache
+from operator import attrgetter
+from core.constants import RULES
+from core.tables import (DAMAGE, ELEMENTS, MULTIPLIER, ELEMENT_ID, SKILL_ID, SCHOOL_ID, SKILL_TARGETS,
+                         SKILL_SHIELD, SKILL_HEAL, SKILL_AOE_2, SKILL_AOE_3, SKILL_AOE_ALL, damage_base,
+                         EVENT_ATTACK, EVENT_AOE_HIT, EVENT_CAST, EVENT_SHIELD, EVENT_HEAL, EVENT_DEATH)
 
-class Unit:
+class UnitTemplate:
     '''
-    Represents a unit in the auto chess game with various attributes and abilities.
-    
-    The Unit class defines all the properties and behaviors of a game unit including
-    its stats (health, attack), special abilities, and element type that affects combat.
-    
+    Immutable stats shared by every unit of one kind at one star level.
+
+    One template exists per UNIT_POOL entry (see TEMPLATES) and the higher
+    star templates are created once, on first upgrade, and then reused.
+
     Parameters:
         name (str): The name of the unit.
         cost (int): The gold cost to purchase this unit from the shop.
-        hp (int): The initial and maximum health points of the unit.
+        hp (int): The maximum health points of the unit.
         atk (int): The base attack damage of the unit.
         skill (str): The special ability of the unit (e.g. "AOE-all", "heal").
         school (str): The faction/school the unit belongs to for synergy bonuses.
         element (str): The element type (🔴, 🟡, 🔵) affecting damage multipliers.
+        star (int): The star level of these stats.
     '''
 
-    def __init__(self, name, cost, hp, atk, skill, school, element):
-        self.name = name
-        self.cost = cost
-        self.max_hp = hp
-        self.hp = hp
-        self.base_atk = atk
-        self.atk = atk
-        self.skill = skill
-        self.star = 1
-        self.school = school
-        self.element = element
+    __slots__ = ("name", "cost", "max_hp", "base_atk", "skill", "school", "element", "star",
+                 "element_id", "skill_id", "school_id", "_upgraded")
+
+    def __init__(self, name, cost, hp, atk, skill, school, element, star=1):
+        for field, value in (("name", name), ("cost", cost), ("max_hp", hp), ("base_atk", atk),
+                             ("skill", skill), ("school", school), ("element", element), ("star", star),
+                             # Interned ids used by the damage tables
+                             ("element_id", ELEMENT_ID[element]), ("skill_id", SKILL_ID[skill]),
+                             ("school_id", SCHOOL_ID.get(school, -1)), ("_upgraded", None)):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError("UnitTemplate is immutable")
+
+    def __reduce__(self):
+        return (UnitTemplate, (self.name, self.cost, self.max_hp, self.base_atk, self.skill,
+                               self.school, self.element, self.star))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"UnitTemplate({self.name}★{self.star})"
+
+    def upgraded(self):
+        '''
+        Returns the template of the next star level.
+        
+        HP and attack grow by the rules' star_growth (80% and 50% by
+        default); pool units read them from the compiled per-star tables up
+        to MAX_STAR. The result is cached so all upgraded units share it.
+        
+        Returns:
+            UnitTemplate: The next star level's template.
+        '''
+        if self._upgraded is None:
+            index = POOL_INDEX.get(self.name)
+            if index is not None and self.star < len(RULES.hp) and RULES.hp[self.star - 1][index] == self.max_hp \
+                    and RULES.atk[self.star - 1][index] == self.base_atk:
+                hp, atk = RULES.hp[self.star][index], RULES.atk[self.star][index]
+            else:
+                hp_growth, atk_growth = RULES.star_growth
+                hp, atk = int(self.max_hp * hp_growth), int(self.base_atk * atk_growth)
+            object.__setattr__(self, "_upgraded", UnitTemplate(
+                self.name,
+                self.cost,
+                hp,
+                atk,
+                self.skill,
+                self.school,
+                self.element,
+                self.star + 1
+            ))
+        return self._upgraded
+
+# Position of every pool unit in the compiled rules
+POOL_INDEX = {name: i for i, name in enumerate(RULES.names)}
+
+# One star-1 template per pool unit, by name, built from the compiled rules
+TEMPLATES = {
+    name: UnitTemplate(name, RULES.cost[i], RULES.hp[0][i], RULES.atk[0][i], RULES.skills[RULES.skill_id[i]],
+                       RULES.schools[RULES.school_id[i]], RULES.elements[RULES.element_id[i]])
+    for name, i in POOL_INDEX.items()
+}
+
+@lru_cache(maxsize=4096)
+def _health_bar(hp, max_hp, bar_length):
+    '''
+    Builds the health bar text of Unit.get_health_bar.
+    '''
+    filled_length = int(bar_length * (hp / max_hp))
+    bar = '█' * filled_length + ' ' * (bar_length - filled_length)
+    return f"HP: [{bar}] {hp}/{max_hp}"
+
+def _template_field(field):
+    '''
+    Builds a read-only property forwarding to the unit's template.
+    '''
+    return property(attrgetter("template." + field))
+
+class Unit:
+    '''
+    Represents a unit in the auto chess game with various attributes and abilities.
+    
+    The Unit class defines all the properties and behaviors of a game unit including
+    its stats (health, attack), special abilities, and element type that affects combat.
+    Only the mutable battle state lives on the instance; name, cost, max HP, base
+    attack, skill, school, element and star level come from its shared template.
+    
+    Parameters:
+        template (UnitTemplate): The unit's kind and star level.
+    '''
+
+    __slots__ = ("template", "hp", "atk")
+
+    name = _template_field("name")
+    cost = _template_field("cost")
+    max_hp = _template_field("max_hp")
+    base_atk = _template_field("base_atk")
+    skill = _template_field("skill")
+    school = _template_field("school")
+    element = _template_field("element")
+    star = _template_field("star")
+    element_id = _template_field("element_id")
+    skill_id = _template_field("skill_id")
+    school_id = _template_field("school_id")
+
+    def __init__(self, template):
+        self.template = template
+        self.hp = template.max_hp
+        self.atk = template.base_atk
+
+    @classmethod
+    def from_pool(cls, name, star=1):
+        '''
+        Creates a fresh unit of a UNIT_POOL entry.
+        
+        Parameters:
+            name (str): The unit's name in UNIT_POOL.
+            star (int): The star level of the unit.
+            
+        Returns:
+            Unit: The new unit.
+        '''
+        template = TEMPLATES[name]
+        for _ in range(1, star):
+            template = template.upgraded()
+        return cls(template)
 
     def key(self):
         '''
@@ -61,7 +186,9 @@ class Unit:
         '''
         Creates a visual representation of the unit's current health.
         
-        Generates a text-based health bar showing the current HP ratio.
+        Generates a text-based health bar showing the current HP ratio. Bars
+        are cached by (HP, maximum HP, length), since battles render the same
+        few values over and over.
         
         Parameters:
             bar_length (int): The total length of the health bar in characters.
@@ -69,147 +196,116 @@ class Unit:
         Returns:
             str: A string containing the health bar visualization and the current/maximum HP.
         '''
-        ratio = self.hp / self.max_hp
-        filled_length = int(bar_length * ratio)
-        
-        # Choose color based on health ratio
-        if ratio > 0.7:  # Health > 70%, show green
-            bar = '█' * filled_length + ' ' * (bar_length - filled_length)
-            return f"HP: [{bar}] {self.hp}/{self.max_hp}"
-        elif ratio > 0.3:  # Health 30%-70%, show yellow
-            bar = '█' * filled_length + ' ' * (bar_length - filled_length)
-            return f"HP: [{bar}] {self.hp}/{self.max_hp}"
-        else:  # Health < 30%, show red
-            bar = '█' * filled_length + ' ' * (bar_length - filled_length)
-            return f"HP: [{bar}] {self.hp}/{self.max_hp}"
+        return _health_bar(self.hp, self.max_hp, bar_length)
 
     def upgrade(self):
         '''
         Upgrades the unit to the next star level.
         
-        Increases the unit's star level and enhances its stats (HP and attack)
-        according to predefined multipliers.
+        Switches the unit to the next star level's template, which enhances
+        its stats (HP and attack) according to predefined multipliers.
         
         Returns:
             None
         '''
-        self.star += 1
-        self.max_hp = int(self.max_hp * 1.8)  # 80% HP increase
-        self.hp = self.max_hp
-        self.base_atk = int(self.base_atk * 1.5)  # 50% ATK increase
-        self.atk = self.base_atk
+        self.template = self.template.upgraded()
+        self.hp = self.template.max_hp
+        self.atk = self.template.base_atk
     
-    def attack(self, enemies, allies, owner_name):
+    def attack(self, enemies, allies, on_event=None, events=None):
         '''
         Performs an attack action based on the unit's skill.
         
         Executes different attack patterns depending on the unit's skill,
-        targeting either one or multiple enemies.
+        targeting either one or multiple enemies. Nothing is printed; each
+        step is reported to the optional on_event callback instead. Units
+        whose HP drops to 0 are removed from the enemy team's living index.
         
         Parameters:
-            enemies (list): List of enemy Unit objects.
-            allies (list): List of allied Unit objects.
-            owner_name (str): Name of the unit's owner for display purposes.
+            enemies (Team): The enemy team.
+            allies (Team): The allied team.
+            on_event (callable): Optional callback receiving (event, *args) for
+                "cast", "hit", "shield", "heal", "healed" and "death" events.
+            events (EventBuffer): Optional core.eventlog buffer the action's
+                records are appended to.
         
         Returns:
-            None
+            tuple: (damage dealt, HP restored) by this action.
         '''
-        if not enemies:
-            return
+        dealt = 0
+        restored = 0
+        if enemies.wiped():
+            return dealt, restored
+            
+        template = self.template
+        skill = template.skill_id
+        aoe = True
+        if events is not None:
+            # Records are appended as (kind | a << 8, b, value, extra)
+            ids = events.ids
+            actor = ids[self] << 8
+            hit = actor | EVENT_ATTACK
             
         # AOE-all skill: Attack all enemies
-        if self.skill == "AOE-all" and enemies:
-            print(f"{owner_name}'s [{self.element}{self.name}] cast AOE-all, make attack to all enemies.")
-            for e in enemies:
-                multiplier = ELEMENT_DAMAGE_MULTIPLIER[self.element][e.element]
-                damage = int(self.atk * multiplier)
-                e.hp -= damage // 2
-                e.hp = max(0, e.hp)  # Prevent negative HP
-                
-                # Display element advantage/disadvantage
-                if multiplier > 1.0:
-                    advantage = "⚡EFFECTIVE⚡"
-                elif multiplier < 1.0:
-                    advantage = "❄️RESIST❄️"
-                else:
-                    advantage = ""
-                
-                print(f"{owner_name}'s [{self.element}{self.name}] attack [{e.element}{e.name}] make {damage//2} point damage {advantage} (HP {e.hp}).")
-        
-        # AOE-3 skill: Attack 3 random enemies
-        elif self.skill == "AOE-3" and enemies:
-            targets = random.sample(enemies, min(3, len(enemies)))
-            print(f"{owner_name}'s [{self.element}{self.name}] cast AOE-3, make attack to {len(targets)} enemies.")
-            for e in targets:
-                multiplier = ELEMENT_DAMAGE_MULTIPLIER[self.element][e.element]
-                damage = int(self.atk * multiplier)
-                e.hp -= damage // 3
-                e.hp = max(0, e.hp)
-                
-                # Display element advantage/disadvantage
-                if multiplier > 1.0:
-                    advantage = "⚡EFFECTIVE⚡"
-                elif multiplier < 1.0:
-                    advantage = "❄️RESIST❄️"
-                else:
-                    advantage = ""
-                    
-                print(f"{owner_name}'s [{self.element}{self.name}] attack [{e.element}{e.name}] make {damage//3} point damage {advantage} (HP {e.hp}).")
-        
-        # AOE-2 skill: Attack 2 random enemies
-        elif self.skill == "AOE-2" and enemies:
-            targets = random.sample(enemies, min(2, len(enemies)))
-            print(f"{owner_name}'s [{self.element}{self.name}] cast AOE-2, make attack to {len(targets)} enemies.")
-            for e in targets:
-                multiplier = ELEMENT_DAMAGE_MULTIPLIER[self.element][e.element]
-                damage = int(self.atk * multiplier)
-                e.hp -= damage // 2
-                e.hp = max(0, e.hp)
-                
-                # Display element advantage/disadvantage
-                if multiplier > 1.0:
-                    advantage = "⚡EFFECTIVE⚡"
-                elif multiplier < 1.0:
-                    advantage = "❄️RESIST❄️"
-                else:
-                    advantage = ""
-                    
-                print(f"{owner_name}'s [{self.element}{self.name}] attack [{e.element}{e.name}] make {damage//2} point damage {advantage} (HP {e.hp}).")
+        if skill == SKILL_AOE_ALL:
+            targets = [e for e in enemies.units if e.is_alive()]
+        
+        # AOE-3 / AOE-2 skills: Attack 3 / 2 (their SKILL_TARGETS) random enemies
+        elif skill == SKILL_AOE_3 or skill == SKILL_AOE_2:
+            targets = enemies.sample(SKILL_TARGETS[skill])
         
         # Other skills and normal attack
         else:
+            aoe = False
             # Shield skill: Add shield to self
-            if self.skill == "shield":
+            if skill == SKILL_SHIELD:
                 shield_amount = self.atk // 2
-                print(f"{owner_name}'s [{self.element}{self.name}] cast shield, get {shield_amount} shield.")
-                self.hp += shield_amount
-                if self.hp > self.max_hp:
-                    self.hp = self.max_hp
+                before = self.hp
+                self.hp = min(self.max_hp, self.hp + shield_amount)
+                restored += self.hp - before
+                if on_event is not None:
+                    on_event("shield", self, shield_amount)
+                if events is not None:
+                    events += (actor | EVENT_SHIELD, 0, shield_amount, self.hp)
             
             # Heal skill: Heal all allies
-            elif self.skill == "heal" and allies:
+            elif skill == SKILL_HEAL and allies:
                 heal_amount = self.atk // 2
-                print(f"{owner_name}'s [{self.element}{self.name}] cast heal, all allies recover {heal_amount} HP.")
-                for ally in allies:
+                if on_event is not None:
+                    on_event("heal", self, heal_amount)
+                if events is not None:
+                    events += (actor | EVENT_HEAL, 0, heal_amount, 0)
+                for ally in allies.units:
                     if ally.is_alive():
-                        ally.hp += heal_amount
-                        if ally.hp > ally.max_hp:
-                            ally.hp = ally.max_hp
-                        print(f"{ally.element}{ally.name} HP recovered to {ally.hp}.")
+                        before = ally.hp
+                        ally.hp = min(ally.max_hp, ally.hp + heal_amount)
+                        restored += ally.hp - before
+                        if on_event is not None:
+                            on_event("healed", ally)
             
             # Normal attack: Target one random enemy
-            target = random.choice(enemies)
-            multiplier = ELEMENT_DAMAGE_MULTIPLIER[self.element][target.element]
-            damage = int(self.atk * multiplier)
-            target.hp -= damage
-            target.hp = max(0, target.hp)
-            
-            # Display element advantage/disadvantage
-            if multiplier > 1.0:
-                advantage = "⚡EFFECTIVE⚡"
-            elif multiplier < 1.0:
-                advantage = "❄️RESIST❄️"
-            else:
-                advantage = ""
-                
-            print(f"{owner_name}'s [{self.element}{self.name}] attack [{target.element}{target.name}] make {damage} point damage {advantage} (HP {target.hp}).")
\ No newline at end of file
+            targets = (enemies.pick(),)
+        
+        # Each hit is a single lookup in the precomputed damage table
+        if aoe and on_event is not None:
+            on_event("cast", self, len(targets))
+        if aoe and events is not None:
+            events += (actor | EVENT_CAST, len(targets), 0, 0)
+            hit = actor | EVENT_AOE_HIT
+        base = damage_base(self.atk, skill, template.element_id)
+        for e in targets:
+            damage = DAMAGE[base + e.template.element_id]
+            before = e.hp
+            e.hp = max(0, e.hp - damage)  # Prevent negative HP
+            dealt += before - e.hp
+            if on_event is not None:
+                on_event("hit", self, e, damage, MULTIPLIER[self.element_id * len(ELEMENTS) + e.element_id])
+            if events is not None:
+                events += (hit, ids[e], damage, e.hp)
+            if before > 0 and e.hp == 0:
+                enemies.remove(e)
+                if on_event is not None:
+                    on_event("death", e)
+                if events is not None:
+                    events += (ids[e] << 8 | EVENT_DEATH, 0, 0, 0)
+        return dealt, restored
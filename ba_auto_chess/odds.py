@@ -0,0 +1,84 @@
+"""
+Exact win/tie/loss odds of two small lineups, cross-checked by Monte Carlo
+"""
+
+import argparse
+import sys
+import time
+from core.constants import MAX_BATTLE_ROUNDS
+from core.exact import SolverLimit, solve_battle
+from core.montecarlo import build_lineup, run_matchup
+from models.unit import TEMPLATES
+
+def parse_lineup(spec):
+    '''
+    Parses a lineup such as "Hina:2,Mika,Iori" (unit names in acting order,
+    each with an optional star level).
+
+    Parameters:
+        spec (str): The lineup.
+
+    Returns:
+        list: The Unit objects of the lineup.
+
+    Raises:
+        ValueError: If a unit or star level is unknown.
+    '''
+    names, stars = [], []
+    for item in spec.split(","):
+        name, _, star = item.strip().partition(":")
+        if name not in TEMPLATES:
+            raise ValueError(f"unknown unit {name!r}")
+        if star and not (star.isdigit() and int(star) >= 1):
+            raise ValueError(f"bad star level {star!r} for {name}")
+        names.append(name)
+        stars.append(int(star) if star else 1)
+    return build_lineup(names, stars)
+
+def main():
+    '''
+    Solves a battle exactly and optionally compares it with a Monte Carlo estimate.
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Exact win/tie/loss odds of a small battle")
+    parser.add_argument("team1", help="first lineup, e.g. Hina:2,Mika,Iori")
+    parser.add_argument("team2", help="second lineup")
+    parser.add_argument("--max-rounds", type=int, default=MAX_BATTLE_ROUNDS, help="round limit of the battle")
+    parser.add_argument("--exact", action="store_true", help="print the probabilities as fractions")
+    parser.add_argument("--max-states", type=int, help="give up beyond this many states")
+    parser.add_argument("--check", type=int, metavar="BATTLES", help="also simulate this many battles")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated battles")
+    parser.add_argument("--workers", type=int, help="worker processes for --check (defaults to the CPU count)")
+    args = parser.parse_args()
+
+    try:
+        team1, team2 = parse_lineup(args.team1), parse_lineup(args.team2)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    try:
+        odds = solve_battle(team1, team2, args.max_rounds, args.exact, args.max_states)
+    except SolverLimit as e:
+        sys.exit(f"Too large to solve exactly: {e}")
+    elapsed = time.perf_counter() - start
+    print(f"Solved in {elapsed:.2f}s over {odds.states:,} states "
+          f"(keyed by {'round number' if odds.by_round else 'round parity'})", file=sys.stderr)
+
+    stats = run_matchup(team1, team2, n=args.check, seed=args.seed, workers=args.workers) if args.check else None
+    for label, p, k in (("win", odds.win, 0), ("tie", odds.tie, 1), ("loss", odds.loss, 2)):
+        line = f"{label:<5} {float(p):.6f}"
+        if args.exact:
+            line += f" = {p}"
+        if stats is not None:
+            rate = (stats.win_rate, stats.tie_rate, stats.loss_rate)[k]
+            low, high = (stats.win_interval, stats.tie_interval, stats.loss_interval)[k]
+            line += f"   simulated {rate:.4f} [{low:.4f}, {high:.4f}] {'ok' if low <= p <= high else 'OUTSIDE'}"
+        print(line)
+    if stats is not None:
+        print(f"{stats.n:,} simulated battles, {stats.confidence:.0%} Wilson intervals", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Record simulated battles into a result store and query win rates from it
+"""
+
+import argparse
+import sys
+import time
+import numpy as np
+from core.constants import MAX_UNITS_ON_FIELD, RULES, SYNERGY_TIERS
+from core.results import ResultStore, ResultWriter, win_rates
+from core.vector_battle import BatchTeams, simulate_batch
+from models.synergy import _bonus_by_count
+
+def random_lineups(rng, battles, size, max_star):
+    '''
+    Draws random lineups of pool units for both teams of a batch.
+
+    Every slot is an independent uniform pick from the pool with a uniform
+    star level; units get their school synergy bonus as on the field.
+
+    Parameters:
+        rng (numpy.random.Generator): Random generator.
+        battles (int): Batch size.
+        size (int): Units per team.
+        max_star (int): Highest star level drawn.
+
+    Returns:
+        tuple: (units, stars, teams): template ids and stars of shape (battles, 2, size), and the two BatchTeams.
+    '''
+    units = rng.integers(0, len(RULES.names), size=(battles, 2, size))
+    stars = rng.integers(1, max_star + 1, size=(battles, 2, size))
+    hp = np.array(RULES.hp)[stars - 1, units]
+    atk = np.array(RULES.atk)[stars - 1, units]
+    school = np.array(RULES.school_id)[units]
+    bonus = np.array(_bonus_by_count(SYNERGY_TIERS))
+    for s in range(len(RULES.schools)):
+        members = school == s
+        count = np.minimum(members.sum(axis=2, keepdims=True), len(bonus) - 1)
+        atk += np.where(members, bonus[count], 0)
+    element = np.array(RULES.element_id)[units]
+    skill = np.array(RULES.skill_id)[units]
+    teams = [BatchTeams(hp[:, side], atk[:, side], element[:, side], skill[:, side], school[:, side])
+             for side in range(2)]
+    return units, stars, teams
+
+def record(args):
+    '''
+    Simulates random battles with the vectorized engine and appends them to a store.
+
+    Batch k draws from numpy's generator seeded with (seed, k), recorded
+    in the seed column as seed << 32 | k, so any batch can be replayed.
+    '''
+    start = time.perf_counter()
+    done = 0
+    with ResultWriter(args.store) as writer:
+        for batch, first in enumerate(range(0, args.battles, args.batch)):
+            n = min(args.batch, args.battles - first)
+            rng = np.random.default_rng([args.seed, batch])
+            units, stars, (team1, team2) = random_lineups(rng, n, args.size, args.max_star)
+            result = simulate_batch(team1, team2, rng)
+            slots = np.full((n, 2, MAX_UNITS_ON_FIELD), writer.empty, dtype=writer.layout["units"][0])
+            slots[:, :, :args.size] = units
+            star_slots = np.zeros((n, 2, MAX_UNITS_ON_FIELD), dtype=np.uint8)
+            star_slots[:, :, :args.size] = stars
+            seeds = np.full(n, (args.seed << 32) | batch, dtype=np.uint64)
+            writer.add_batch(slots, star_slots, result.winner, result.survivors, result.rounds, seeds)
+            done += n
+            print(f"\r{done:,} battles", end="", file=sys.stderr)
+    rows = writer.meta["rows"]
+    elapsed = time.perf_counter() - start
+    print(f"\r{done:,} battles in {elapsed:.1f}s ({done / elapsed:,.0f}/s); {rows:,} rows in {args.store}",
+          file=sys.stderr)
+
+def template_ids(parser, store, names):
+    '''
+    Resolves unit names to the store's template ids.
+    '''
+    ids = []
+    for name in names or ():
+        if name not in store.templates:
+            parser.error(f"{name!r} is not a unit of this store")
+        ids.append(store.templates.index(name))
+    return ids
+
+def query(parser, args):
+    '''
+    Prints the win rates of a grouping.
+    '''
+    store = ResultStore(args.store)
+    filters = {"with": template_ids(parser, store, args.with_units),
+               "against": template_ids(parser, store, args.against),
+               "size": args.size, "min_rounds": args.min_rounds, "max_rounds": args.max_rounds}
+    start = time.perf_counter()
+    table = win_rates(store, args.by, filters)
+    elapsed = time.perf_counter() - start
+    table = [row for row in table if row[1] >= args.min_games]
+    if args.sort == "rate":
+        table.sort(key=lambda row: -(row[2] + row[3] / 2) / row[1])
+    print(f"{'group':<28} {'sides':>12} {'win':>7} {'tie':>6}")
+    for label, sides, wins, ties in table[:args.top]:
+        print(f"{label:<28} {sides:>12,} {wins / sides:>7.1%} {ties / sides:>6.1%}")
+    print(f"{store.rows:,} battles scanned in {elapsed:.2f}s", file=sys.stderr)
+
+def info(args):
+    '''
+    Prints what a store holds.
+    '''
+    store = ResultStore(args.store)
+    print(f"{store.rows:,} battles, rules {store.meta['rules'][:12]}")
+    print(f"units: {', '.join(store.templates)}")
+    print(f"schools: {', '.join(store.schools)}")
+    print(f"elements: {', '.join(store.elements)}")
+    if store.rows:
+        winner = np.bincount(store["winner"], minlength=3)
+        print(f"team1 {winner[1] / store.rows:.1%}, team2 {winner[2] / store.rows:.1%}, "
+              f"tie {winner[0] / store.rows:.1%}")
+
+def main():
+    '''
+    Records battles into, or queries, a result store directory.
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Record battle results and query win rates")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="simulate random battles into a store")
+    rec.add_argument("store", help="store directory (appended to if it exists)")
+    rec.add_argument("--battles", type=int, default=1000000, help="number of battles")
+    rec.add_argument("--size", type=int, default=5, help="units per team")
+    rec.add_argument("--max-star", type=int, default=3, help="highest star level drawn")
+    rec.add_argument("--seed", type=int, default=0, help="root seed of the batches")
+    rec.add_argument("--batch", type=int, default=65536, help="battles simulated at once")
+
+    q = commands.add_parser("query", help="win rates grouped by unit, star, school synergy or element mix")
+    q.add_argument("store", help="store directory")
+    q.add_argument("by", choices=("units", "stars", "schools", "elements"), help="grouping")
+    q.add_argument("--with", dest="with_units", action="append", metavar="UNIT",
+                   help="only lineups fielding this unit (repeatable)")
+    q.add_argument("--against", action="append", metavar="UNIT",
+                   help="only lineups facing this unit (repeatable)")
+    q.add_argument("--size", type=int, help="only lineups of this many units")
+    q.add_argument("--min-rounds", type=int, help="only battles of at least this many rounds")
+    q.add_argument("--max-rounds", type=int, help="only battles of at most this many rounds")
+    q.add_argument("--min-games", type=int, default=1, help="hide groups with fewer sides")
+    q.add_argument("--sort", choices=("games", "rate"), default="games", help="order of the groups")
+    q.add_argument("--top", type=int, default=30, help="groups to print")
+
+    i = commands.add_parser("info", help="summarize a store")
+    i.add_argument("store", help="store directory")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "record":
+            if not 1 <= args.size <= MAX_UNITS_ON_FIELD:
+                parser.error(f"--size must be between 1 and {MAX_UNITS_ON_FIELD}")
+            if not 1 <= args.max_star <= len(RULES.hp):
+                parser.error(f"--max-star must be between 1 and {len(RULES.hp)}")
+            record(args)
+        elif args.command == "query":
+            query(parser, args)
+        else:
+            info(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
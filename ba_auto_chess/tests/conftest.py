@@ -0,0 +1,8 @@
+"""
+Puts the game directory on the import path, as running ba_auto_chess/main.py does
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
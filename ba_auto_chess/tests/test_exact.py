@@ -0,0 +1,31 @@
+"""
+Cross-check: the exact battle solver against Monte Carlo simulation
+"""
+
+import pytest
+from core.exact import solve_battle
+from core.montecarlo import build_lineup, run_matchup, wilson_interval
+
+LINEUPS = [
+    # A certain outcome, whose simulated interval must still contain 1
+    (["Hina", "Mika"], ["Iori", "Koharu"]),
+    (["Shiroko", "Mika"], ["Hoshino", "Shiroko"]),
+    (["Mutsuki", "Koharu", "Hina"], ["Mutsuki", "Asuna", "Koharu"]),
+]
+
+@pytest.mark.parametrize("names1, names2", LINEUPS)
+def test_solver_matches_simulation(names1, names2):
+    odds = solve_battle(build_lineup(names1), build_lineup(names2), exact=True)
+    assert odds.win + odds.tie + odds.loss == 1
+
+    stats = run_matchup(build_lineup(names1), build_lineup(names2), n=4000, seed=0, workers=1, confidence=0.999)
+    for p, (low, high) in zip((odds.win, odds.tie, odds.loss),
+                              (stats.win_interval, stats.tie_interval, stats.loss_interval)):
+        assert low <= p <= high
+
+@pytest.mark.parametrize("n", [2, 20, 20000])
+def test_wilson_interval_is_closed_at_certain_outcomes(n):
+    assert wilson_interval(n, n)[1] == 1.0
+    assert wilson_interval(0, n)[0] == 0.0
+    low, high = wilson_interval(n // 2, n)
+    assert 0.0 < low < high < 1.0
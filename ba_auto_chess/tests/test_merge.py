@@ -0,0 +1,98 @@
+"""
+Property test: the indexed Player.try_merge against the original full rescan
+"""
+
+import random
+from collections import defaultdict
+import pytest
+from core.constants import RULES
+from models.player import Player
+from models.shop import Shop
+from models.unit import Unit
+
+def reference_merge(reserve):
+    '''
+    The original Player.try_merge, ported to a plain reserve list: rebuilds
+    the name groups over the whole reserve, merges the first pair it finds
+    and starts over after every merge.
+
+    Parameters:
+        reserve (list): The reserve, changed in place.
+
+    Returns:
+        None
+    '''
+    name_count = defaultdict(list)
+    for i, unit in enumerate(reserve):
+        name_count[unit.name].append(i)
+
+    for name, indices in name_count.items():
+        by_star = defaultdict(list)
+        for idx in indices:
+            by_star[reserve[idx].star].append(idx)
+
+        for star, idx_list in by_star.items():
+            if len(idx_list) >= 2:
+                upgraded = Unit(reserve[idx_list[0]].template.upgraded())
+                for idx in sorted(idx_list[:2], reverse=True):
+                    reserve.pop(idx)
+                reserve.append(upgraded)
+                reference_merge(reserve)
+                return
+
+def keys(units):
+    return [(unit.name, unit.star) for unit in units]
+
+def check_index(player):
+    '''
+    Checks that the merge index lists exactly the reserve's units, in reserve order.
+    '''
+    expected = {}
+    for unit in player.reserve:
+        expected.setdefault((unit.name, unit.star), []).append(unit)
+    assert player._slots == expected
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_reference_over_random_sequences(seed):
+    rng = random.Random(seed)
+    # Few names so that merges and ★1→★2→★3 cascades are frequent
+    names = rng.sample(RULES.names, rng.randint(1, 4))
+    shop = Shop(shared=True) if seed % 2 else None
+    player = Player("p", board_size=rng.randint(1, 10), verbose=False)
+    player.gold = 10 ** 6
+    reference = []
+
+    for _ in range(60):
+        action = rng.random()
+        if action < 0.7:
+            unit = Unit.from_pool(rng.choice(names))
+            if player.buy_unit(unit, shop):
+                reference.append(unit)
+                reference_merge(reference)
+        elif action < 0.85 and player.reserve:
+            index = rng.randrange(len(player.reserve))
+            player.sell_unit(index, shop)
+            reference.pop(index)
+        elif action < 0.95:
+            player.deploy_units()
+            assert player.units == player.reserve[:player.board_size]
+        else:
+            # A reserve assigned by hand may hold mergeable groups; the next
+            # try_merge finds them by rescanning
+            units = [Unit.from_pool(rng.choice(names), rng.randint(1, 2)) for _ in range(rng.randint(0, 6))]
+            player.reserve = units
+            reference[:] = units
+            player.try_merge()
+            reference_merge(reference)
+
+        assert keys(player.reserve) == keys(reference)
+        check_index(player)
+
+def test_cascade_to_three_stars():
+    player = Player("p", verbose=False)
+    player.gold = 100
+    name = RULES.names[0]
+    for _ in range(4):
+        player.buy_unit(Unit.from_pool(name))
+    assert keys(player.reserve) == [(name, 3)]
+    check_index(player)
@@ -0,0 +1,84 @@
+"""
+Tournament runner ranking AI strategies on an Elo ladder
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from core.tournament import Tournament
+
+def print_ratings(tournament, stream):
+    '''
+    Prints the standings of a tournament.
+    '''
+    print(f"{tournament.played:,} games", file=stream)
+    for place, row in enumerate(tournament.ratings(), 1):
+        print(f"{place:>2}. {row['strategy']:<24} {row['rating']:7.1f} ± {row['error']:5.1f}  "
+              f"({row['games']:,} games)", file=stream)
+    stream.flush()
+
+def main():
+    '''
+    Runs or resumes a tournament and prints the ratings.
+
+    Strategies are named as in core.tournament.parse_strategy, e.g.
+    "greedy", "search:0.02" or "greedy+arrange". With --checkpoint the
+    progress is saved to a file; running again with the same --checkpoint
+    and no strategies picks up where the last run stopped, and --games is
+    the tournament's total, including earlier runs.
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Rank AI strategies by playing headless games")
+    parser.add_argument("strategies", nargs="*", metavar="STRATEGY",
+                        help="strategies to rank, e.g. greedy search:0.02 greedy+arrange (omit to resume)")
+    parser.add_argument("--games", type=int, default=10000, help="total number of games")
+    parser.add_argument("--seed", type=int, help="root seed of the games")
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to the CPU count)")
+    parser.add_argument("--chunk", type=int, default=16, help="games per work unit")
+    parser.add_argument("--checkpoint", metavar="FILE", help="save progress to this file and resume from it")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="seconds between checkpoints")
+    parser.add_argument("--records", metavar="FILE", help="append one JSON line per finished game")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds between standings on stderr")
+    args = parser.parse_args()
+
+    try:
+        if args.checkpoint and os.path.exists(args.checkpoint):
+            tournament = Tournament.resume(args.checkpoint, args.checkpoint_interval)
+            if args.strategies and args.strategies != tournament.strategies:
+                parser.error(f"{args.checkpoint} ranks {' '.join(tournament.strategies)}; "
+                             "pass the same strategies or none")
+            print(f"Resuming {args.checkpoint} after {tournament.played:,} games", file=sys.stderr)
+        elif args.strategies:
+            tournament = Tournament(args.strategies, args.seed, args.checkpoint, args.checkpoint_interval)
+        else:
+            parser.error("name the strategies to rank, or --checkpoint a tournament to resume")
+    except ValueError as e:
+        parser.error(str(e))
+
+    records = open(args.records, "a", encoding="utf-8") if args.records else None
+    start = time.perf_counter()
+    played = tournament.played
+    reported = start
+    try:
+        for record in tournament.run(args.games, args.workers, args.chunk):
+            if records is not None:
+                records.write(json.dumps(record) + "\n")
+            if time.perf_counter() - reported >= args.report_interval:
+                reported = time.perf_counter()
+                print_ratings(tournament, sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; progress is saved" if args.checkpoint else "Interrupted", file=sys.stderr)
+    finally:
+        if records is not None:
+            records.close()
+    elapsed = time.perf_counter() - start
+    print(f"{tournament.played - played:,} games in {elapsed:.1f}s "
+          f"({(tournament.played - played) / elapsed:.1f} games/s)", file=sys.stderr)
+    print_ratings(tournament, sys.stdout)
+
+if __name__ == "__main__":
+    main()